@@ -4,7 +4,7 @@
 # Provides REST API endpoints for form extraction.
 # """
 
-# from fastapi import FastAPI, UploadFile, File, HTTPException
+# from fastapi import FastAPI, UploadFile, File, HTTPException, BackgroundTasks
 # from fastapi.middleware.cors import CORSMiddleware
 # from PIL import Image
 # import io
@@ -128,20 +128,46 @@
 import io
 import os
 import uuid
+import asyncio
 import fitz  # PyMuPDF
+import re
 import json
+import httpx
+import logging
+import mimetypes
+import random
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from itertools import chain
 from datetime import datetime, timezone
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from urllib.parse import urlparse
+from fastapi import FastAPI, UploadFile, File, HTTPException, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response
 from supabase import create_client, Client
 from google import genai
 from google.genai import types
-from pydantic import BaseModel
-from typing import List, Any
+from pydantic import BaseModel, ValidationError
+from typing import Iterable, List, Any, Literal, Optional
 from dotenv import load_dotenv
 
-# Import history manager
-from services.history_manager import history_manager
+# Fast JSON serialization for large responses (falls back to the stdlib encoder)
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+    orjson = None
+
+# PDFium rasterizer (BSD/Apache); PyMuPDF is still used for text extraction
+try:
+    import pypdfium2 as pdfium
+    PDFIUM_AVAILABLE = True
+except ImportError:
+    PDFIUM_AVAILABLE = False
+    pdfium = None
 
 # Load Environment Variables
 load_dotenv()
@@ -151,19 +177,72 @@ SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 DEFAULT_MODEL = os.getenv("DEFAULT_MODEL", "gemini-2.5-pro")  # Model from .env
+CLASSIFICATION_MODEL = os.getenv("CLASSIFICATION_MODEL", "gemini-2.5-flash")  # Single-page/image detection
+
+print(f"[Config] Using model: {DEFAULT_MODEL} (classification: {CLASSIFICATION_MODEL})")
+
+# --- LOGGING ---
+# /get-pages logs through the logging module with lazy %-formatting, so messages
+# below LOG_LEVEL cost nothing; LOG_LEVEL=DEBUG restores the step-by-step trace
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+logging.basicConfig(level=LOG_LEVEL, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+logger = logging.getLogger(__name__)
 
-print(f"[Config] Using model: {DEFAULT_MODEL}")
+# Fail fast at startup instead of erroring inside every request
+REQUIRED_ENV_VARS = {"SUPABASE_URL": SUPABASE_URL, "SUPABASE_KEY": SUPABASE_KEY, "GEMINI_API_KEY": GEMINI_API_KEY}
+MISSING_ENV_VARS = [name for name, value in REQUIRED_ENV_VARS.items() if not value]
+if MISSING_ENV_VARS:
+    raise RuntimeError(f"Missing required environment variables: {', '.join(MISSING_ENV_VARS)}")
+
+# Import history manager (creates its Supabase client at import time)
+from services.history_manager import history_manager
+from services.detection_cache import detection_cache, make_cache_key
 
 # Supabase Buckets
 UPLOADS_BUCKET = "uploads"
 PAGES_BUCKET = "page-images"
 
+# Upload limits (multipart bodies are already spooled to disk by Starlette)
+MAX_UPLOAD_MB = int(os.getenv("MAX_UPLOAD_MB", "50"))
+MAX_UPLOAD_BYTES = MAX_UPLOAD_MB * 1024 * 1024
+UPLOAD_CHUNK_SIZE = 1 << 20  # 1 MiB
+
+# Page image rendering: lossless 300-DPI PNG by default, since pageUrl is what
+# /extract-form reads; preview_only=true opts in to smaller lossy JPEG previews
+PREVIEW_DPI_DIGITAL = 150
+PREVIEW_DPI_SCANNED = 200
+PREVIEW_JPEG_QUALITY = 85
+LOSSLESS_DPI = 300
+
 # Initialize Clients
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-client = genai.Client(api_key=GEMINI_API_KEY)
+# The SDK keeps one pooled httpx client per genai.Client; HTTP/2 lets concurrent
+# detection and extraction calls multiplex over a few kept-alive connections
+client = genai.Client(
+    api_key=GEMINI_API_KEY,
+    http_options=types.HttpOptions(async_client_args={
+        "http2": True,
+        "limits": httpx.Limits(max_keepalive_connections=50, max_connections=100)
+    })
+)
+
+# Shared async HTTP/2 client for Storage uploads: one persistent connection,
+# concurrent uploads are multiplexed as streams instead of new TLS handshakes
+storage_client = httpx.AsyncClient(
+    http2=True,
+    timeout=30,
+    headers={"Authorization": f"Bearer {SUPABASE_KEY}", "apikey": SUPABASE_KEY}
+)
 
 app = FastAPI(title="US Tax Form Extractor - API 1")
 
+
+@app.on_event("shutdown")
+async def close_storage_client():
+    """Close the pooled Storage connection on shutdown."""
+    await storage_client.aclose()
+
+
 # Enable CORS
 app.add_middleware(
     CORSMiddleware,
@@ -174,6 +253,7 @@ app.add_middleware(
 )
 
 # --- UTILITY: RECURSIVE CAMELCASE CONVERTER ---
+@lru_cache(maxsize=512)
 def to_camel(snake_str: str) -> str:
     components = snake_str.split('_')
     return components[0] + ''.join(x.title() for x in components[1:])
@@ -185,47 +265,268 @@ def camelize_dict(data: Any) -> Any:
         return [camelize_dict(i) for i in data]
     return data
 
+def camel_json_response(data: Any) -> Response:
+    """
+    Camelize a response payload and serialize it directly. Returning a Response
+    skips FastAPI's jsonable_encoder, which would walk the payload a second time.
+    """
+    body = camelize_dict(data)
+    if ORJSON_AVAILABLE:
+        return Response(content=orjson.dumps(body), media_type="application/json")
+    return JSONResponse(content=body)
+
+
+# --- CHUNKED UPLOAD READ ---
+async def read_upload(file: UploadFile):
+    """
+    Read an uploaded file into a single bytes object that every later step
+    (hashing, PyMuPDF, Gemini, storage upload) shares without copying.
+
+    Returns:
+        File content as bytes, or None if it exceeds MAX_UPLOAD_BYTES
+        (checked before reading when the size is known, else while streaming)
+    """
+    if file.size is not None:
+        if file.size > MAX_UPLOAD_BYTES:
+            return None
+        # Size already checked: one read, no intermediate buffer
+        return await file.read()
+
+    chunks = []
+    total = 0
+    while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+        chunks.append(chunk)
+        total += len(chunk)
+        if total > MAX_UPLOAD_BYTES:
+            return None
+    return b"".join(chunks)
+
+
+# --- ASYNC STORAGE UPLOAD ---
+async def upload_to_storage(bucket: str, path: str, data: bytes, content_type: str) -> None:
+    """Upload an object to Supabase Storage over the shared async HTTP/2 client."""
+    response = await storage_client.post(
+        f"{SUPABASE_URL}/storage/v1/object/{bucket}/{path}",
+        content=data,
+        headers={"content-type": content_type}
+    )
+    response.raise_for_status()
+
+
+# --- PAGE RASTERIZATION ---
+# PDFium is not thread-safe: its calls are serialized, image encoding is not
+_pdfium_lock = threading.Lock()
+
+
+def encode_page_image(pil_image, image_format: str) -> bytes:
+    """Encode a rendered page as PNG, or as a JPEG preview."""
+    img_buffer = io.BytesIO()
+    if image_format == "jpeg":
+        pil_image.save(img_buffer, format="JPEG", quality=PREVIEW_JPEG_QUALITY)
+    else:
+        pil_image.save(img_buffer, format="PNG")
+    return img_buffer.getvalue()
+
+
+def render_pdf_page_batch(pdf_bytes: bytes, page_numbers: List[int], dpi: int = 300, image_format: str = "png") -> list:
+    """
+    Render PDF pages to images in one worker thread. The worker opens its own
+    document once for all its pages. Uses PDFium when installed, else PyMuPDF.
+
+    Returns:
+        [(page_number, image_bytes, width, height)] in page_numbers order
+    """
+    rendered = []
+    if PDFIUM_AVAILABLE:
+        with _pdfium_lock:
+            pdf = pdfium.PdfDocument(pdf_bytes)
+        try:
+            for page_number in page_numbers:
+                # Only the PDFium calls (and the copy out of its bitmap) hold the lock
+                with _pdfium_lock:
+                    page = pdf[page_number - 1]
+                    bitmap = page.render(scale=dpi / 72, rotation=0)
+                    pil_image = bitmap.to_pil().convert("RGB")
+                    bitmap.close()
+                    page.close()
+                img_bytes = encode_page_image(pil_image, image_format)
+                rendered.append((page_number, img_bytes, pil_image.width, pil_image.height))
+        finally:
+            with _pdfium_lock:
+                pdf.close()
+        return rendered
+
+    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+    try:
+        # Explicit RGB without alpha: 3 bytes/pixel and no colorspace conversion on encode
+        matrix = fitz.Matrix(dpi / 72, dpi / 72)
+        for page_number in page_numbers:
+            pix = doc[page_number - 1].get_pixmap(matrix=matrix, colorspace=fitz.csRGB, alpha=False)
+            if image_format == "jpeg":
+                img_bytes = pix.tobytes("jpeg", jpg_quality=PREVIEW_JPEG_QUALITY)
+            else:
+                img_bytes = pix.tobytes("png")
+            rendered.append((page_number, img_bytes, pix.width, pix.height))
+        return rendered
+    finally:
+        doc.close()
+
+
+def page_image_mime_type(page_url: str) -> str:
+    """Infer a stored page image's MIME type from its URL (JPEG previews vs PNG)."""
+    mime_type, _ = mimetypes.guess_type(urlparse(page_url).path)
+    return mime_type or "image/png"
+
+
+async def render_pdf_pages(pdf_bytes: bytes, page_numbers: List[int], dpi: int, image_format: str) -> list:
+    """Rasterize pages in parallel (PyMuPDF releases the GIL; PDFium overlaps encoding)."""
+    loop = asyncio.get_running_loop()
+    max_workers = min(len(page_numbers), os.cpu_count() or 1)
+    # Each worker renders every max_workers-th page from its own open document
+    batches = [page_numbers[i::max_workers] for i in range(max_workers)]
+    with ThreadPoolExecutor(max_workers=max_workers) as render_pool:
+        results = await asyncio.gather(*[
+            loop.run_in_executor(render_pool, render_pdf_page_batch, pdf_bytes, batch, dpi, image_format)
+            for batch in batches
+        ])
+    rendered = {page[0]: page for page in chain.from_iterable(results)}
+    return [rendered[p_num] for p_num in page_numbers]
+
+
+def build_form_regions(item, page_width: int, page_height: int) -> list:
+    """
+    Calculate approximate form regions (bounding boxes for real-time border
+    rendering), assuming the forms are stacked vertically on the page.
+    """
+    form_regions = []
+    num_forms = item.number_of_forms
+    if num_forms > 0:
+        form_height = page_height // num_forms
+        for i in range(num_forms):
+            form_type = item.detected_types[i] if i < len(item.detected_types) else item.detected_types[0] if item.detected_types else "Unknown"
+            form_regions.append({
+                "formType": form_type,
+                "formIndex": i,
+                "bbox": {
+                    "x": 0,
+                    "y": i * form_height,
+                    "width": page_width,
+                    "height": form_height
+                }
+            })
+    return form_regions
+
+
+# --- DEFERRED PAGE RENDERING ---
+# In-process status store for defer_render=true; tokens are only visible to the
+# worker that issued them, so deferred mode assumes a single API worker.
+PAGE_RENDER_TTL_SECONDS = 3600
+page_render_status = {}  # render_token -> {"status", "page_url", "error", "created_at"}
+
+
+def register_page_render(render_token: str) -> None:
+    """Mark a page as pending and drop expired entries."""
+    now = time.time()
+    for token in [t for t, entry in page_render_status.items() if now - entry["created_at"] > PAGE_RENDER_TTL_SECONDS]:
+        del page_render_status[token]
+    page_render_status[render_token] = {"status": "pending", "page_url": None, "error": None, "created_at": now}
+
+
+async def render_and_upload_pages(
+    pdf_bytes: bytes,
+    unique_id: str,
+    page_numbers: List[int],
+    dpi: int,
+    image_format: str,
+    image_ext: str,
+    image_mime: str
+) -> None:
+    """Background task: render pages, upload them and publish their URLs by token."""
+    if not page_numbers:
+        return
+    try:
+        rendered_pages = await render_pdf_pages(pdf_bytes, page_numbers, dpi, image_format)
+    except Exception as e:
+        for p_num in page_numbers:
+            page_render_status[f"{unique_id}_p{p_num}"].update(status="error", error=str(e))
+        return
+
+    async def upload_page(p_num: int, img_bytes: bytes) -> None:
+        render_token = f"{unique_id}_p{p_num}"
+        img_path = f"{render_token}.{image_ext}"
+        try:
+            await upload_to_storage(PAGES_BUCKET, img_path, img_bytes, image_mime)
+            page_render_status[render_token].update(
+                status="ready",
+                page_url=supabase.storage.from_(PAGES_BUCKET).get_public_url(img_path)
+            )
+        except Exception as e:
+            page_render_status[render_token].update(status="error", error=str(e))
+
+    await asyncio.gather(*[upload_page(p_num, img_bytes) for p_num, img_bytes, _, _ in rendered_pages])
+
 
 # --- DIGITAL VS SCANNED DETECTION ---
-def is_digital_pdf(pdf_bytes: bytes) -> bool:
+# Digital/scanned is homogeneous within a file, so only the first pages are sampled
+DIGITAL_CHECK_MAX_PAGES = 3
+DIGITAL_MIN_TEXT_CHARS = 100
+# Plain text without ligature/whitespace preservation - cheapest extraction mode
+TEXT_EXTRACT_FLAGS = fitz.TEXT_MEDIABOX_CLIP
+
+
+def is_digital_pdf(doc: fitz.Document) -> tuple:
     """
     Check if PDF has extractable text layer (digital) or is image-only (scanned).
-    Uses existing text extraction - no extra AI call.
+    Uses existing text extraction - no extra AI call. Takes the request's open
+    document so the xref table is parsed once per request.
     
     Returns:
-        True if digital (has text layer), False if scanned (image-only)
+        (is_digital, sampled_texts) - is_digital is True if the PDF has a text layer;
+        sampled_texts holds the text of the sampled first pages (reused by
+        classify_text_layer, empty for scanned PDFs)
     """
     try:
-        doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-        total_text_chars = 0
-        for page in doc:
-            text = page.get_text().strip()
-            total_text_chars += len(text)
-            if total_text_chars > 100:  # Has substantial text
-                doc.close()
-                return True
-        doc.close()
-        return False
+        sample_count = min(DIGITAL_CHECK_MAX_PAGES, len(doc))
+        sampled_texts = [doc[i].get_text("text", flags=TEXT_EXTRACT_FLAGS) for i in range(sample_count)]
+        if sum(len(text.strip()) for text in sampled_texts) <= DIGITAL_MIN_TEXT_CHARS:
+            return False, []
+        return True, sampled_texts
     except Exception:
-        return False  # Default to scanned if error
+        return False, []  # Default to scanned if error
+
+
+def classify_text_layer(doc: fitz.Document, sampled_texts: List[str]):
+    """
+    Rule-based form detection over a digital PDF's text layer. Pages after the
+    sampled ones are extracted one at a time as they are classified, so an
+    unrecognized page stops extraction of the rest.
+
+    Returns:
+        DetectionResponse, or None if any page is unrecognized or unreadable
+    """
+    def page_texts():
+        yield from sampled_texts
+        for i in range(len(sampled_texts), len(doc)):
+            yield doc[i].get_text("text", flags=TEXT_EXTRACT_FLAGS)
+
+    try:
+        return classify_pages_by_text(page_texts())
+    except Exception:
+        return None  # Unreadable text layer - use AI detection
 
 # --- THE UNIVERSAL SYSTEM PROMPT ---
 SYSTEM_PROMPT = """
-ROLE: Professional Tax Document Classifier.
-TASK: Analyze the document and identify EVERY page that contains a tax form.
-DETECTION: Identify the specific type of form found (e.g., "W-2", "1099-INT", "1098").
-CAPABILITY: You must process digital text, scans, photos, and images.
-RULES: 
-- Identify the page number (starting from 1).
-- Count the total number of distinct form copies visible on that page.
-- List the specific form types found on that page in detected_types.
-- Ignore pages that are only instructions, generic letters, or blank.
-OUTPUT: You must return a valid JSON object matching the requested schema.
+ROLE: Tax Document Classifier.
+TASK: Identify EVERY page (digital, scanned or photographed) that contains a tax form.
+RULES:
+- page_number starts from 1.
+- number_of_forms counts the distinct form copies on the page.
+- detected_types lists the form types on the page.
+- Skip pages that are only instructions, letters, or blank.
 """
 
 import time  # For retry logic
 
-
 # --- Form Region Model for Border Coordinates (API Output Only - NOT for Gemini) ---
 # Note: These are NOT used in Gemini's response_schema because dict types cause errors
 class FormRegion(BaseModel):
@@ -236,161 +537,328 @@ class FormRegion(BaseModel):
 
 
 # --- Gemini Response Schema (Simple - No dict types) ---
-# This is what Gemini uses for structured output
+# This is what Gemini uses for structured output. The closed set of form types
+# becomes an enum in the response schema, so the prompt doesn't enumerate them.
+FormType = Literal[
+    "W-2", "1099-INT", "1099-DIV", "1099-NEC", "1099-MISC", "1099-R", "1099-K",
+    "1098", "1098-T", "K-1", "K-3", "8804", "8805", "Unknown"
+]
+
 class GeminiPageResult(BaseModel):
     """Page result schema for Gemini response parsing."""
     page_number: int
     number_of_forms: int
-    detected_types: List[str]
+    detected_types: List[FormType]
 
 class DetectionResponse(BaseModel):
     """Schema for Gemini's response - uses simple types only."""
     relevant_pages: List[GeminiPageResult]
 
+
+# --- RULE-BASED DETECTION FOR DIGITAL PDFs ---
+
+# A page is attributed to a form only when both its title and its OMB number
+# are present, which keeps instruction pages and cover letters out. Each OMB
+# occurrence counts as one form copy on the page.
+FORM_SIGNATURES = {
+    "W-2": (re.compile(r"\bW-?2\b|Wage and Tax Statement"), re.compile(r"OMB\s*No\.?\s*1545-0008")),
+    "1099-INT": (re.compile(r"\b1099-?INT\b"), re.compile(r"OMB\s*No\.?\s*1545-0112")),
+    "1099-DIV": (re.compile(r"\b1099-?DIV\b"), re.compile(r"OMB\s*No\.?\s*1545-0110")),
+    "1099-NEC": (re.compile(r"\b1099-?NEC\b"), re.compile(r"OMB\s*No\.?\s*1545-0116")),
+    "1098": (re.compile(r"Mortgage\s+Interest\s+Statement"), re.compile(r"OMB\s*No\.?\s*1545-1380")),
+    "1098-T": (re.compile(r"\b1098-T\b|Tuition\s+Statement"), re.compile(r"OMB\s*No\.?\s*1545-1574")),
+}
+
+
+def classify_pages_by_text(page_texts: Iterable[str]):
+    """
+    Detect form types from the PDF text layer without calling Gemini. Pages are
+    consumed in order and classification stops at the first unmatched page.
+
+    Returns:
+        DetectionResponse if every page matched a known form signature,
+        otherwise None (ambiguous document - use AI detection)
+    """
+    relevant_pages = []
+    for page_idx, text in enumerate(page_texts):
+        detected_types = []
+        number_of_forms = 0
+        for form_type, (title_pattern, omb_pattern) in FORM_SIGNATURES.items():
+            if not title_pattern.search(text):
+                continue
+            omb_count = len(omb_pattern.findall(text))
+            if omb_count:
+                detected_types.append(form_type)
+                number_of_forms += omb_count
+        if not detected_types:
+            return None
+        relevant_pages.append(GeminiPageResult.model_construct(
+            page_number=page_idx + 1,
+            number_of_forms=number_of_forms,
+            detected_types=detected_types
+        ))
+
+    if not relevant_pages:
+        return None
+    return DetectionResponse.model_construct(relevant_pages=relevant_pages)
+
+
+def detection_from_cache(parsed_json: str) -> DetectionResponse:
+    """
+    Rebuild a cached DetectionResponse without re-validating it.
+
+    Cached entries were validated against the schema when Gemini returned them,
+    so model_construct skips the second Pydantic pass on every cache hit.
+    """
+    data = json.loads(parsed_json)
+    return DetectionResponse.model_construct(
+        relevant_pages=[GeminiPageResult.model_construct(**page) for page in data["relevant_pages"]]
+    )
+
+
+# --- SPECULATIVE AI DETECTION ---
+# Opt-in: start Gemini detection in parallel with text analysis and cancel it when
+# the rules match. Cancelling does not refund a request Gemini has already started,
+# so by default detection only runs after the text-layer classification has failed
+SPECULATIVE_DETECTION_ENABLED = os.getenv("SPECULATIVE_DETECTION_ENABLED", "false").lower() in ("1", "true", "yes")
+
+
+async def detect_forms_with_gemini(content: bytes, mime_type: str, model: str):
+    """Run Gemini form detection on the raw file with retry on 503/429."""
+    max_retries = 3
+    retry_delay = 2
+
+    config = types.GenerateContentConfig(
+        system_instruction=SYSTEM_PROMPT,
+        response_mime_type="application/json",
+        response_schema=DetectionResponse
+    )
+
+    for attempt in range(max_retries):
+        try:
+            logger.debug("[Step 3/5] API call attempt %d/%d", attempt + 1, max_retries)
+            response = await client.aio.models.generate_content(
+                model=model,
+                contents=[types.Part.from_bytes(data=content, mime_type=mime_type)],
+                config=config
+            )
+            logger.debug("[Step 3/5] AI detection successful")
+            return response
+        except Exception as e:
+            error_msg = str(e)
+            logger.warning("[Step 3/5] Attempt %d failed: %.80s", attempt + 1, error_msg)
+            if ("503" in error_msg or "429" in error_msg) and attempt < max_retries - 1:
+                logger.debug("[Step 3/5] Retrying in %ss", retry_delay)
+                await asyncio.sleep(retry_delay)
+                retry_delay *= 2
+                continue
+            logger.error("[Step 3/5] All retries failed")
+            raise e
+
+
 @app.post("/get-pages")
-async def get_pages(file: UploadFile = File(...)):
-    print(f"\n{'='*60}")
-    print(f"[/get-pages] 🚀 Request received: {file.filename}")
-    print(f"{'='*60}")
+async def get_pages(
+    background_tasks: BackgroundTasks,
+    file: UploadFile = File(...),
+    preview_only: bool = False,
+    defer_render: bool = False
+):
+    logger.info("[/get-pages] Request received: %s", file.filename)
     start_time = datetime.now(timezone.utc)
+    gemini_task = None
+    pdf_doc = None
     try:
         # Step 1: Read file
-        print(f"[Step 1/5] 📖 Reading file...")
-        content = await file.read()
-        print(f"[Step 1/5] ✅ File read successfully - Size: {len(content):,} bytes")
+        content = await read_upload(file)
+        if content is None:
+            logger.warning("[Step 1/5] File exceeds %s MB limit", MAX_UPLOAD_MB)
+            return camel_json_response({"status": 413, "success": False, "message": f"File exceeds the {MAX_UPLOAD_MB} MB upload limit.", "data": None})
+        logger.debug("[Step 1/5] File read - size=%d bytes", len(content))
         
         unique_id = str(uuid.uuid4())
-        model_used = DEFAULT_MODEL  # From .env
         file_ext = file.filename.split('.')[-1].lower()
         
+        upload_mime_type = mimetypes.guess_type(file.filename)[0] or "application/octet-stream"
+        mime_type = "application/pdf" if file_ext == "pdf" else f"image/{file_ext}"
+
+        # One parsed document serves the page count, the digital check and
+        # deferred page sizes; it is closed when the request finishes
+        page_count = 1
+        if file_ext == "pdf":
+            pdf_doc = fitz.open(stream=content, filetype="pdf")
+            page_count = len(pdf_doc)
+
+        # Only multi-page PDFs need the default (Pro) model; single pages use the cheaper classifier
+        model_used = DEFAULT_MODEL if file_ext == "pdf" and page_count > 1 else CLASSIFICATION_MODEL
+
+        # A cached detection for this exact file means no AI call at all
+        cached = None
+        if detection_cache.enabled:
+            cache_key = make_cache_key(content, model_used)
+            try:
+                cached = detection_cache.get(cache_key)
+            except Exception as cache_err:
+                logger.warning("[Step 1/5] Detection cache lookup failed: %s", cache_err)
+
+        # Speculatively start AI detection for PDFs while the text layer is analysed
+        # (and the file uploaded); cancelled if the text layer identifies every page
+        if file_ext == "pdf" and cached is None and SPECULATIVE_DETECTION_ENABLED:
+            gemini_task = asyncio.create_task(detect_forms_with_gemini(content, mime_type, model_used))
+
         # Detect if PDF is digital or scanned (no extra AI call)
         is_digital = False
+        local_detection = None
         if file_ext == "pdf":
-            is_digital = is_digital_pdf(content)
-            print(f"[Step 1/5] 📑 Document type: {'📄 DIGITAL (text-based)' if is_digital else '🖼️ SCANNED (image-based)'}")
+            is_digital, sampled_texts = await asyncio.to_thread(is_digital_pdf, pdf_doc)
+            if is_digital:
+                local_detection = await asyncio.to_thread(classify_text_layer, pdf_doc, sampled_texts)
+            logger.debug("[Step 1/5] Document type: %s - %d page(s)", "digital" if is_digital else "scanned", page_count)
         else:
             # Images are always treated as scanned
             is_digital = False
-            print(f"[Step 1/5] 🖼️ Image file detected - treating as scanned")
-        
-        # Step 2: Upload to Supabase
-        print(f"[Step 2/5] ☁️  Uploading to Supabase storage...")
-        supabase.storage.from_(UPLOADS_BUCKET).upload(f"{unique_id}.{file_ext}", content)
-        print(f"[Step 2/5] ✅ File uploaded to Supabase: {unique_id}.{file_ext}")
+            logger.debug("[Step 1/5] Image file detected - treating as scanned")
 
-        # Step 3: AI Detection
-        print(f"[Step 3/5] 🤖 Running AI form detection with {model_used}...")
-        mime_type = "application/pdf" if file_ext == "pdf" else f"image/{file_ext}"
+        if local_detection is not None and gemini_task is not None:
+            gemini_task.cancel()
+            gemini_task = None
         
-        max_retries = 3
-        retry_delay = 2
-        response = None
+        # Step 2: Upload to Supabase
+        await upload_to_storage(UPLOADS_BUCKET, f"{unique_id}.{file_ext}", content, upload_mime_type)
+        logger.debug("[Step 2/5] File uploaded to Supabase: %s.%s", unique_id, file_ext)
+
+        # Step 3: AI Detection (skipped for recognizable digital PDFs and cached files)
+        if local_detection is not None:
+            logger.debug("[Step 3/5] Forms recognized from text layer - skipping AI call")
+            detection_method = "rules"
+            response_parsed = local_detection
+            usage_data = {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0}
+        elif cached:
+            logger.debug("[Step 3/5] Detection cache hit - skipping AI call")
+            detection_method = "cache"
+            response_parsed = detection_from_cache(cached["parsed"])
+            usage_data = cached["usage"]
+        else:
+            logger.debug("[Step 3/5] Running AI form detection with %s", model_used)
+            detection_method = "gemini"
+            if gemini_task is not None:
+                response = await gemini_task
+            else:
+                response = await detect_forms_with_gemini(content, mime_type, model_used)
+
+            response_parsed = response.parsed
+            usage_data = {
+                "input_tokens": response.usage_metadata.prompt_token_count,
+                "output_tokens": response.usage_metadata.candidates_token_count,
+                "total_tokens": response.usage_metadata.total_token_count,
+                "cached_tokens": response.usage_metadata.cached_content_token_count or 0
+            }
 
-        for attempt in range(max_retries):
-            try:
-                print(f"[Step 3/5] 🔄 API call attempt {attempt + 1}/{max_retries}...")
-                response = client.models.generate_content(
-                    model=model_used,
-                    contents=[types.Part.from_bytes(data=content, mime_type=mime_type)],
-                    config=types.GenerateContentConfig(
-                        system_instruction=SYSTEM_PROMPT,
-                        response_mime_type="application/json",
-                        response_schema=DetectionResponse
-                    )
-                )
-                print(f"[Step 3/5] ✅ AI detection successful!")
-                break 
-            except Exception as e:
-                error_msg = str(e)
-                print(f"[Step 3/5] ⚠️  Attempt {attempt + 1} failed: {error_msg[:80]}...")
-                if ("503" in error_msg or "429" in error_msg) and attempt < max_retries - 1:
-                    print(f"[Step 3/5] ⏳ Retrying in {retry_delay}s...")
-                    time.sleep(retry_delay)
-                    retry_delay *= 2
-                    continue
-                print(f"[Step 3/5] ❌ All retries failed!")
-                raise e
+            if detection_cache.enabled and response_parsed:
+                try:
+                    detection_cache.set(cache_key, response_parsed.model_dump_json(), usage_data)
+                except Exception as cache_err:
+                    logger.warning("[Step 3/5] Detection cache write failed: %s", cache_err)
 
         # Step 4: Process results
-        print(f"[Step 4/5] 📊 Processing detection results...")
-        usage_data = {
-            "input_tokens": response.usage_metadata.prompt_token_count,
-            "output_tokens": response.usage_metadata.candidates_token_count,
-            "total_tokens": response.usage_metadata.total_token_count
-        }
-        
-        print(f"[Step 4/5] 📈 Token Usage - Input: {usage_data['input_tokens']:,} | Output: {usage_data['output_tokens']:,} | Total: {usage_data['total_tokens']:,}")
+        logger.debug(
+            "[Step 4/5] Token usage - input=%d output=%d total=%d",
+            usage_data["input_tokens"], usage_data["output_tokens"], usage_data["total_tokens"]
+        )
 
-        pages_to_process = response.parsed.relevant_pages if response.parsed else []
-        print(f"[Step 4/5] ✅ Found {len(pages_to_process)} page(s) with tax forms")
+        pages_to_process = response_parsed.relevant_pages if response_parsed else []
+        logger.debug("[Step 4/5] Found %d page(s) with tax forms", len(pages_to_process))
         
         final_pages_list = []
 
         # Step 5: Upload page images
-        print(f"[Step 5/5] 🖼️  Processing page images...")
         if file_ext == "pdf":
-            doc = fitz.open(stream=content, filetype="pdf")
+            pages_to_render = []
             for item in pages_to_process:
-                p_num = item.page_number
-                if p_num < 1 or p_num > len(doc): 
-                    print(f"[Step 5/5] ⚠️  Skipping invalid page number: {p_num}")
+                if item.page_number < 1 or item.page_number > page_count:
+                    logger.warning("[Step 5/5] Skipping invalid page number: %d", item.page_number)
                     continue
-                
-                print(f"[Step 5/5] 📄 Processing page {p_num}...")
-                page = doc[p_num - 1]
-                pix = page.get_pixmap(dpi=300) 
-                img_bytes = pix.tobytes("png")
-                
-                img_path = f"{unique_id}_p{p_num}.png"
-                supabase.storage.from_(PAGES_BUCKET).upload(img_path, img_bytes, {"content-type": "image/png"})
-                print(f"[Step 5/5] ✅ Page {p_num} uploaded - Forms: {item.number_of_forms}, Types: {item.detected_types}")
-                
-                # Calculate form regions (bounding boxes for real-time border rendering)
-                # Using page dimensions from the rendered image
-                page_width = pix.width
-                page_height = pix.height
-                form_regions = []
-                
-                num_forms = item.number_of_forms
-                if num_forms > 0:
-                    # Calculate approximate regions for each form
-                    # Assuming forms are stacked vertically on the page
-                    form_height = page_height // num_forms
-                    for i in range(num_forms):
-                        form_type = item.detected_types[i] if i < len(item.detected_types) else item.detected_types[0] if item.detected_types else "Unknown"
-                        form_regions.append({
-                            "form_type": form_type,
-                            "form_index": i,
-                            "bbox": {
-                                "x": 0,
-                                "y": i * form_height,
-                                "width": page_width,
-                                "height": form_height
-                            }
-                        })
-                
-                final_pages_list.append({
-                    "page_url": supabase.storage.from_(PAGES_BUCKET).get_public_url(img_path),
-                    "page_number": p_num,
-                    "number_of_forms": item.number_of_forms,
-                    "detected_types": item.detected_types,
-                    "is_digital": is_digital,
-                    "form_regions": form_regions
-                })
+                pages_to_render.append(item)
+
+            # Every flagged page stays in the response, but a page number detection
+            # lists more than once is rasterized and uploaded only once
+            unique_page_numbers = list(dict.fromkeys(item.page_number for item in pages_to_render))
+
+            if preview_only:
+                render_dpi = PREVIEW_DPI_DIGITAL if is_digital else PREVIEW_DPI_SCANNED
+                image_format, image_ext, image_mime = "jpeg", "jpg", "image/jpeg"
+            else:
+                render_dpi = LOSSLESS_DPI
+                image_format, image_ext, image_mime = "png", "png", "image/png"
+
+            if defer_render:
+                # Return immediately with polling tokens; render + upload after the response
+                for item in pages_to_render:
+                    p_num = item.page_number
+                    rect = pdf_doc[p_num - 1].rect
+                    page_width = int(rect.width * render_dpi / 72)
+                    page_height = int(rect.height * render_dpi / 72)
+                    render_token = f"{unique_id}_p{p_num}"
+                    register_page_render(render_token)
+                    final_pages_list.append({
+                        "pageUrl": None,
+                        "renderToken": render_token,
+                        "pageNumber": p_num,
+                        "numberOfForms": item.number_of_forms,
+                        "detectedTypes": item.detected_types,
+                        "isDigital": is_digital,
+                        "formRegions": build_form_regions(item, page_width, page_height)
+                    })
+
+                background_tasks.add_task(
+                    render_and_upload_pages, content, unique_id,
+                    unique_page_numbers, render_dpi, image_format, image_ext, image_mime
+                )
+                logger.debug("[Step 5/5] Deferred rendering of %d page(s)", len(unique_page_numbers))
+            else:
+                rendered_pages = []
+                if unique_page_numbers:
+                    logger.debug("[Step 5/5] Rendering %d page(s)", len(unique_page_numbers))
+                    rendered_pages = await render_pdf_pages(content, unique_page_numbers, render_dpi, image_format)
+
+                page_uploads = [
+                    (f"{unique_id}_p{p_num}.{image_ext}", img_bytes) for p_num, img_bytes, _, _ in rendered_pages
+                ]
+                page_sizes = {p_num: (page_width, page_height) for p_num, _, page_width, page_height in rendered_pages}
+                for item in pages_to_render:
+                    p_num = item.page_number
+                    page_width, page_height = page_sizes[p_num]
+                    img_path = f"{unique_id}_p{p_num}.{image_ext}"
+                    logger.debug("[Step 5/5] Page %d rendered - forms=%d types=%s", p_num, item.number_of_forms, item.detected_types)
+                    
+                    final_pages_list.append({
+                        "pageUrl": supabase.storage.from_(PAGES_BUCKET).get_public_url(img_path),
+                        "pageNumber": p_num,
+                        "numberOfForms": item.number_of_forms,
+                        "detectedTypes": item.detected_types,
+                        "isDigital": is_digital,
+                        "formRegions": build_form_regions(item, page_width, page_height)
+                    })
+
+                # Upload all rendered pages concurrently
+                await asyncio.gather(*[
+                    upload_to_storage(PAGES_BUCKET, img_path, img_bytes, image_mime)
+                    for img_path, img_bytes in page_uploads
+                ])
+                logger.debug("[Step 5/5] Uploaded %d page image(s)", len(page_uploads))
         else:
-            img_path = f"{unique_id}_p1.png"
-            supabase.storage.from_(PAGES_BUCKET).upload(img_path, content, {"content-type": f"image/{file_ext}"})
+            img_path = f"{unique_id}_p1.{file_ext}"
+            await upload_to_storage(PAGES_BUCKET, img_path, content, upload_mime_type)
             detected_types = pages_to_process[0].detected_types if pages_to_process else ["Unknown"]
             num_forms = pages_to_process[0].number_of_forms if pages_to_process else 1
-            print(f"[Step 5/5] ✅ Image uploaded - Types: {detected_types}")
+            logger.debug("[Step 5/5] Image uploaded - types=%s", detected_types)
             
             # For images, create simple form regions
             form_regions = []
             for i in range(num_forms):
                 form_type = detected_types[i] if i < len(detected_types) else detected_types[0] if detected_types else "Unknown"
                 form_regions.append({
-                    "form_type": form_type,
-                    "form_index": i,
+                    "formType": form_type,
+                    "formIndex": i,
                     "bbox": {
                         "x": 0,
                         "y": 0,
@@ -400,51 +868,55 @@ async def get_pages(file: UploadFile = File(...)):
                 })
             
             final_pages_list.append({
-                "page_url": supabase.storage.from_(PAGES_BUCKET).get_public_url(img_path),
-                "page_number": 1,
-                "number_of_forms": num_forms,
-                "detected_types": detected_types,
-                "is_digital": is_digital,
-                "form_regions": form_regions
+                "pageUrl": supabase.storage.from_(PAGES_BUCKET).get_public_url(img_path),
+                "pageNumber": 1,
+                "numberOfForms": num_forms,
+                "detectedTypes": detected_types,
+                "isDigital": is_digital,
+                "formRegions": form_regions
             })
 
         # Final summary
         end_time = datetime.now(timezone.utc)
         processing_time = (end_time - start_time).total_seconds()
         
-        print(f"\n{'='*60}")
-        print(f"[/get-pages] ✅ COMPLETED in {processing_time:.2f}s")
-        print(f"[/get-pages] 📄 Pages detected: {len(final_pages_list)}")
-        print(f"{'='*60}\n")
+        logger.info(
+            "[/get-pages] Completed in %.2fs - pages=%d method=%s model=%s tokens=%d",
+            processing_time, len(final_pages_list), detection_method, model_used, usage_data["total_tokens"]
+        )
         
-        raw_response = {
+        # Keys are already camelCase - no camelize_dict pass needed on the success path
+        return {
             "status": 200,
             "success": True,
             "message": "Detection complete and pages stored.",
             "data": { "pages": final_pages_list },
             "usage": {
                 "model": model_used,
-                "input_tokens": usage_data["input_tokens"],
-                "output_tokens": usage_data["output_tokens"],
-                "total_tokens": usage_data["total_tokens"],
-                "start_time": start_time.isoformat(),
-                "end_time": end_time.isoformat(),
-                "processing_time_seconds": round(processing_time, 3)
+                "classificationModel": CLASSIFICATION_MODEL,
+                "defaultModel": DEFAULT_MODEL,
+                "inputTokens": usage_data["input_tokens"],
+                "outputTokens": usage_data["output_tokens"],
+                "totalTokens": usage_data["total_tokens"],
+                "cachedTokens": usage_data.get("cached_tokens", 0),
+                "detectionMethod": detection_method,
+                "detectionCacheHit": cached is not None,
+                "startTime": start_time.isoformat(),
+                "endTime": end_time.isoformat(),
+                "processingTimeSeconds": round(processing_time, 3)
             }
         }
-        
-        return camelize_dict(raw_response)
 
     except Exception as e:
-        import traceback
+        if gemini_task is not None and not gemini_task.done():
+            gemini_task.cancel()
         end_time = datetime.now(timezone.utc)
         processing_time = (end_time - start_time).total_seconds()
-        print(f"\n{'='*60}")
-        print(f"[/get-pages] ❌ ERROR after {processing_time:.2f}s")
-        print(f"[/get-pages] Error: {str(e)}")
-        print(f"{'='*60}")
-        traceback.print_exc()
-        return camelize_dict({"status": 500, "success": False, "message": str(e), "data": None})
+        logger.exception("[/get-pages] Failed after %.2fs: %s", processing_time, e)
+        return camel_json_response({"status": 500, "success": False, "message": str(e), "data": None})
+    finally:
+        if pdf_doc is not None:
+            pdf_doc.close()
 
 
 
@@ -457,11 +929,37 @@ async def get_pages(file: UploadFile = File(...)):
 # --- Load Form Registry (Source of Truth) ---
 REGISTRY_PATH = os.path.join(os.path.dirname(__file__), "registry.json")
 
+
+@lru_cache(maxsize=128)
+def _load_json_file(path: str, mtime: float) -> dict:
+    """Parse a JSON file once per modification time (mtime is part of the cache key)."""
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+@lru_cache(maxsize=128)
+def _load_prompt_file(path: str, mtime: float) -> dict:
+    """Parse a prompt file once per version and precompute its prompt field list."""
+    with open(path, "r", encoding="utf-8") as f:
+        prompt_config = json.load(f)
+    prompt_config["_field_list"] = "\n".join(
+        f"- Code: {f['code']}, Label: {f['label']}" for f in prompt_config.get("fields", [])
+    )
+    return prompt_config
+
+
+def load_json_cached(path: str) -> dict:
+    """
+    Load a registry or prompt JSON file, re-parsing only when it changes on
+    disk (one stat per call). The returned dict is shared - do not mutate it.
+    """
+    return _load_json_file(path, os.stat(path).st_mtime)
+
+
 def load_registry() -> dict:
     """Load form registry from JSON file."""
     try:
-        with open(REGISTRY_PATH, "r", encoding="utf-8") as f:
-            return json.load(f)
+        return load_json_cached(REGISTRY_PATH)
     except FileNotFoundError:
         return {}
     except json.JSONDecodeError:
@@ -495,15 +993,12 @@ def load_prompt_for_form(form_type: str, version: str = None) -> dict:
     try:
         # Resolve the path relative to the current file
         full_path = os.path.join(os.path.dirname(__file__), prompt_path)
-        with open(full_path, "r", encoding="utf-8") as f:
-            return json.load(f)
+        return _load_prompt_file(full_path, os.stat(full_path).st_mtime)
     except FileNotFoundError:
         return None
     except json.JSONDecodeError:
         return None
 
-FORM_REGISTRY = load_registry()
-
 
 # --- Pydantic Models for Multi-Form Structured Output ---
 class BoxDetail(BaseModel):
@@ -536,6 +1031,7 @@ class PageInput(BaseModel):
 class BatchExtractRequest(BaseModel):
     """Request body for batch extraction - accepts multiple pages."""
     pages: List[PageInput]
+    mode: Optional[Literal["realtime", "batch"]] = None  # None: batch only above EXTRACT_BATCH_MIN_PAGES
 
 
 class ExtractResponse(BaseModel):
@@ -546,97 +1042,53 @@ class ExtractResponse(BaseModel):
     data: dict
 
 
-# --- Deep Extractor Endpoint (Batch Support) ---
-@app.post("/extract-form")
-async def extract_form(request: BatchExtractRequest):
-    """
-    API 2: Deep Extractor with Batch Support
-    
-    Performs structured data extraction from tax form images using Gemini.
-    Supports extracting from MULTIPLE pages in a single request (batch mode).
-    Pages are automatically chunked into groups of 10 (HTTP URL limit).
-    
-    - **pages**: Array of page objects with page_url, page_number, detected_type
-    
-    Returns extracted data grouped by page in the 'pageResults' field.
-    """
-    print(f"\n{'='*60}")
-    print(f"[/extract-form] 🚀 Batch extraction request received")
-    print(f"[/extract-form] � Total pages: {len(request.pages)}")
-    print(f"{'='*60}")
-    start_time = datetime.now(timezone.utc)
-    
-    try:
-        # Configuration
-        MAX_PAGES_PER_BATCH = 10  # HTTP URL limit for Gemini
-        model_used = DEFAULT_MODEL
-        
-        all_page_results = []
-        total_input_tokens = 0
-        total_output_tokens = 0
-        total_forms_extracted = 0
-        
-        # Group pages by detected_type for better prompting
-        pages_by_type = {}
-        for page in request.pages:
-            form_type = page.detected_type
-            if form_type not in pages_by_type:
-                pages_by_type[form_type] = []
-            pages_by_type[form_type].append(page)
-        
-        print(f"[Batch] 📊 Grouped into {len(pages_by_type)} form type(s): {list(pages_by_type.keys())}")
-        
-        # Process each form type separately (for optimal prompting)
-        for form_type, pages in pages_by_type.items():
-            print(f"\n[Batch] 🔄 Processing {len(pages)} page(s) of type: {form_type}")
-            
-            # Load prompt configuration for this form type
-            form_config = load_prompt_for_form(form_type)
-            if not form_config:
-                print(f"[Batch] ⚠️ Unsupported form type: {form_type}, skipping...")
-                for page in pages:
-                    all_page_results.append({
-                        "page_number": page.page_number,
-                        "detected_type": form_type,
-                        "extracted_forms": [],
-                        "error": f"Unsupported form type: {form_type}"
-                    })
-                continue
-            
-            form_name = form_config["formName"]
-            system_prompt = form_config["systemPrompt"]
-            fields = form_config["fields"]
-            field_list = "\n".join([f"- Code: {f['code']}, Label: {f['label']}" for f in fields])
-            
-            # Chunk pages into batches of MAX_PAGES_PER_BATCH
-            for chunk_idx in range(0, len(pages), MAX_PAGES_PER_BATCH):
-                chunk = pages[chunk_idx:chunk_idx + MAX_PAGES_PER_BATCH]
-                chunk_page_numbers = [p.page_number for p in chunk]
-                print(f"[Batch] 📦 Processing chunk: pages {chunk_page_numbers}")
-                
-                # Build multi-page extraction prompt
-                page_list_str = ", ".join([f"Page {p.page_number}" for p in chunk])
-                extraction_prompt = f"""
+# --- Deep Extractor Chunk Processing ---
+MAX_PAGES_PER_BATCH = 10  # HTTP URL limit for Gemini
+
+# Chunks of one request run concurrently; this caps in-flight Gemini calls
+# across all requests so parallel extraction doesn't trip 429 rate limits
+EXTRACT_MAX_CONCURRENCY = int(os.getenv("EXTRACT_MAX_CONCURRENCY", "8"))
+extract_semaphore = asyncio.Semaphore(EXTRACT_MAX_CONCURRENCY)
+
+# A stuck call is abandoned (and retried) instead of holding a semaphore slot
+EXTRACT_CALL_TIMEOUT_SECONDS = int(os.getenv("EXTRACT_CALL_TIMEOUT_SECONDS", "120"))
+EXTRACT_MAX_RETRY_DELAY_SECONDS = 30
+
+
+# Generation config shared by every realtime and batch extraction call (read-only)
+EXTRACT_SYSTEM_INSTRUCTION = "You are an expert tax document data extractor. Extract forms from ALL provided pages. For each form, include the page_number it was found on. Return valid JSON."
+EXTRACT_CONFIG = types.GenerateContentConfig(
+    system_instruction=EXTRACT_SYSTEM_INSTRUCTION,
+    response_mime_type="application/json",
+    response_schema=TaxFormData,
+    temperature=0.1
+)
+
+
+# Constant sections of the extraction prompt; build_chunk_contents joins them
+# with the form- and chunk-specific values
+EXTRACT_PROMPT_HEAD = """
 ROLE: Expert Tax Document Data Extractor.
-TASK: Extract ALL data from EVERY {form_type} form ({form_name}) visible on the provided pages.
+TASK: Extract ALL data from EVERY """
 
-YOU ARE VIEWING {len(chunk)} PAGE(S): {page_list_str}
-For EACH page, identify all forms and extract their data.
+EXTRACT_PROMPT_PAGE_TRACKING = """For EACH page, identify all forms and extract their data.
 
 CRITICAL - PAGE TRACKING:
-- The images are provided in order: first image = Page {chunk[0].page_number}, second image = Page {chunk[1].page_number if len(chunk) > 1 else chunk[0].page_number}, etc.
-- You MUST include the correct page_number for each extracted form.
+- The images are provided in order: first image = Page """
+
+EXTRACT_PROMPT_INSTRUCTIONS = """- You MUST include the correct page_number for each extracted form.
 
 CRITICAL - MULTI-FORM DETECTION:
 Each page may contain MULTIPLE copies of the same form (e.g., Copy A, Copy B, Copy C, Copy D).
 Identify EVERY individual form on EACH page. Create a SEPARATE entry for each form found.
 
 SPECIFIC INSTRUCTIONS:
-{system_prompt}
+"""
 
-MANDATORY FIELDS TO EXTRACT (EVERY field must be present in output):
-{field_list}
+EXTRACT_PROMPT_FIELDS = """MANDATORY FIELDS TO EXTRACT (EVERY field must be present in output):
+"""
 
+EXTRACT_PROMPT_TAIL = """
 EXTRACTION RULES:
 1. Process each page and identify all forms on it.
 2. For EACH form found, create a FormInstance with the correct page_number.
@@ -653,170 +1105,449 @@ EXTRACTION RULES:
 
 OUTPUT: Return a valid JSON object with 'extracted_forms' array. Each form MUST include page_number field.
 """
-                
-                # Build contents array with multiple images
-                contents = []
-                for page in chunk:
-                    contents.append(types.Part.from_uri(file_uri=page.page_url, mime_type="image/png"))
-                contents.append(extraction_prompt)
-                
-                # Call Gemini API with retry logic
-                max_retries = 3
-                retry_delay = 2
-                response = None
-                last_error = None
-                
-                for attempt in range(max_retries):
-                    try:
-                        print(f"[Batch] 🤖 API call attempt {attempt + 1}/{max_retries}...")
-                        response = client.models.generate_content(
-                            model=model_used,
-                            contents=contents,
-                            config=types.GenerateContentConfig(
-                                system_instruction="You are an expert tax document data extractor. Extract forms from ALL provided pages. For each form, include the page_number it was found on. Return valid JSON.",
-                                response_mime_type="application/json",
-                                response_schema=TaxFormData,
-                                temperature=0.1
-                            )
-                        )
-                        print(f"[Batch] ✅ API call successful!")
-                        break
-                    except Exception as e:
-                        last_error = e
-                        error_str = str(e)
-                        print(f"[Batch] ⚠️ Attempt {attempt + 1} failed: {error_str[:80]}...")
-                        if ("503" in error_str or "429" in error_str or "overloaded" in error_str.lower()) and attempt < max_retries - 1:
-                            print(f"[Batch] ⏳ Retrying in {retry_delay}s...")
-                            time.sleep(retry_delay)
-                            retry_delay *= 2
-                            continue
-                        raise e
-                
-                if response is None:
-                    raise last_error or Exception("Failed to get response from Gemini API")
-                
-                # Track token usage
-                total_input_tokens += response.usage_metadata.prompt_token_count
-                total_output_tokens += response.usage_metadata.candidates_token_count
-                
-                # Parse response
-                chunk_forms = []
-                if response.parsed:
-                    for form_instance in response.parsed.extracted_forms:
-                        chunk_forms.append({
-                            "form_name": form_instance.form_name,
-                            "form_year": form_instance.form_year,
-                            "copy": form_instance.copy_type,
-                            "box_details": [
-                                {"label": box.label, "code": box.code, "value": box.value}
-                                for box in form_instance.box_details
-                            ]
-                        })
-                else:
-                    # Fallback: try raw JSON parsing
-                    try:
-                        raw_text = response.text.strip()
-                        if raw_text.startswith("```json"):
-                            raw_text = raw_text[7:]
-                        if raw_text.startswith("```"):
-                            raw_text = raw_text[3:]
-                        if raw_text.endswith("```"):
-                            raw_text = raw_text[:-3]
-                        parsed_json = json.loads(raw_text.strip())
-                        if "extracted_forms" in parsed_json:
-                            chunk_forms = parsed_json["extracted_forms"]
-                    except json.JSONDecodeError:
-                        print(f"[Batch] ❌ JSON parse error for chunk")
-                
-                print(f"[Batch] 📄 Extracted {len(chunk_forms)} form(s) from chunk")
-                total_forms_extracted += len(chunk_forms)
-                
-                # Group forms by page number for response
-                forms_by_page = {}
-                for page in chunk:
-                    forms_by_page[page.page_number] = {
-                        "page_number": page.page_number,
-                        "detected_type": form_type,
-                        "extracted_forms": []
-                    }
-                
-                # Distribute forms to pages (AI should include page_number, but fallback to first page)
-                for form in chunk_forms:
-                    # Try to get page_number from form, default to first page in chunk
-                    page_num = form.get("page_number", chunk[0].page_number)
-                    if page_num in forms_by_page:
-                        forms_by_page[page_num]["extracted_forms"].append(form)
-                    else:
-                        # Fallback: add to first page
-                        first_page = chunk[0].page_number
-                        forms_by_page[first_page]["extracted_forms"].append(form)
-                
-                all_page_results.extend(forms_by_page.values())
+
+
+def build_chunk_contents(form_type: str, form_config: dict, chunk: List[PageInput]) -> list:
+    """Build the Gemini contents (page images + extraction prompt) for one chunk."""
+    form_name = form_config["formName"]
+    system_prompt = form_config["systemPrompt"]
+    field_list = form_config["_field_list"]
+
+    # Build multi-page extraction prompt (only the chunk-specific parts are formatted here)
+    page_numbers = [str(p.page_number) for p in chunk]
+    extraction_prompt = "".join([
+        EXTRACT_PROMPT_HEAD, form_type, " form (", form_name, ") visible on the provided pages.\n\n",
+        "YOU ARE VIEWING ", str(len(chunk)), " PAGE(S): Page ", ", Page ".join(page_numbers), "\n",
+        EXTRACT_PROMPT_PAGE_TRACKING, page_numbers[0],
+        ", second image = Page ", page_numbers[1] if len(chunk) > 1 else page_numbers[0], ", etc.\n",
+        EXTRACT_PROMPT_INSTRUCTIONS, system_prompt, "\n\n",
+        EXTRACT_PROMPT_FIELDS, field_list, "\n",
+        EXTRACT_PROMPT_TAIL
+    ])
+
+    # Page images in order, followed by the prompt
+    return [page_image_part(page.page_url) for page in chunk] + [extraction_prompt]
+
+
+@lru_cache(maxsize=1024)
+def page_image_part(page_url: str) -> types.Part:
+    """Gemini Part for a stored page image, reused across chunks and retries (treat as read-only)."""
+    return types.Part.from_uri(file_uri=page_url, mime_type=page_image_mime_type(page_url))
+
+
+
+
+def serialize_extracted_forms(parsed: TaxFormData) -> list:
+    """
+    Convert parsed TaxFormData into the response's form dicts. model_dump runs
+    in pydantic-core, avoiding a Python attribute access per box.
+    """
+    forms = []
+    for form_instance in parsed.extracted_forms:
+        form = form_instance.model_dump()
+        form["copy"] = form.pop("copy_type")
+        forms.append(form)
+    return forms
+
+
+def parse_chunk_forms(response) -> list:
+    """
+    Read the extracted forms from a Gemini response. Batch responses carry no
+    parsed object, so the raw JSON is validated against TaxFormData here.
+    """
+    if response.parsed:
+        return serialize_extracted_forms(response.parsed)
+
+    # Fallback: try raw JSON parsing
+    try:
+        raw_text = response.text.strip().removeprefix("```json").removeprefix("```").removesuffix("```")
+        parsed_json = json.loads(raw_text)
+        if "extracted_forms" in parsed_json:
+            try:
+                return serialize_extracted_forms(TaxFormData.model_validate(parsed_json))
+            except ValidationError:
+                return parsed_json["extracted_forms"]
+    except json.JSONDecodeError:
+        logger.error("[Batch] JSON parse error for chunk")
+    return []
+
+
+def distribute_chunk_forms(chunk_forms: list, form_type: str, chunk: List[PageInput]) -> list:
+    """Group a chunk's extracted forms into one result entry per page."""
+    # Group forms by page number for response
+    forms_by_page = {
+        page.page_number: {"page_number": page.page_number, "detected_type": form_type, "extracted_forms": []}
+        for page in chunk
+    }
+
+    # Distribute forms to pages (AI should include page_number, but fall back to the first page)
+    # page_number is dropped from the form itself - the enclosing page result carries it
+    first_page = chunk[0].page_number
+    for form in chunk_forms:
+        page_num = form.pop("page_number", first_page)
+        forms_by_page[page_num if page_num in forms_by_page else first_page]["extracted_forms"].append(form)
+
+    return list(forms_by_page.values())
+
+
+def failed_page_results(pages: List[PageInput], form_type: str, error: str) -> list:
+    """Result entries for pages that could not be extracted."""
+    return [
+        {
+            "page_number": page.page_number,
+            "detected_type": form_type,
+            "extracted_forms": [],
+            "error": error
+        }
+        for page in pages
+    ]
+
+
+def plan_extraction_chunks(pages: List[PageInput]) -> tuple:
+    """
+    Group pages by detected type and split each group into chunks.
+
+    Returns:
+        (chunk_jobs, unsupported_results) - chunk_jobs is a list of
+        (form_type, form_config, chunk); unsupported_results holds error
+        entries for pages whose form type has no prompt configuration
+    """
+    # Group pages by detected_type for better prompting
+    pages_by_type = defaultdict(list)
+    for page in pages:
+        pages_by_type[page.detected_type].append(page)
+
+    logger.debug("[Batch] Grouped into %d form type(s): %s", len(pages_by_type), list(pages_by_type))
+
+    chunk_jobs = []
+    unsupported_results = []
+    for form_type, type_pages in pages_by_type.items():
+        logger.debug("[Batch] Queueing %d page(s) of type: %s", len(type_pages), form_type)
+
+        # Load prompt configuration for this form type
+        form_config = load_prompt_for_form(form_type)
+        if not form_config:
+            logger.warning("[Batch] Unsupported form type: %s, skipping", form_type)
+            unsupported_results.extend(failed_page_results(type_pages, form_type, f"Unsupported form type: {form_type}"))
+            continue
+
+        # Chunk pages into batches of MAX_PAGES_PER_BATCH
+        for chunk_idx in range(0, len(type_pages), MAX_PAGES_PER_BATCH):
+            chunk = type_pages[chunk_idx:chunk_idx + MAX_PAGES_PER_BATCH]
+            chunk_jobs.append((form_type, form_config, chunk))
+
+    return chunk_jobs, unsupported_results
+
+
+async def extract_chunk(form_type: str, form_config: dict, chunk: List[PageInput], model: str) -> dict:
+    """
+    Extract all forms from one chunk (up to MAX_PAGES_PER_BATCH pages of a
+    single form type) with one Gemini call, retrying on 503/429/overloaded.
+
+    Returns:
+        Dict with "page_results" (one entry per page in the chunk),
+        "input_tokens", "output_tokens", "forms_extracted" and "latency_ms"
+        (duration of the successful Gemini call)
+    """
+    logger.debug("[Batch] Processing chunk: pages %s", [p.page_number for p in chunk])
+
+    contents = build_chunk_contents(form_type, form_config, chunk)
+
+    # Call Gemini API with retry logic
+    max_retries = 3
+    retry_delay = 2
+    response = None
+    last_error = None
+
+    for attempt in range(max_retries):
+        try:
+            logger.debug("[Batch] API call attempt %d/%d", attempt + 1, max_retries)
+            # A slot is held per attempt only; backoff sleeps below run outside it
+            async with extract_semaphore:
+                call_start = time.monotonic()
+                response = await asyncio.wait_for(
+                    client.aio.models.generate_content(
+                        model=model,
+                        contents=contents,
+                        config=EXTRACT_CONFIG
+                    ),
+                    timeout=EXTRACT_CALL_TIMEOUT_SECONDS
+                )
+                latency_ms = (time.monotonic() - call_start) * 1000
+            logger.debug("[Batch] API call successful")
+            break
+        except Exception as e:
+            last_error = e
+            timed_out = isinstance(e, asyncio.TimeoutError)
+            error_str = f"timed out after {EXTRACT_CALL_TIMEOUT_SECONDS}s" if timed_out else str(e)
+            logger.warning("[Batch] Attempt %d failed: %.80s", attempt + 1, error_str)
+            if (timed_out or "503" in error_str or "429" in error_str or "overloaded" in error_str.lower()) and attempt < max_retries - 1:
+                # Jitter spreads out retries from chunks that failed together
+                delay = retry_delay * random.uniform(0.8, 1.2)
+                logger.debug("[Batch] Retrying in %.1fs", delay)
+                await asyncio.sleep(delay)
+                retry_delay = min(retry_delay * 2, EXTRACT_MAX_RETRY_DELAY_SECONDS)
+                continue
+            raise e
+
+    if response is None:
+        raise last_error or Exception("Failed to get response from Gemini API")
+
+    chunk_forms = parse_chunk_forms(response)
+    logger.debug("[Batch] Extracted %d form(s) from chunk", len(chunk_forms))
+
+    return {
+        "page_results": distribute_chunk_forms(chunk_forms, form_type, chunk),
+        "input_tokens": response.usage_metadata.prompt_token_count,
+        "output_tokens": response.usage_metadata.candidates_token_count,
+        "forms_extracted": len(chunk_forms),
+        "latency_ms": latency_ms
+    }
+
+
+def save_extraction_history(filename: str, form_types: list, extracted_forms: list, usage: dict) -> None:
+    """Queue an extraction for the batched history insert (runs as a background task after the response)."""
+    def log_saved(future) -> None:
+        hist_err = future.exception()
+        if hist_err is not None:
+            logger.warning("[/extract-form] Failed to save history: %s", hist_err)
+        else:
+            logger.debug("[/extract-form] Saved to history: %d form(s)", len(extracted_forms))
+
+    # Queued for the history manager's batched insert; the outcome is logged when it lands
+    history_manager.save_entry(
+        filename=filename,
+        form_types=form_types,
+        extracted_forms=extracted_forms,
+        usage=usage
+    ).add_done_callback(log_saved)
+
+
+def complete_extraction(
+    all_page_results: list,
+    usage: dict,
+    pages: List[PageInput],
+    start_time: datetime,
+    start_monotonic: float,
+    background_tasks: BackgroundTasks
+) -> dict:
+    """
+    Build the /extract-form success response and schedule saving the
+    extracted forms to history. Shared by realtime requests and finished
+    batch jobs.
+
+    Args:
+        all_page_results: Page result entries for every requested page
+        usage: Model, token and call counts ("model", "input_tokens",
+            "output_tokens", "api_calls_made", optional "per_chunk_latency_ms")
+        pages: The originally requested pages
+        start_time: When the extraction was requested (wall clock, for timestamps)
+        start_monotonic: time.monotonic() at the same moment (for elapsed time)
+        background_tasks: Request's background tasks (history is written
+            after the response is sent)
+    """
+    processing_time = time.monotonic() - start_monotonic
+    end_time = datetime.now(timezone.utc)
+
+    extracted_forms_list = list(chain.from_iterable(
+        page_result.get("extracted_forms", ()) for page_result in all_page_results
+    ))
+    total_forms_extracted = len(extracted_forms_list)
+    total_tokens = usage["input_tokens"] + usage["output_tokens"]
+
+    logger.info(
+        "[/extract-form] Completed in %.2fs - pages=%d forms=%d calls=%d tokens=%d",
+        processing_time, len(pages), total_forms_extracted, usage["api_calls_made"], total_tokens
+    )
+
+    raw_response = {
+        "status": 200,
+        "success": True,
+        "message": f"Successfully extracted {total_forms_extracted} form(s) from {len(pages)} page(s).",
+        "data": {
+            "page_results": all_page_results
+        },
+        "usage": {
+            "model": usage["model"],
+            "input_tokens": usage["input_tokens"],
+            "output_tokens": usage["output_tokens"],
+            "total_tokens": total_tokens,
+            "start_time": start_time.isoformat(),
+            "end_time": end_time.isoformat(),
+            "processing_time_seconds": round(processing_time, 3),
+            "pages_processed": len(pages),
+            "api_calls_made": usage["api_calls_made"],
+            "per_chunk_latency_ms": usage.get("per_chunk_latency_ms", [])
+        }
+    }
+
+    # Save to history once the response has been sent
+    if extracted_forms_list:
+        # Get unique form types from the request
+        form_types = list(set(p.detected_type for p in pages))
+        # Use first page URL to derive filename (or use a generic name)
+        filename = f"extraction_{start_time.strftime('%Y%m%d_%H%M%S')}"
+        background_tasks.add_task(
+            save_extraction_history, filename, form_types, extracted_forms_list, raw_response["usage"]
+        )
+
+    return raw_response
+
+
+# --- Gemini Batch Mode ---
+# Batch jobs cost ~50% less per token and don't count against realtime rate
+# limits, but may take up to 24h. Requests opt in with mode="batch"; setting
+# EXTRACT_BATCH_MIN_PAGES also routes large requests there automatically
+# (off by default because the results are then fetched by polling).
+EXTRACT_BATCH_MIN_PAGES = int(os.getenv("EXTRACT_BATCH_MIN_PAGES", "0"))
+
+# Chunk layout of submitted jobs, needed to map results back to pages
+extract_batch_jobs = {}  # job_id -> {"model", "pages", "chunks", "unsupported_results", "start_time", "start_monotonic"}
+
+BATCH_PENDING_STATES = {
+    types.JobState.JOB_STATE_QUEUED,
+    types.JobState.JOB_STATE_PENDING,
+    types.JobState.JOB_STATE_RUNNING,
+}
+
+
+def use_batch_mode(request: BatchExtractRequest) -> bool:
+    """Decide whether a request is extracted via the Gemini Batch API."""
+    if request.mode is not None:
+        return request.mode == "batch"
+    return EXTRACT_BATCH_MIN_PAGES > 0 and len(request.pages) >= EXTRACT_BATCH_MIN_PAGES
+
+
+async def submit_extraction_batch(
+    request: BatchExtractRequest,
+    model: str,
+    start_time: datetime,
+    start_monotonic: float,
+    background_tasks: BackgroundTasks
+) -> Response:
+    """Queue every chunk of a request as one Gemini batch job."""
+    chunk_jobs, unsupported_results = plan_extraction_chunks(request.pages)
+
+    if not chunk_jobs:
+        # Nothing Gemini can extract - answer right away like a realtime request
+        return camel_json_response(complete_extraction(
+            unsupported_results,
+            {"model": model, "input_tokens": 0, "output_tokens": 0, "api_calls_made": 0},
+            request.pages, start_time, start_monotonic, background_tasks
+        ))
+
+    inlined_requests = [
+        types.InlinedRequest(
+            contents=[types.Content(role="user", parts=[
+                types.Part.from_text(text=part) if isinstance(part, str) else part
+                for part in build_chunk_contents(form_type, form_config, chunk)
+            ])],
+            config=EXTRACT_CONFIG
+        )
+        for form_type, form_config, chunk in chunk_jobs
+    ]
+    batch_job = await client.aio.batches.create(
+        model=model,
+        src=inlined_requests,
+        config=types.CreateBatchJobConfig(display_name=f"extract-form-{start_time.strftime('%Y%m%d_%H%M%S')}")
+    )
+    job_id = batch_job.name.split("/")[-1]
+    extract_batch_jobs[job_id] = {
+        "model": model,
+        "pages": request.pages,
+        "chunks": [(form_type, chunk) for form_type, _, chunk in chunk_jobs],
+        "unsupported_results": unsupported_results,
+        "start_time": start_time,
+        "start_monotonic": start_monotonic
+    }
+    logger.info("[/extract-form] Queued batch job %s with %d chunk(s)", job_id, len(chunk_jobs))
+
+    return camel_json_response({
+        "status": 202,
+        "success": True,
+        "message": f"Queued {len(request.pages)} page(s) for batch extraction.",
+        "data": {
+            "job_id": job_id,
+            "status": "queued"
+        },
+        "usage": {
+            "model": model,
+            "pages_processed": len(request.pages),
+            "api_calls_made": 1
+        }
+    })
+
+
+# --- Deep Extractor Endpoint (Batch Support) ---
+@app.post("/extract-form")
+async def extract_form(request: BatchExtractRequest, background_tasks: BackgroundTasks):
+    """
+    API 2: Deep Extractor with Batch Support
+    
+    Performs structured data extraction from tax form images using Gemini.
+    Supports extracting from MULTIPLE pages in a single request (batch mode).
+    Pages are automatically chunked into groups of 10 (HTTP URL limit), and
+    all chunks are extracted concurrently.
+    
+    - **pages**: Array of page objects with page_url, page_number, detected_type
+    - **mode**: "realtime" or "batch" (Gemini Batch API; poll GET /extract-form/{job_id})
+    
+    Returns extracted data grouped by page in the 'pageResults' field, or a
+    job id for batch mode.
+    """
+    logger.info("[/extract-form] Request received - pages=%d", len(request.pages))
+    start_time = datetime.now(timezone.utc)
+    start_monotonic = time.monotonic()
+    
+    try:
+        # Configuration
+        model_used = DEFAULT_MODEL
+
+        if use_batch_mode(request):
+            return await submit_extraction_batch(request, model_used, start_time, start_monotonic, background_tasks)
         
-        # Final summary
-        end_time = datetime.now(timezone.utc)
-        processing_time = (end_time - start_time).total_seconds()
+        total_input_tokens = 0
+        total_output_tokens = 0
+        api_calls_made = 0
+        per_chunk_latency_ms = []
         
-        print(f"\n{'='*60}")
-        print(f"[/extract-form] ✅ BATCH COMPLETED in {processing_time:.2f}s")
-        print(f"[/extract-form] 📄 Total forms extracted: {total_forms_extracted}")
-        print(f"[/extract-form] 📊 Total tokens: {total_input_tokens + total_output_tokens:,}")
-        print(f"{'='*60}\n")
+        # Build one job per chunk across all form types (separate prompts per type)
+        chunk_jobs, all_page_results = plan_extraction_chunks(request.pages)
         
-        extracted_forms_list = [
-            form for page_result in all_page_results
-            for form in page_result.get("extracted_forms", [])
-        ]
+        # Run all chunks concurrently (bounded by extract_semaphore)
+        chunk_results = await asyncio.gather(
+            *[extract_chunk(form_type, form_config, chunk, model_used) for form_type, form_config, chunk in chunk_jobs],
+            return_exceptions=True
+        )
         
-        raw_response = {
-            "status": 200,
-            "success": True,
-            "message": f"Successfully extracted {total_forms_extracted} form(s) from {len(request.pages)} page(s).",
-            "data": {
-                "page_results": all_page_results
-            },
-            "usage": {
-                "model": model_used,
-                "input_tokens": total_input_tokens,
-                "output_tokens": total_output_tokens,
-                "total_tokens": total_input_tokens + total_output_tokens,
-                "start_time": start_time.isoformat(),
-                "end_time": end_time.isoformat(),
-                "processing_time_seconds": round(processing_time, 3),
-                "pages_processed": len(request.pages),
-                "api_calls_made": sum(1 for _ in range(0, len(request.pages), MAX_PAGES_PER_BATCH))
-            }
-        }
+        for (form_type, _, chunk), result in zip(chunk_jobs, chunk_results):
+            if isinstance(result, Exception):
+                # A failed chunk only fails its own pages
+                logger.error("[Batch] Chunk %s failed: %.80s", [p.page_number for p in chunk], result)
+                all_page_results.extend(failed_page_results(chunk, form_type, str(result)))
+                continue
+            
+            # Track token usage and per-call latency
+            total_input_tokens += result["input_tokens"]
+            total_output_tokens += result["output_tokens"]
+            api_calls_made += 1
+            per_chunk_latency_ms.append(round(result["latency_ms"], 1))
+            all_page_results.extend(result["page_results"])
         
-        # Save to history
-        if extracted_forms_list:
-            try:
-                # Get unique form types from the request
-                form_types = list(set(p.detected_type for p in request.pages))
-                # Use first page URL to derive filename (or use a generic name)
-                filename = f"extraction_{start_time.strftime('%Y%m%d_%H%M%S')}"
-                history_manager.save_entry(
-                    filename=filename,
-                    form_types=form_types,
-                    extracted_forms=extracted_forms_list,
-                    usage=raw_response["usage"]
-                )
-                print(f"[/extract-form] 💾 Saved to history: {len(extracted_forms_list)} form(s)")
-            except Exception as hist_err:
-                print(f"[/extract-form] ⚠️ Failed to save history: {hist_err}")
+        raw_response = complete_extraction(all_page_results, {
+            "model": model_used,
+            "input_tokens": total_input_tokens,
+            "output_tokens": total_output_tokens,
+            "api_calls_made": api_calls_made,
+            "per_chunk_latency_ms": per_chunk_latency_ms
+        }, request.pages, start_time, start_monotonic, background_tasks)
         
-        return camelize_dict(raw_response)
+        return camel_json_response(raw_response)
     
     except Exception as e:
-        import traceback
-        end_time = datetime.now(timezone.utc)
-        processing_time = (end_time - start_time).total_seconds()
-        print(f"\n{'='*60}")
-        print(f"[/extract-form] ❌ ERROR after {processing_time:.2f}s")
-        print(f"[/extract-form] Error: {str(e)}")
-        print(f"{'='*60}")
-        traceback.print_exc()
-        return camelize_dict({
+        processing_time = time.monotonic() - start_monotonic
+        logger.exception("[/extract-form] Failed after %.2fs: %s", processing_time, e)
+        return camel_json_response({
             "status": 500,
             "success": False,
             "message": str(e),
@@ -824,17 +1555,105 @@ OUTPUT: Return a valid JSON object with 'extracted_forms' array. Each form MUST
         })
 
 
+@app.get("/extract-form/{job_id}")
+async def extract_form_status(job_id: str, background_tasks: BackgroundTasks):
+    """
+    Poll a batch extraction job (/extract-form with mode="batch").
+
+    Returns the job status while it runs, and the same page results as a
+    realtime /extract-form call once it has succeeded.
+    """
+    job = extract_batch_jobs.get(job_id)
+    if job is None:
+        return camel_json_response({"status": 404, "success": False, "message": "Unknown batch job.", "data": None})
+
+    try:
+        batch_job = await client.aio.batches.get(name=f"batches/{job_id}")
+
+        if batch_job.state in BATCH_PENDING_STATES:
+            return camel_json_response({
+                "status": 202,
+                "success": True,
+                "message": "Batch job still running.",
+                "data": {"job_id": job_id, "status": batch_job.state.value}
+            })
+
+        if batch_job.state != types.JobState.JOB_STATE_SUCCEEDED:
+            error_message = batch_job.error.message if batch_job.error else batch_job.state.value
+            return camel_json_response({
+                "status": 500,
+                "success": False,
+                "message": f"Batch job ended: {error_message}",
+                "data": {"job_id": job_id, "status": batch_job.state.value}
+            })
+
+        all_page_results = list(job["unsupported_results"])
+        total_input_tokens = 0
+        total_output_tokens = 0
+        for (form_type, chunk), inlined in zip(job["chunks"], batch_job.dest.inlined_responses):
+            if inlined.error or inlined.response is None:
+                error_message = inlined.error.message if inlined.error else "Empty batch response"
+                all_page_results.extend(failed_page_results(chunk, form_type, error_message))
+                continue
+            chunk_forms = parse_chunk_forms(inlined.response)
+            all_page_results.extend(distribute_chunk_forms(chunk_forms, form_type, chunk))
+            if inlined.response.usage_metadata:
+                total_input_tokens += inlined.response.usage_metadata.prompt_token_count or 0
+                total_output_tokens += inlined.response.usage_metadata.candidates_token_count or 0
+
+        raw_response = complete_extraction(all_page_results, {
+            "model": job["model"],
+            "input_tokens": total_input_tokens,
+            "output_tokens": total_output_tokens,
+            "api_calls_made": 1
+        }, job["pages"], job["start_time"], job["start_monotonic"], background_tasks)
+        extract_batch_jobs.pop(job_id, None)
+
+        return camel_json_response(raw_response)
+
+    except Exception as e:
+        logger.exception("[/extract-form] Batch job %s error: %s", job_id, e)
+        return camel_json_response({"status": 500, "success": False, "message": str(e), "data": None})
+
+
+
+# --- Deferred Page Render Status ---
+@app.get("/page-status/{render_token}")
+def page_status(render_token: str):
+    """
+    Poll a page rendered in the background (/get-pages?defer_render=true).
+
+    Returns the page URL once the image has been uploaded.
+    """
+    entry = page_render_status.get(render_token)
+    if entry is None:
+        return camel_json_response({"status": 404, "success": False, "message": "Unknown render token.", "data": None})
+
+    return camel_json_response({
+        "status": 200,
+        "success": True,
+        "message": f"Page render {entry['status']}.",
+        "data": {
+            "render_token": render_token,
+            "render_status": entry["status"],
+            "page_url": entry["page_url"],
+            "error": entry["error"]
+        }
+    })
+
 
 # --- Health Check & Info Endpoints ---
 @app.get("/")
 def root():
     """Root endpoint with API info."""
-    return camelize_dict({
+    return camel_json_response({
         "service": "US Tax Form Extractor API",
         "version": "2.1.0",
         "endpoints": {
             "detection": "POST /get-pages - Upload PDF/image for form detection",
-            "extraction": "POST /extract-form - Extract structured data (supports multi-form pages)"
+            "extraction": "POST /extract-form - Extract structured data (supports multi-form pages)",
+            "extraction_status": "GET /extract-form/{job_id} - Poll a batch extraction job (mode=batch)",
+            "page_status": "GET /page-status/{render_token} - Poll pages rendered with defer_render=true"
         },
         "features": [
             "Multi-form extraction from single page",
@@ -846,16 +1665,50 @@ def root():
     })
 
 
+# /health is polled by load balancers, so it reads a periodically refreshed
+# snapshot of the registry's form types instead of touching the disk
+REGISTRY_SNAPSHOT_REFRESH_SECONDS = 60
+registry_forms = list(load_registry().keys())
+_registry_refresh_task = None
+
+
+async def refresh_registry_snapshot():
+    """Re-read the registry form types every REGISTRY_SNAPSHOT_REFRESH_SECONDS."""
+    global registry_forms
+    while True:
+        await asyncio.sleep(REGISTRY_SNAPSHOT_REFRESH_SECONDS)
+        registry_forms = list(load_registry().keys())
+
+
+@app.on_event("startup")
+async def start_registry_refresh():
+    """Start the registry snapshot refresh loop."""
+    global _registry_refresh_task
+    _registry_refresh_task = asyncio.create_task(refresh_registry_snapshot())
+
+
+@app.on_event("shutdown")
+async def stop_registry_refresh():
+    """Stop the registry snapshot refresh loop."""
+    if _registry_refresh_task is not None:
+        _registry_refresh_task.cancel()
+
+
+@app.on_event("shutdown")
+async def flush_history():
+    """Insert any history entries still queued for the batched writer."""
+    await asyncio.to_thread(history_manager.flush)
+
+
 @app.get("/health")
 def health_check():
     """Health check endpoint."""
-    registry = load_registry()
-    return camelize_dict({
+    return camel_json_response({
         "status": "healthy",
         "gemini_configured": bool(GEMINI_API_KEY),
         "supabase_configured": bool(SUPABASE_URL and SUPABASE_KEY),
-        "registry_loaded": len(registry) > 0,
-        "supported_forms": list(registry.keys())
+        "registry_loaded": len(registry_forms) > 0,
+        "supported_forms": registry_forms
     })
 
 
@@ -878,7 +1731,7 @@ def get_files(limit: int = 50):
         
         print(f"[/get-files] ✅ Retrieved {len(files)} file(s)")
         
-        return camelize_dict({
+        return camel_json_response({
             "status": 200,
             "success": True,
             "message": f"Retrieved {len(files)} file(s) from history.",
@@ -888,7 +1741,7 @@ def get_files(limit: int = 50):
         })
     except Exception as e:
         print(f"[/get-files] ❌ Error: {str(e)}")
-        return camelize_dict({
+        return camel_json_response({
             "status": 500,
             "success": False,
             "message": str(e),
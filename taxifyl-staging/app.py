@@ -6,12 +6,16 @@ Auto-detects form types and extracts data in exact plane-based JSON format.
 
 import streamlit as st
 import json
+import functools
 import os
+import re
 import sys
+import threading
 import time
 from datetime import datetime
 from io import BytesIO
 from pathlib import Path
+from types import MappingProxyType
 from PIL import Image
 
 sys.path.insert(0, str(Path(__file__).parent))
@@ -19,38 +23,11 @@ sys.path.insert(0, str(Path(__file__).parent))
 from dotenv import load_dotenv
 load_dotenv()
 
-# Import multi-page K-1 processor
-try:
-    from forms.form_k1.extractor import MultiPageK1Processor
-    MULTIPAGE_K1_AVAILABLE = True
-except ImportError:
-    MULTIPAGE_K1_AVAILABLE = False
-    MultiPageK1Processor = None
-
-# Import multi-page K-3 processor
-try:
-    from forms.form_k3.extractor import MultiPageK3Processor
-    MULTIPAGE_K3_AVAILABLE = True
-except ImportError:
-    MULTIPAGE_K3_AVAILABLE = False
-    MultiPageK3Processor = None
-
-# Import multi-page Form 8805 processor
-try:
-    from forms.form_8805.extractor import MultiPage8805Processor
-    MULTIPAGE_8805_AVAILABLE = True
-except ImportError:
-    MULTIPAGE_8805_AVAILABLE = False
-    MultiPage8805Processor = None
-
-# Import multi-page Form 8804 processor
-try:
-    from forms.form_8804.extractor import MultiPage8804Processor
-    MULTIPAGE_8804_AVAILABLE = True
-except ImportError:
-    MULTIPAGE_8804_AVAILABLE = False
-    MultiPage8804Processor = None
+from forms.result_cache import image_content_hash
 
+# Multi-page PDF processors (and the PDF renderer) are imported on first use (see
+# load_multipage_processors and pdf_to_images) rather than here: the extractors
+# and their SDK clients would otherwise block the initial render.
 try:
     import fitz
     PDF_SUPPORT = True
@@ -63,6 +40,12 @@ try:
 except ImportError:
     TESSERACT_AVAILABLE = False
 
+try:
+    import hyperscan
+    HYPERSCAN_AVAILABLE = True
+except ImportError:
+    HYPERSCAN_AVAILABLE = False
+
 try:
     import google.generativeai as genai
     GEMINI_AVAILABLE = True
@@ -89,174 +72,142 @@ st.set_page_config(
 # =============================================================================
 # Custom CSS
 # =============================================================================
-st.markdown("""
-<style>
-    @import url('https://fonts.googleapis.com/css2?family=Inter:wght@300;400;500;600;700&display=swap');
-    * { font-family: 'Inter', sans-serif; }
-    
-    .stApp { background: linear-gradient(135deg, #0f172a 0%, #1e293b 50%, #0f172a 100%); }
-    
-    .main-header {
-        background: linear-gradient(135deg, rgba(99, 102, 241, 0.1), rgba(139, 92, 246, 0.1));
-        border: 1px solid rgba(99, 102, 241, 0.2);
-        border-radius: 16px;
-        padding: 1.25rem;
-        margin-bottom: 1.5rem;
-        text-align: center;
-    }
-    .main-header h1 {
-        background: linear-gradient(135deg, #818cf8, #a78bfa);
-        -webkit-background-clip: text;
-        -webkit-text-fill-color: transparent;
-        font-size: 1.8rem;
-        font-weight: 700;
-        margin: 0;
-    }
-    .main-header p { color: #94a3b8; font-size: 0.95rem; margin: 0.3rem 0 0 0; }
-    
-    .form-detected {
-        background: rgba(34, 197, 94, 0.1);
-        border: 1px solid rgba(34, 197, 94, 0.3);
-        border-radius: 10px;
-        padding: 0.75rem 1rem;
-        margin: 0.75rem 0;
-    }
-    .form-unknown {
-        background: rgba(239, 68, 68, 0.1);
-        border: 1px solid rgba(239, 68, 68, 0.3);
-        border-radius: 10px;
-        padding: 0.75rem 1rem;
-        margin: 0.75rem 0;
-    }
-    
-    /* Section Header - matching original app */
-    .section-header {
-        color: #e2e8f0;
-        font-size: 1.25rem;
-        font-weight: 600;
-        margin: 1.5rem 0 1rem 0;
-        padding-bottom: 0.5rem;
-        border-bottom: 1px solid rgba(255, 255, 255, 0.1);
-    }
-    
-    /* Info Field - Label + Value */
-    .info-field { margin-bottom: 0.75rem; }
-    .info-label {
-        font-size: 0.75rem;
-        color: #64748b;
-        text-transform: uppercase;
-        letter-spacing: 0.05em;
-        margin-bottom: 0.25rem;
-    }
-    .info-value { font-size: 1rem; font-weight: 500; color: #e2e8f0; }
-    
-    /* Box Card - Main styling like original app */
-    .box-card {
-        background: rgba(30, 41, 59, 0.8);
-        padding: 1rem 1.25rem;
-        border-radius: 10px;
-        border: 1px solid rgba(255, 255, 255, 0.06);
-        margin-bottom: 0.75rem;
-        transition: all 0.2s ease;
-    }
-    .box-card:hover {
-        border-color: rgba(99, 102, 241, 0.3);
-        background: rgba(30, 41, 59, 0.9);
-    }
-    .box-label {
-        font-size: 0.7rem;
-        color: #94a3b8;
-        text-transform: uppercase;
-        letter-spacing: 0.05em;
-        margin-bottom: 0.35rem;
-    }
-    .box-value {
-        font-size: 1.4rem;
-        font-weight: 700;
-        color: #e2e8f0;
-    }
-    .box-value-money { color: #4ade80 !important; }
-    .box-value-small { font-size: 1rem; font-weight: 500; }
-    
-    /* Form Info Header */
-    .form-info-header {
-        background: rgba(30, 41, 59, 0.6);
-        border: 1px solid rgba(255, 255, 255, 0.08);
-        border-radius: 12px;
-        padding: 1.25rem;
-        margin-bottom: 1.5rem;
-    }
-    .form-info-title { color: #a78bfa; font-weight: 600; font-size: 1.1rem; margin-bottom: 1rem; }
-    
-    /* Subsection Title */
-    .subsection-title { color: #e2e8f0; font-weight: 600; font-size: 1rem; margin-bottom: 0.75rem; }
-    
-    /* Metrics */
-    .metric-box {
-        background: rgba(30, 41, 59, 0.5);
-        border: 1px solid rgba(255, 255, 255, 0.08);
-        border-radius: 10px;
-        padding: 0.6rem;
-        text-align: center;
-    }
-    .metric-value { font-size: 1.1rem; font-weight: 700; color: #818cf8; }
-    .metric-label { font-size: 0.7rem; color: #94a3b8; }
-    
-    /* Logs */
-    .log-item {
-        background: rgba(15, 23, 42, 0.5);
-        border-left: 3px solid #22c55e;
-        padding: 0.4rem 0.6rem;
-        margin-bottom: 0.3rem;
-        border-radius: 0 6px 6px 0;
-        font-size: 0.75rem;
-        color: #94a3b8;
-    }
-    .log-item-error { border-left-color: #ef4444; }
-    
-    /* Scrollable Review Container */
-    .review-scroll-container {
-        max-height: 500px;
-        overflow-y: auto;
-        overflow-x: hidden;
-        padding-right: 0.5rem;
-        scrollbar-width: thin;
-        scrollbar-color: rgba(139, 92, 246, 0.5) rgba(30, 41, 59, 0.3);
-    }
-    .review-scroll-container::-webkit-scrollbar {
-        width: 8px;
-    }
-    .review-scroll-container::-webkit-scrollbar-track {
-        background: rgba(30, 41, 59, 0.3);
-        border-radius: 4px;
-    }
-    .review-scroll-container::-webkit-scrollbar-thumb {
-        background: rgba(139, 92, 246, 0.5);
-        border-radius: 4px;
-    }
-    .review-scroll-container::-webkit-scrollbar-thumb:hover {
-        background: rgba(139, 92, 246, 0.7);
-    }
-</style>
-""", unsafe_allow_html=True)
+# The stylesheet lives in static/app.css and is inlined as one <style> tag.
+# It is not served through Streamlit's static file server: before the Starlette
+# server, that served .css as text/plain with nosniff, so browsers ignored it.
+APP_CSS_PATH = Path(__file__).parent / "static" / "app.css"
+
+
+@st.cache_resource
+def get_stylesheet_tag(mtime):
+    """Minify static/app.css into a <style> tag (rebuilt when the file's mtime changes)."""
+    css = APP_CSS_PATH.read_text(encoding="utf-8")
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.DOTALL)
+    css = re.sub(r'\s+', ' ', css)
+    css = re.sub(r'\s*([{};,>])\s*', r'\1', css)
+    css = re.sub(r':\s+', ':', css)
+    css = re.sub(r'(?<![\w.])0\.(\d)', r'.\1', css)  # 0.5 -> .5 (alpha channels, rem sizes)
+    return f"<style>{css.replace(';}', '}').strip()}</style>"
+
+
+def inject_css():
+    """
+    Emit the app stylesheet.
+
+    Must run on every script rerun: Streamlit drops any element a rerun does not
+    re-emit, so a "first run only" guard would strip the styles after one
+    interaction. An unchanged element is reconciled without re-rendering.
+    """
+    tag = get_stylesheet_tag(APP_CSS_PATH.stat().st_mtime)
+    if hasattr(st, "html"):
+        # Streamlit >= 1.33: injects raw HTML, skipping the markdown parser entirely
+        st.html(tag)
+    else:
+        st.markdown(tag, unsafe_allow_html=True)
+
+
+inject_css()
 
 
 # =============================================================================
 # Supported Forms
 # =============================================================================
+# Patterns are listed most-frequent first (a pattern contained in another one always
+# occurs at least as often), so matchers that probe them in order hit early.
 SUPPORTED_FORMS = {
-    "W-2": {"name": "Wage and Tax Statement", "patterns": ["W-2", "W2", "Wage and Tax Statement", "Form W-2"], "icon": "📄"},
-    "1099-INT": {"name": "Interest Income", "patterns": ["1099-INT", "1099INT", "Interest Income", "Combined Statement For Form 1099-INT", "Combined Statement For Form"], "icon": "💰"},
+    "W-2": {"name": "Wage and Tax Statement", "patterns": ["W-2", "Wage and Tax Statement", "Form W-2", "W2"], "icon": "📄"},
+    "1099-INT": {"name": "Interest Income", "patterns": ["1099-INT", "Interest Income", "Combined Statement For Form", "Combined Statement For Form 1099-INT", "1099INT"], "icon": "💰"},
     "1099-NEC": {"name": "Nonemployee Compensation", "patterns": ["1099-NEC", "1099NEC"], "icon": "💼"},
     "1099-MISC": {"name": "Miscellaneous Income", "patterns": ["1099-MISC", "1099MISC"], "icon": "📋"},
     "1099-R": {"name": "Distributions From Pensions", "patterns": ["1099-R", "1099R"], "icon": "🏦"},
     "1099-K": {"name": "Payment Card Transactions", "patterns": ["1099-K", "1099K"], "icon": "💳"},
     "1098": {"name": "Mortgage Interest Statement", "patterns": ["1098", "Mortgage Interest"], "icon": "🏠"},
-    "K-1": {"name": "Partner's Share of Income", "patterns": ["K-1", "K1", "Schedule K-1", "1065", "Partner's Share"], "icon": "📊"},
-    "K-3": {"name": "Partner's Share - International", "patterns": ["K-3", "K3", "Schedule K-3", "International", "Foreign Tax Credit"], "icon": "🌐"},
+    "K-1": {"name": "Partner's Share of Income", "patterns": ["K-1", "1065", "Schedule K-1", "Partner's Share", "K1"], "icon": "📊"},
+    "K-3": {"name": "Partner's Share - International", "patterns": ["K-3", "Schedule K-3", "International", "Foreign Tax Credit", "K3"], "icon": "🌐"},
     "8805": {"name": "Foreign Partner's Information", "patterns": ["8805", "Form 8805", "Section 1446", "Foreign Partner"], "icon": "🌍"},
     "8804": {"name": "Partnership Withholding Tax", "patterns": ["8804", "Form 8804", "Annual Return for Partnership Withholding"], "icon": "📑"}
 }
+# Logically constant - freeze it (read-only views, pattern tuples) so nothing can mutate it
+SUPPORTED_FORMS = MappingProxyType({
+    form_type: MappingProxyType({**info, "patterns": tuple(info["patterns"])})
+    for form_type, info in SUPPORTED_FORMS.items()
+})
+
+# Detection patterns are fused into case-insensitive regexes with a named group per
+# form, each scanned in a single pass over the text. The lookahead tests every position, and
+# groups are listed in SUPPORTED_FORMS order so a position matching several forms reports
+# the earliest one. Within a group, patterns keep their most-frequent-first order.
+# Case folding happens inside the compiled matcher (re.IGNORECASE here, HS_FLAG_CASELESS
+# for Hyperscan), so neither the patterns nor the OCR text are lowered per call.
+_FORM_GROUPS = {"f_" + re.sub(r"\W", "_", form_type): form_type for form_type in SUPPORTED_FORMS}
+
+
+def _compile_form_patterns(form_types):
+    """Fuse the patterns of form_types into one lookahead regex (one named group per form)."""
+    return re.compile(
+        "(?=" + "|".join(
+            f"(?P<{group}>" + "|".join(re.escape(p) for p in SUPPORTED_FORMS[form_type]["patterns"]) + ")"
+            for group, form_type in _FORM_GROUPS.items() if form_type in form_types
+        ) + ")",
+        re.IGNORECASE
+    )
+
+
+# Partnership forms are rare uploads and sit at the end of SUPPORTED_FORMS, so any match
+# in the common tier outranks every rare one: the (smaller) common regex is scanned first
+# and the rare tier only runs when nothing common matched
+RARE_FORMS = frozenset({"K-1", "K-3", "8805", "8804"})
+_FORM_PATTERN_TIERS = (
+    _compile_form_patterns([ft for ft in SUPPORTED_FORMS if ft not in RARE_FORMS]),
+    _compile_form_patterns([ft for ft in SUPPORTED_FORMS if ft in RARE_FORMS]),
+)
+# Pattern -> form map for the Hyperscan database, which takes one expression per pattern
+_FORM_BY_PATTERN = {}
+for _form_type, _info in SUPPORTED_FORMS.items():
+    for _pattern in _info["patterns"]:
+        _FORM_BY_PATTERN.setdefault(_pattern.upper(), _form_type)
+_FORM_ORDER = {form_type: i for i, form_type in enumerate(SUPPORTED_FORMS)}
+_FORM_TYPES = list(SUPPORTED_FORMS)
+# Sidebar list of supported forms, built once and rendered as a single caption element
+# (markdown hard line breaks) instead of one st.caption per form on every rerun
+SUPPORTED_FORMS_CAPTION = "  \n".join(f"{info['icon']} {ft}" for ft, info in SUPPORTED_FORMS.items())
+
+
+@st.cache_resource
+def get_form_pattern_db():
+    """Compile the detection patterns into one Hyperscan database (once per process)."""
+    db = hyperscan.Database()
+    db.compile(
+        expressions=[re.escape(pattern).encode() for pattern in _FORM_BY_PATTERN],
+        # Match ids are form positions in SUPPORTED_FORMS, so the smallest id wins
+        ids=[_FORM_ORDER[form_type] for form_type in _FORM_BY_PATTERN.values()],
+        flags=[hyperscan.HS_FLAG_CASELESS | hyperscan.HS_FLAG_SINGLEMATCH] * len(_FORM_BY_PATTERN)
+    )
+    return db
+
+
+def match_form_type(text):
+    """Return the first SUPPORTED_FORMS key with a pattern occurring in text, or None."""
+    # No OCR text (e.g. Tesseract not installed) - skip the scan entirely
+    if not text:
+        return None
+    
+    if HYPERSCAN_AVAILABLE:
+        # SIMD multi-pattern scan inside libhs; the callback only collects form ids
+        form_ids = set()
+        get_form_pattern_db().scan(
+            text.encode(),
+            match_event_handler=lambda form_id, start, end, flags, context: form_ids.add(form_id)
+        )
+        return _FORM_TYPES[min(form_ids)] if form_ids else None
+    
+    # The matching group names the form; patterns stay substrings rather than whole
+    # tokens so e.g. "1098" still matches inside "1098-T"
+    for patterns_re in _FORM_PATTERN_TIERS:
+        matches = {_FORM_GROUPS[m.lastgroup] for m in patterns_re.finditer(text)}
+        if matches:
+            return min(matches, key=_FORM_ORDER.get)
+    return None
 
 
 
@@ -353,6 +304,223 @@ CRITICAL: Read each box individually from its labeled position on the form.
 Output only JSON.'''
 
 
+# =============================================================================
+# Transformer Helpers
+# =============================================================================
+def index_flat(flat):
+    """
+    Index a flattened dict for find_value().
+
+    Returns the lowercased (key, value) pairs of the usable (non-empty) entries and
+    an exact-key map of them (first entry wins on duplicate keys).
+    """
+    items = [(k.lower(), v) for k, v in flat.items() if v is not None and v != "" and v != "N/A"]
+    return items, dict(reversed(items))
+
+
+def find_value(flat_index, keys, default=None):
+    """
+    Find a value by multiple possible keys: an exact key first, then the first key containing it.
+
+    keys must be lowercase (they are matched against the lowercased flat keys as-is).
+    """
+    items, by_key = flat_index
+    for key in keys:
+        if key in by_key:
+            return by_key[key]
+        for k, v in items:
+            if key in k:
+                return v
+    return default
+
+
+def parse_amount(val, default=0.00, paren_negative=False):
+    """Parse a number or a "$1,234.56" string; "(12.50)" is negative when paren_negative is set."""
+    if isinstance(val, (int, float)):
+        return float(val)
+    if isinstance(val, str):
+        val = val.replace("$", "").replace(",", "")
+        if paren_negative:
+            val = val.replace("(", "-").replace(")", "")
+        try:
+            return float(val.strip())
+        except:
+            return default
+    return default
+
+
+def find_number(flat_index, keys, default=0.00, paren_negative=False):
+    """Find a numeric value; default when missing, or when unparseable (0.00 if default is None)."""
+    val = find_value(flat_index, keys, None)
+    if val is None:
+        return default
+    return parse_amount(val, default if default is not None else 0.00, paren_negative)
+
+
+def clean_bool(val):
+    if isinstance(val, bool):
+        return val
+    if isinstance(val, str):
+        return val.lower() in ["true", "yes", "1", "x", "checked"]
+    return False
+
+
+def find_bool(flat_index, keys):
+    return clean_bool(find_value(flat_index, keys, False))
+
+
+def clean_string(val, rstrip_chars=None):
+    """Flatten newlines to ", " and trim; optionally strip trailing rstrip_chars."""
+    if val is None:
+        return ""
+    if isinstance(val, str):
+        val = val.replace("\n", ", ").replace("\r", "").strip()
+        return val.rstrip(rstrip_chars) if rstrip_chars else val
+    return str(val)
+
+
+def clean_number(val, default=0.00, paren_negative=False):
+    if val is None:
+        return default
+    return parse_amount(val, default, paren_negative)
+
+
+def clean_array(val):
+    if isinstance(val, list):
+        return val
+    return []
+
+
+def find_combined_value(flat_index, name_keys, address_keys, default="", separator="\n"):
+    """Combine two field values into a single value with a configurable separator."""
+    name = find_value(flat_index, name_keys, "")
+    address = find_value(flat_index, address_keys, "")
+    
+    # Clean up values
+    if isinstance(name, str):
+        name = name.strip()
+    else:
+        name = str(name) if name else ""
+    
+    if isinstance(address, str):
+        address = address.strip()
+    else:
+        address = str(address) if address else ""
+    
+    # Combine name and address
+    if name and address:
+        return f"{name}{separator}{address}"
+    elif name:
+        return name
+    elif address:
+        return address
+    else:
+        return default
+
+
+def get_nested_value(data, *keys):
+    """Safely get nested value from dict/list structure."""
+    try:
+        result = data
+        for key in keys:
+            if isinstance(result, list):
+                result = result[int(key)]
+            elif isinstance(result, dict):
+                result = result.get(key)
+            else:
+                return None
+        return result
+    except (KeyError, IndexError, TypeError, ValueError):
+        return None
+
+
+def index_plane(plane):
+    """Map each code in a plane to its value (first entry wins on duplicate codes)."""
+    values = {}
+    for item in plane or ():
+        for d in item.get("data", []):
+            values.setdefault(d.get("code"), d.get("value"))
+    return values
+
+
+def get_plane_value(plane, code):
+    """Get value from a plane by code."""
+    if not plane:
+        return None
+    for item in plane:
+        data_list = item.get("data", [])
+        for d in data_list:
+            if d.get("code") == code:
+                return d.get("value")
+    return None
+
+
+# =============================================================================
+# W-2 Output Layout
+# =============================================================================
+# One row per box: (code, label, finder, *finder args), finders keyed in W2_FINDERS;
+# a tuple label is a key list for find_value (box 12 codes).
+W2_FINDERS = {"value": find_value, "number": find_number, "bool": find_bool, "combined": find_combined_value}
+W2_IDENTIFICATION_ROWS = (
+    ("a", "Employee's SSA number", "value", ("ssn", "ssa", "employee_ssn", "social_security", "box_a"), ""),
+    ("b", "Employer's FED ID number", "value", ("ein", "fed_id", "employer_ein", "employer_fed", "box_b"), ""),
+    ("c", "Employer's name and address", "combined", ("employer_name",), ("employer_address", "employer_street", "employer_city"), ""),
+    ("d", "Control number", "value", ("control", "control_number", "box_d"), ""),
+    ("dept", "Department", "value", ("dept", "department", "dept_code"), ""),
+    ("e/f", "Employee's name and address", "combined", ("employee_name",), ("employee_address", "employee_street", "employee_city"), ""),
+)
+W2_FEDERAL_TAX_ROWS = (
+    ("1", "Wages, tips, other comp.", "number", ("box_1", "box1", "wages", "wages_tips")),
+    ("2", "Federal income tax withheld", "number", ("box_2", "box2", "federal_income_tax", "federal_tax_withheld")),
+    ("3", "Social security wages", "number", ("box_3", "box3", "social_security_wages")),
+    ("4", "Social security tax withheld", "number", ("box_4", "box4", "social_security_tax")),
+    ("5", "Medicare wages and tips", "number", ("box_5", "box5", "medicare_wages")),
+    ("6", "Medicare tax withheld", "number", ("box_6", "box6", "medicare_tax")),
+    ("7", "Social security tips", "number", ("box_7", "box7", "social_security_tips")),
+    ("8", "Allocated tips", "number", ("box_8", "box8", "allocated_tips")),
+    ("9", "Verification code", "value", ("box_9", "box9", "verification_code", "verification"), ""),
+    ("10", "Dependent care benefits", "number", ("box_10", "box10", "dependent_care")),
+    ("11", "Nonqualified plans", "number", ("box_11", "box11", "nonqualified")),
+)
+W2_SUPPLEMENTAL_ROWS = (
+    ("12a", ("box_12a_code", "12a_code"), "number", ("box_12a_amount", "12a_amount", "box_12a")),
+    ("12b", ("box_12b_code", "12b_code"), "number", ("box_12b_amount", "12b_amount", "box_12b")),
+    ("12c", ("box_12c_code", "12c_code"), "number", ("box_12c_amount", "12c_amount", "box_12c")),
+    ("12d", ("box_12d_code", "12d_code"), "number", ("box_12d_amount", "12d_amount", "box_12d")),
+    ("13", "Statutory employee", "bool", ("box_13_statutory", "box_13_statutory_employee", "statutory_employee", "statutory")),
+    ("13b", "Retirement plan", "bool", ("box_13_retirement", "box_13_retirement_plan", "retirement_plan", "retirement")),
+    ("13c", "Third-party sick pay", "bool", ("box_13_sick_pay", "box_13_third_party_sick_pay", "third_party_sick_pay", "sick_pay")),
+    ("14", "Other", "value", ("box_14", "box_14_other", "other"), None),
+)
+W2_STATE_LOCAL_ROWS = (
+    ("15", "State / Employer ID", "combined", ("box_15_state", "state"), ("box_15_state_id", "state_id", "employer_state_id"), None, " "),
+    ("16", "State wages, tips, etc.", "number", ("box_16", "state_wages")),
+    ("17", "State income tax", "number", ("box_17", "state_income_tax", "state_tax")),
+    ("18", "Local wages, tips, etc.", "number", ("box_18", "local_wages")),
+    ("19", "Local income tax", "number", ("box_19", "local_income_tax", "local_tax")),
+    ("20", "Locality name", "value", ("box_20", "locality", "locality_name"), None),
+    ("15b", "State / Employer ID (2)", "combined", ("box_15b_state",), ("box_15b_state_id",), None, " "),
+    ("16b", "State wages (2)", "number", ("box_16b",)),
+    ("17b", "State income tax (2)", "number", ("box_17b",)),
+    ("18b", "Local wages (2)", "number", ("box_18b",)),
+    ("19b", "Local income tax (2)", "number", ("box_19b",)),
+    ("20b", "Locality name (2)", "value", ("box_20b",), None),
+)
+W2_ADDITIONAL_DATA_ROWS = (
+    ("employer_use", "Employer Use Only", "value", ("employer_use_only", "employer_use", "for_employer_use"), ""),
+    ("other", "Other Data", "value", ("other_data", "other", "additional_info"), ""),
+)
+
+
+
+def build_w2_plane(flat_index, rows):
+    """Build a W-2 plane from its layout rows."""
+    # A tuple label holds the keys of an extracted label (box 12 codes)
+    return [
+        {"data": [{"code": code, "label": find_value(flat_index, label, "") if isinstance(label, tuple) else label, "value": W2_FINDERS[kind](flat_index, *args)}]}
+        for code, label, kind, *args in rows
+    ]
+
 def transform_to_w2_structure(raw_data):
     """
     Transform any AI-extracted data into our EXACT hardcoded W-2 JSON structure.
@@ -367,66 +535,7 @@ def transform_to_w2_structure(raw_data):
         return raw_data
     
     # Flatten nested structures to find values
-    flat = flatten_dict(raw_data) if isinstance(raw_data, dict) else {}
-    
-    # Helper to find value by multiple possible keys
-    def find_value(keys, default=None):
-        for key in keys:
-            key_lower = key.lower()
-            for k, v in flat.items():
-                if key_lower in k.lower():
-                    if v is not None and v != "" and v != "N/A":
-                        return v
-        return default
-    
-    def find_number(keys, default=0.00):
-        val = find_value(keys, default)
-        if val is None:
-            return 0.00
-        if isinstance(val, (int, float)):
-            return float(val)
-        if isinstance(val, str):
-            # Remove $ and commas
-            val = val.replace("$", "").replace(",", "").strip()
-            try:
-                return float(val)
-            except:
-                return 0.00
-        return 0.00
-    
-    def find_bool(keys, default=False):
-        val = find_value(keys, default)
-        if isinstance(val, bool):
-            return val
-        if isinstance(val, str):
-            return val.lower() in ["true", "yes", "1", "x", "checked"]
-        return default
-    
-    def find_combined_value(name_keys, address_keys, default="", separator="\n"):
-        """Combine two field values into a single value with a configurable separator."""
-        name = find_value(name_keys, "")
-        address = find_value(address_keys, "")
-        
-        # Clean up values
-        if isinstance(name, str):
-            name = name.strip()
-        else:
-            name = str(name) if name else ""
-        
-        if isinstance(address, str):
-            address = address.strip()
-        else:
-            address = str(address) if address else ""
-        
-        # Combine name and address
-        if name and address:
-            return f"{name}{separator}{address}"
-        elif name:
-            return name
-        elif address:
-            return address
-        else:
-            return default
+    flat_index = index_flat(flatten_dict(raw_data) if isinstance(raw_data, dict) else {})
     
     # Build the EXACT hardcoded structure
     result = [
@@ -435,78 +544,20 @@ def transform_to_w2_structure(raw_data):
                 {
                     "form_header": {
                         "form_number": "W-2",
-                        "year": str(find_value(["year", "tax_year", "form_year"], "2024")),
+                        "year": str(find_value(flat_index, ("year", "tax_year", "form_year"), "2024")),
                         "type": "Wage and Tax Statement",
                         "text_array": [
                             "Employee Reference",
-                            find_value(["copy", "copy_type"], "Copy C for employee's records"),
+                            find_value(flat_index, ("copy", "copy_type"), "Copy C for employee's records"),
                             "OMB No. 1545-0008"
                         ]
                     },
                     "boxes": [
-                        {
-                            "identification_plane": [
-                                {"data": [{"code": "a", "label": "Employee's SSA number", "value": find_value(["ssn", "ssa", "employee_ssn", "social_security", "box_a"], "")}]},
-                                {"data": [{"code": "b", "label": "Employer's FED ID number", "value": find_value(["ein", "fed_id", "employer_ein", "employer_fed", "box_b"], "")}]},
-                                {"data": [{"code": "c", "label": "Employer's name and address", "value": find_combined_value(["employer_name"], ["employer_address", "employer_street", "employer_city"], "")}]},
-                                {"data": [{"code": "d", "label": "Control number", "value": find_value(["control", "control_number", "box_d"], "")}]},
-                                {"data": [{"code": "dept", "label": "Department", "value": find_value(["dept", "department", "dept_code"], "")}]},
-                                {"data": [{"code": "e/f", "label": "Employee's name and address", "value": find_combined_value(["employee_name"], ["employee_address", "employee_street", "employee_city"], "")}]}
-                            ]
-                        },
-                        {
-                            "federal_tax_plane": [
-                                {"data": [{"code": "1", "label": "Wages, tips, other comp.", "value": find_number(["box_1", "box1", "wages", "wages_tips"])}]},
-                                {"data": [{"code": "2", "label": "Federal income tax withheld", "value": find_number(["box_2", "box2", "federal_income_tax", "federal_tax_withheld"])}]},
-                                {"data": [{"code": "3", "label": "Social security wages", "value": find_number(["box_3", "box3", "social_security_wages"])}]},
-                                {"data": [{"code": "4", "label": "Social security tax withheld", "value": find_number(["box_4", "box4", "social_security_tax"])}]},
-                                {"data": [{"code": "5", "label": "Medicare wages and tips", "value": find_number(["box_5", "box5", "medicare_wages"])}]},
-                                {"data": [{"code": "6", "label": "Medicare tax withheld", "value": find_number(["box_6", "box6", "medicare_tax"])}]},
-                                {"data": [{"code": "7", "label": "Social security tips", "value": find_number(["box_7", "box7", "social_security_tips"])}]},
-                                {"data": [{"code": "8", "label": "Allocated tips", "value": find_number(["box_8", "box8", "allocated_tips"])}]},
-                                {"data": [{"code": "9", "label": "Verification code", "value": find_value(["box_9", "box9", "verification_code", "verification"], "")}]},
-                                {"data": [{"code": "10", "label": "Dependent care benefits", "value": find_number(["box_10", "box10", "dependent_care"])}]},
-                                {"data": [{"code": "11", "label": "Nonqualified plans", "value": find_number(["box_11", "box11", "nonqualified"])}]}
-                            ]
-                        },
-                        {
-                            "boxes": [
-                                {
-                                    "supplemental_plane": [
-                                        {"data": [{"code": "12a", "label": find_value(["box_12a_code", "12a_code"], ""), "value": find_number(["box_12a_amount", "12a_amount", "box_12a"])}]},
-                                        {"data": [{"code": "12b", "label": find_value(["box_12b_code", "12b_code"], ""), "value": find_number(["box_12b_amount", "12b_amount", "box_12b"])}]},
-                                        {"data": [{"code": "12c", "label": find_value(["box_12c_code", "12c_code"], ""), "value": find_number(["box_12c_amount", "12c_amount", "box_12c"])}]},
-                                        {"data": [{"code": "12d", "label": find_value(["box_12d_code", "12d_code"], ""), "value": find_number(["box_12d_amount", "12d_amount", "box_12d"])}]},
-                                        {"data": [{"code": "13", "label": "Statutory employee", "value": find_bool(["box_13_statutory", "box_13_statutory_employee", "statutory_employee", "statutory"])}]},
-                                        {"data": [{"code": "13b", "label": "Retirement plan", "value": find_bool(["box_13_retirement", "box_13_retirement_plan", "retirement_plan", "retirement"])}]},
-                                        {"data": [{"code": "13c", "label": "Third-party sick pay", "value": find_bool(["box_13_sick_pay", "box_13_third_party_sick_pay", "third_party_sick_pay", "sick_pay"])}]},
-                                        {"data": [{"code": "14", "label": "Other", "value": find_value(["box_14", "box_14_other", "other"], None)}]}
-                                    ]
-                                }
-                            ]
-                        },
-                        {
-                            "state_local_plane": [
-                                {"data": [{"code": "15", "label": "State / Employer ID", "value": find_combined_value(["box_15_state", "state"], ["box_15_state_id", "state_id", "employer_state_id"], None, " ")}]},
-                                {"data": [{"code": "16", "label": "State wages, tips, etc.", "value": find_number(["box_16", "state_wages"])}]},
-                                {"data": [{"code": "17", "label": "State income tax", "value": find_number(["box_17", "state_income_tax", "state_tax"])}]},
-                                {"data": [{"code": "18", "label": "Local wages, tips, etc.", "value": find_number(["box_18", "local_wages"])}]},
-                                {"data": [{"code": "19", "label": "Local income tax", "value": find_number(["box_19", "local_income_tax", "local_tax"])}]},
-                                {"data": [{"code": "20", "label": "Locality name", "value": find_value(["box_20", "locality", "locality_name"], None)}]},
-                                {"data": [{"code": "15b", "label": "State / Employer ID (2)", "value": find_combined_value(["box_15b_state"], ["box_15b_state_id"], None, " ")}]},
-                                {"data": [{"code": "16b", "label": "State wages (2)", "value": find_number(["box_16b"])}]},
-                                {"data": [{"code": "17b", "label": "State income tax (2)", "value": find_number(["box_17b"])}]},
-                                {"data": [{"code": "18b", "label": "Local wages (2)", "value": find_number(["box_18b"])}]},
-                                {"data": [{"code": "19b", "label": "Local income tax (2)", "value": find_number(["box_19b"])}]},
-                                {"data": [{"code": "20b", "label": "Locality name (2)", "value": find_value(["box_20b"], None)}]}
-                            ]
-                        },
-                        {
-                            "additional_data_plane": [
-                                {"data": [{"code": "employer_use", "label": "Employer Use Only", "value": find_value(["employer_use_only", "employer_use", "for_employer_use"], "")}]},
-                                {"data": [{"code": "other", "label": "Other Data", "value": find_value(["other_data", "other", "additional_info"], "")}]}
-                            ]
-                        }
+                        {"identification_plane": build_w2_plane(flat_index, W2_IDENTIFICATION_ROWS)},
+                        {"federal_tax_plane": build_w2_plane(flat_index, W2_FEDERAL_TAX_ROWS)},
+                        {"boxes": [{"supplemental_plane": build_w2_plane(flat_index, W2_SUPPLEMENTAL_ROWS)}]},
+                        {"state_local_plane": build_w2_plane(flat_index, W2_STATE_LOCAL_ROWS)},
+                        {"additional_data_plane": build_w2_plane(flat_index, W2_ADDITIONAL_DATA_ROWS)}
                     ]
                 }
             ]
@@ -518,21 +569,86 @@ def transform_to_w2_structure(raw_data):
 
 def flatten_dict(d, parent_key='', sep='_'):
     """Flatten a nested dictionary."""
-    items = []
-    if isinstance(d, dict):
-        for k, v in d.items():
-            new_key = f"{parent_key}{sep}{k}" if parent_key else k
-            if isinstance(v, dict):
-                items.extend(flatten_dict(v, new_key, sep=sep).items())
-            elif isinstance(v, list):
-                for i, item in enumerate(v):
-                    if isinstance(item, dict):
-                        items.extend(flatten_dict(item, f"{new_key}_{i}", sep=sep).items())
-                    else:
-                        items.append((f"{new_key}_{i}", item))
-            else:
-                items.append((new_key, v))
-    return dict(items)
+    flat = {}
+    if not isinstance(d, dict):
+        return flat
+    # Iterative depth-first walk; children are pushed in reverse so they pop in key order.
+    # Entries are (key, value, expand): list items that aren't dicts are kept as leaves.
+    stack = [(parent_key, d, True)]
+    while stack:
+        key, value, expand = stack.pop()
+        if expand and isinstance(value, dict):
+            children = []
+            for k, v in value.items():
+                new_key = f"{key}{sep}{k}" if key else k
+                if isinstance(v, list):
+                    children.extend((f"{new_key}_{i}", item, isinstance(item, dict)) for i, item in enumerate(v))
+                else:
+                    children.append((new_key, v, True))
+            stack.extend(reversed(children))
+        else:
+            flat[key] = value
+    return flat
+
+
+# =============================================================================
+# 1099-INT Output Layout
+# =============================================================================
+# (code, label) per row; build_1099int_form() pairs them with values in the same order
+INT1099_TEXT_ARRAY = ("Copy B", "For Recipient", "OMB No. 1545-0112", "Department of the Treasury - Internal Revenue Service")
+INT1099_IDENTIFICATION_ROWS = (
+    ("Payer", "Payer's name, address and telephone"),
+    ("Payer TIN", "Payer's TIN"),
+    ("Payer Telephone", "Payer's telephone number"),
+    ("Recipient TIN", "Recipient's TIN"),
+    ("Recipient Name", "Recipient's name and address"),
+    ("Account No", "Account number"),
+    ("Payer RTN", "Payer's RTN"),
+    ("FATCA", "FATCA filing requirement"),
+)
+INT1099_FINANCIAL_ROWS = (
+    ("1", "Interest income"),
+    ("2", "Early withdrawal penalty"),
+    ("3", "Interest on U.S. Savings Bonds and Treasury obligations"),
+    ("4", "Federal income tax withheld"),
+    ("5", "Investment expenses"),
+    ("6", "Foreign tax paid"),
+    ("7", "Foreign country or U.S. possession"),
+    ("8", "Tax-exempt interest"),
+    ("9", "Specified private activity bond interest"),
+    ("10", "Market discount"),
+    ("11", "Bond premium"),
+    ("12", "Bond premium on Treasury obligations"),
+    ("13", "Bond premium on tax-exempt bond"),
+    ("14", "Tax-exempt and tax credit bond CUSIP no."),
+)
+INT1099_STATE_LOCAL_ROWS = (
+    ("15", "State"),
+    ("16", "State identification no."),
+    ("17", "State tax withheld"),
+)
+
+
+def build_plane_rows(rows, values):
+    """Pair (code, label) layout rows with their values as plane entries."""
+    return [{"data": [{"code": code, "label": label, "value": value}]} for (code, label), value in zip(rows, values)]
+
+
+def build_1099int_form(year, identification, financial, state_local):
+    """Build one 1099-INT form from per-plane value lists (in INT1099_*_ROWS order)."""
+    return {
+        "form_header": {
+            "form_number": "1099-INT",
+            "year": str(year),
+            "type": "Interest Income",
+            "text_array": list(INT1099_TEXT_ARRAY)
+        },
+        "boxes": [
+            {"identification_plane": build_plane_rows(INT1099_IDENTIFICATION_ROWS, identification)},
+            {"financial_plane": build_plane_rows(INT1099_FINANCIAL_ROWS, financial)},
+            {"state_local_plane": build_plane_rows(INT1099_STATE_LOCAL_ROWS, state_local)}
+        ]
+    }
 
 
 def transform_to_1099int_structure(raw_data):
@@ -550,22 +666,6 @@ def transform_to_1099int_structure(raw_data):
     if isinstance(raw_data, dict) and "error" in raw_data:
         return raw_data
     
-    # Helper to get value from nested path
-    def get_nested_value(data, *keys):
-        """Safely get nested value from dict/list structure."""
-        try:
-            result = data
-            for key in keys:
-                if isinstance(result, list):
-                    result = result[int(key)]
-                elif isinstance(result, dict):
-                    result = result.get(key)
-                else:
-                    return None
-            return result
-        except (KeyError, IndexError, TypeError, ValueError):
-            return None
-    
     # Try to extract from AI's output if it has the correct structure
     forms = get_nested_value(raw_data, "forms")
     if not forms and isinstance(original_data, list):
@@ -574,6 +674,8 @@ def transform_to_1099int_structure(raw_data):
     if forms and len(forms) > 0:
         # Process ALL forms (for Combined Statements with multiple accounts)
         all_processed_forms = []
+        # Combined Statements share one tax year: forms without a header year use the first form's
+        default_year = get_nested_value(forms, 0, "form_header", "year") or "2024"
         
         for form in forms:
             boxes = form.get("boxes", [])
@@ -593,124 +695,77 @@ def transform_to_1099int_structure(raw_data):
             
             # If we found the planes, extract values from them
             if id_plane and fin_plane:
-                def get_plane_value(plane, code):
-                    """Extract value from a plane by code."""
-                    for item in plane:
-                        data_list = item.get("data", [])
-                        for d in data_list:
-                            if d.get("code") == code:
-                                return d.get("value")
-                    return None
+                id_values = index_plane(id_plane)
+                fin_values = index_plane(fin_plane)
+                state_values = index_plane(state_plane)
                 
                 # Extract all values from the AI output
-                payer = get_plane_value(id_plane, "Payer") or ""
-                payer_tin = get_plane_value(id_plane, "Payer TIN") or ""
-                payer_telephone = get_plane_value(id_plane, "Payer Telephone") or ""
-                recipient_tin = get_plane_value(id_plane, "Recipient TIN") or ""
-                recipient_name = get_plane_value(id_plane, "Recipient Name") or ""
-                account_no = get_plane_value(id_plane, "Account No") or ""
-                payer_rtn = get_plane_value(id_plane, "Payer RTN") or ""
-                fatca = get_plane_value(id_plane, "FATCA")
-                
-                box_1 = get_plane_value(fin_plane, "1")
-                box_2 = get_plane_value(fin_plane, "2")
-                box_3 = get_plane_value(fin_plane, "3")
-                box_4 = get_plane_value(fin_plane, "4")
-                box_5 = get_plane_value(fin_plane, "5")
-                box_6 = get_plane_value(fin_plane, "6")
-                box_7 = get_plane_value(fin_plane, "7")
-                box_8 = get_plane_value(fin_plane, "8")
-                box_9 = get_plane_value(fin_plane, "9")
-                box_10 = get_plane_value(fin_plane, "10")
-                box_11 = get_plane_value(fin_plane, "11")
-                box_12 = get_plane_value(fin_plane, "12")
-                box_13 = get_plane_value(fin_plane, "13")
-                box_14 = get_plane_value(fin_plane, "14")
+                payer = id_values.get("Payer") or ""
+                payer_tin = id_values.get("Payer TIN") or ""
+                payer_telephone = id_values.get("Payer Telephone") or ""
+                recipient_tin = id_values.get("Recipient TIN") or ""
+                recipient_name = id_values.get("Recipient Name") or ""
+                account_no = id_values.get("Account No") or ""
+                payer_rtn = id_values.get("Payer RTN") or ""
+                fatca = id_values.get("FATCA")
                 
-                box_15 = get_plane_value(state_plane, "15") if state_plane else None
-                box_16 = get_plane_value(state_plane, "16") if state_plane else None
-                box_17 = get_plane_value(state_plane, "17") if state_plane else 0.00
+                box_1 = fin_values.get("1")
+                box_2 = fin_values.get("2")
+                box_3 = fin_values.get("3")
+                box_4 = fin_values.get("4")
+                box_5 = fin_values.get("5")
+                box_6 = fin_values.get("6")
+                box_7 = fin_values.get("7")
+                box_8 = fin_values.get("8")
+                box_9 = fin_values.get("9")
+                box_10 = fin_values.get("10")
+                box_11 = fin_values.get("11")
+                box_12 = fin_values.get("12")
+                box_13 = fin_values.get("13")
+                box_14 = fin_values.get("14")
                 
-                # Clean up string values (replace newlines with commas)
-                def clean_string(val):
-                    if val is None:
-                        return ""
-                    if isinstance(val, str):
-                        # Replace newlines with ", " and clean up
-                        val = val.replace("\n", ", ").replace("\r", "").strip()
-                        # Remove trailing asterisks or special chars
-                        val = val.rstrip("*")
-                        return val
-                    return str(val)
-                
-                def clean_number(val, default=0.00):
-                    if val is None:
-                        return None
-                    if isinstance(val, (int, float)):
-                        return float(val)
-                    if isinstance(val, str):
-                        try:
-                            return float(val.replace("$", "").replace(",", "").strip())
-                        except:
-                            return default
-                    return default
+                box_15 = state_values.get("15")
+                box_16 = state_values.get("16")
+                box_17 = state_values.get("17") if state_plane else 0.00
                 
                 # Get year from header
-                year = form.get("form_header", {}).get("year", "2024")
+                year = form.get("form_header", {}).get("year", default_year)
                 
                 # Build form structure
-                processed_form = {
-                    "form_header": {
-                        "form_number": "1099-INT",
-                        "year": str(year),
-                        "type": "Interest Income",
-                        "text_array": [
-                            "Copy B",
-                            "For Recipient",
-                            "OMB No. 1545-0112",
-                            "Department of the Treasury - Internal Revenue Service"
-                        ]
-                    },
-                    "boxes": [
-                        {
-                            "identification_plane": [
-                                {"data": [{"code": "Payer", "label": "Payer's name, address and telephone", "value": clean_string(payer)}]},
-                                {"data": [{"code": "Payer TIN", "label": "Payer's TIN", "value": clean_string(payer_tin)}]},
-                                {"data": [{"code": "Payer Telephone", "label": "Payer's telephone number", "value": clean_string(payer_telephone)}]},
-                                {"data": [{"code": "Recipient TIN", "label": "Recipient's TIN", "value": clean_string(recipient_tin)}]},
-                                {"data": [{"code": "Recipient Name", "label": "Recipient's name and address", "value": clean_string(recipient_name)}]},
-                                {"data": [{"code": "Account No", "label": "Account number", "value": clean_string(account_no)}]},
-                                {"data": [{"code": "Payer RTN", "label": "Payer's RTN", "value": clean_string(payer_rtn)}]},
-                                {"data": [{"code": "FATCA", "label": "FATCA filing requirement", "value": fatca if isinstance(fatca, bool) else False}]}
-                            ]
-                        },
-                        {
-                            "financial_plane": [
-                                {"data": [{"code": "1", "label": "Interest income", "value": clean_number(box_1, 0.00) if box_1 is not None else 0.00}]},
-                                {"data": [{"code": "2", "label": "Early withdrawal penalty", "value": clean_number(box_2, 0.00) if box_2 is not None else 0.00}]},
-                                {"data": [{"code": "3", "label": "Interest on U.S. Savings Bonds and Treasury obligations", "value": clean_number(box_3, 0.00) if box_3 is not None else 0.00}]},
-                                {"data": [{"code": "4", "label": "Federal income tax withheld", "value": clean_number(box_4, 0.00) if box_4 is not None else 0.00}]},
-                                {"data": [{"code": "5", "label": "Investment expenses", "value": clean_number(box_5, 0.00) if box_5 is not None else 0.00}]},
-                                {"data": [{"code": "6", "label": "Foreign tax paid", "value": clean_number(box_6, None)}]},
-                                {"data": [{"code": "7", "label": "Foreign country or U.S. possession", "value": clean_string(box_7) if box_7 else None}]},
-                                {"data": [{"code": "8", "label": "Tax-exempt interest", "value": clean_number(box_8, None)}]},
-                                {"data": [{"code": "9", "label": "Specified private activity bond interest", "value": clean_number(box_9, None)}]},
-                                {"data": [{"code": "10", "label": "Market discount", "value": clean_number(box_10, None)}]},
-                                {"data": [{"code": "11", "label": "Bond premium", "value": clean_number(box_11, None)}]},
-                                {"data": [{"code": "12", "label": "Bond premium on Treasury obligations", "value": clean_number(box_12, None)}]},
-                                {"data": [{"code": "13", "label": "Bond premium on tax-exempt bond", "value": clean_number(box_13, None)}]},
-                                {"data": [{"code": "14", "label": "Tax-exempt and tax credit bond CUSIP no.", "value": clean_string(box_14) if box_14 else None}]}
-                            ]
-                        },
-                        {
-                            "state_local_plane": [
-                                {"data": [{"code": "15", "label": "State", "value": clean_string(box_15) if box_15 and box_15 != "15" else None}]},
-                                {"data": [{"code": "16", "label": "State identification no.", "value": clean_string(box_16) if box_16 else None}]},
-                                {"data": [{"code": "17", "label": "State tax withheld", "value": clean_number(box_17, 0.00) if box_17 is not None else 0.00}]}
-                            ]
-                        }
+                processed_form = build_1099int_form(
+                    year,
+                    [
+                        clean_string(payer, "*"),
+                        clean_string(payer_tin, "*"),
+                        clean_string(payer_telephone, "*"),
+                        clean_string(recipient_tin, "*"),
+                        clean_string(recipient_name, "*"),
+                        clean_string(account_no, "*"),
+                        clean_string(payer_rtn, "*"),
+                        fatca if isinstance(fatca, bool) else False
+                    ],
+                    [
+                        clean_number(box_1, 0.00) if box_1 is not None else 0.00,
+                        clean_number(box_2, 0.00) if box_2 is not None else 0.00,
+                        clean_number(box_3, 0.00) if box_3 is not None else 0.00,
+                        clean_number(box_4, 0.00) if box_4 is not None else 0.00,
+                        clean_number(box_5, 0.00) if box_5 is not None else 0.00,
+                        clean_number(box_6, None),
+                        clean_string(box_7, "*") if box_7 else None,
+                        clean_number(box_8, None),
+                        clean_number(box_9, None),
+                        clean_number(box_10, None),
+                        clean_number(box_11, None),
+                        clean_number(box_12, None),
+                        clean_number(box_13, None),
+                        clean_string(box_14, "*") if box_14 else None
+                    ],
+                    [
+                        clean_string(box_15, "*") if box_15 and box_15 != "15" else None,
+                        clean_string(box_16, "*") if box_16 else None,
+                        clean_number(box_17, 0.00) if box_17 is not None else 0.00
                     ]
-                }
+                )
                 all_processed_forms.append(processed_form)
         
         # If we processed any forms, return them
@@ -718,117 +773,73 @@ def transform_to_1099int_structure(raw_data):
             return [{"forms": all_processed_forms}]
     
     # Fallback: Try to extract from flattened data (handles alternate AI output formats)
-    flat = flatten_dict(raw_data) if isinstance(raw_data, dict) else {}
-    
-    def find_value(keys, default=None):
-        """Find value by multiple possible key patterns in flattened dict."""
-        for key in keys:
-            key_lower = key.lower()
-            for k, v in flat.items():
-                if key_lower in k.lower():
-                    if v is not None and v != "" and v != "N/A":
-                        return v
-        return default
-    
-    def find_number(keys, default=0.00):
-        """Find numeric value by key patterns."""
-        val = find_value(keys, None)
-        if val is None:
-            return default
-        if isinstance(val, (int, float)):
-            return float(val)
-        if isinstance(val, str):
-            try:
-                return float(val.replace("$", "").replace(",", "").strip())
-            except:
-                return default if default is not None else 0.00
-        return default if default is not None else 0.00
-    
-    def clean_str(val):
-        if val is None:
-            return ""
-        if isinstance(val, str):
-            return val.replace("\n", ", ").replace("\r", "").strip().rstrip("*")
-        return str(val)
+    flat_index = index_flat(flatten_dict(raw_data) if isinstance(raw_data, dict) else {})
     
     # Extract from flattened data using various possible key patterns
-    payer = find_value(["payer_name", "payer's name", "payer_address", "payer"], "")
-    payer_tin = find_value(["payer_tin", "payer's tin", "payer tin"], "")
-    payer_telephone = find_value(["payer_telephone", "payer's telephone", "payer phone", "telephone"], "")
-    recipient_tin = find_value(["recipient_tin", "recipient's tin", "recipient tin"], "")
-    recipient_name = find_value(["recipient_name", "recipient's name", "recipient_address", "recipient"], "")
-    account_no = find_value(["account", "account_number", "account no"], "")
-    payer_rtn = find_value(["payer_rtn", "rtn", "routing"], "")
-    fatca = find_value(["fatca", "fatca_filing", "fatca filing requirement"], False)
+    payer = find_value(flat_index, ("payer_name", "payer's name", "payer_address", "payer"), "")
+    payer_tin = find_value(flat_index, ("payer_tin", "payer's tin", "payer tin"), "")
+    payer_telephone = find_value(flat_index, ("payer_telephone", "payer's telephone", "payer phone", "telephone"), "")
+    recipient_tin = find_value(flat_index, ("recipient_tin", "recipient's tin", "recipient tin"), "")
+    recipient_name = find_value(flat_index, ("recipient_name", "recipient's name", "recipient_address", "recipient"), "")
+    account_no = find_value(flat_index, ("account", "account_number", "account no"), "")
+    payer_rtn = find_value(flat_index, ("payer_rtn", "rtn", "routing"), "")
+    fatca = find_value(flat_index, ("fatca", "fatca_filing", "fatca filing requirement"), False)
     
     # Financial data - try various key patterns
-    box_1 = find_number(["box_1", "box1", "interest_income", "box_1_interest"], 0.00)
-    box_2 = find_number(["box_2", "box2", "early_withdrawal", "withdrawal_penalty"], 0.00)
-    box_3 = find_number(["box_3", "box3", "savings_bonds", "treasury"], 0.00)
-    box_4 = find_number(["box_4", "box4", "federal_tax", "tax_withheld"], 0.00)
-    box_5 = find_number(["box_5", "box5", "investment_expenses"], 0.00)
-    box_6 = find_number(["box_6", "box6", "foreign_tax"], None)
-    box_7 = find_value(["box_7", "box7", "foreign_country", "us_possession"], None)
-    box_8 = find_number(["box_8", "box8", "tax_exempt"], None)
-    box_9 = find_number(["box_9", "box9", "private_activity"], None)
-    box_10 = find_number(["box_10", "box10", "market_discount"], None)
-    box_11 = find_number(["box_11", "box11", "bond_premium"], None)
-    box_12 = find_number(["box_12", "box12", "bond_premium_treasury"], None)
-    box_13 = find_number(["box_13", "box13", "bond_premium_tax_exempt"], None)
-    box_14 = find_value(["box_14", "box14", "cusip", "tax_credit_bond_cusip"], None)
-    box_15 = find_value(["box_15", "state"], None)
-    box_16 = find_value(["box_16", "state_id"], None)
-    box_17 = find_number(["box_17", "state_tax"], 0.00)
-    
-    year = find_value(["year", "tax_year"], "2024")
-    
-    return [
-        {
-            "forms": [
-                {
-                    "form_header": {
-                        "form_number": "1099-INT",
-                        "year": str(year),
-                        "type": "Interest Income",
-                        "text_array": ["Copy B", "For Recipient", "OMB No. 1545-0112", "Department of the Treasury - Internal Revenue Service"]
-                    },
-                    "boxes": [
-                        {"identification_plane": [
-                            {"data": [{"code": "Payer", "label": "Payer's name, address and telephone", "value": clean_str(payer)}]},
-                            {"data": [{"code": "Payer TIN", "label": "Payer's TIN", "value": clean_str(payer_tin)}]},
-                            {"data": [{"code": "Payer Telephone", "label": "Payer's telephone number", "value": clean_str(payer_telephone)}]},
-                            {"data": [{"code": "Recipient TIN", "label": "Recipient's TIN", "value": clean_str(recipient_tin)}]},
-                            {"data": [{"code": "Recipient Name", "label": "Recipient's name and address", "value": clean_str(recipient_name)}]},
-                            {"data": [{"code": "Account No", "label": "Account number", "value": clean_str(account_no)}]},
-                            {"data": [{"code": "Payer RTN", "label": "Payer's RTN", "value": clean_str(payer_rtn)}]},
-                            {"data": [{"code": "FATCA", "label": "FATCA filing requirement", "value": fatca if isinstance(fatca, bool) else False}]}
-                        ]},
-                        {"financial_plane": [
-                            {"data": [{"code": "1", "label": "Interest income", "value": box_1}]},
-                            {"data": [{"code": "2", "label": "Early withdrawal penalty", "value": box_2}]},
-                            {"data": [{"code": "3", "label": "Interest on U.S. Savings Bonds and Treasury obligations", "value": box_3}]},
-                            {"data": [{"code": "4", "label": "Federal income tax withheld", "value": box_4}]},
-                            {"data": [{"code": "5", "label": "Investment expenses", "value": box_5}]},
-                            {"data": [{"code": "6", "label": "Foreign tax paid", "value": box_6}]},
-                            {"data": [{"code": "7", "label": "Foreign country or U.S. possession", "value": clean_str(box_7) if box_7 else None}]},
-                            {"data": [{"code": "8", "label": "Tax-exempt interest", "value": box_8}]},
-                            {"data": [{"code": "9", "label": "Specified private activity bond interest", "value": box_9}]},
-                            {"data": [{"code": "10", "label": "Market discount", "value": box_10}]},
-                            {"data": [{"code": "11", "label": "Bond premium", "value": box_11}]},
-                            {"data": [{"code": "12", "label": "Bond premium on Treasury obligations", "value": box_12}]},
-                            {"data": [{"code": "13", "label": "Bond premium on tax-exempt bond", "value": box_13}]},
-                            {"data": [{"code": "14", "label": "Tax-exempt and tax credit bond CUSIP no.", "value": clean_str(box_14) if box_14 else None}]}
-                        ]},
-                        {"state_local_plane": [
-                            {"data": [{"code": "15", "label": "State", "value": clean_str(box_15) if box_15 else None}]},
-                            {"data": [{"code": "16", "label": "State identification no.", "value": clean_str(box_16) if box_16 else None}]},
-                            {"data": [{"code": "17", "label": "State tax withheld", "value": box_17}]}
-                        ]}
-                    ]
-                }
-            ]
-        }
-    ]
+    box_1 = find_number(flat_index, ("box_1", "box1", "interest_income", "box_1_interest"), 0.00)
+    box_2 = find_number(flat_index, ("box_2", "box2", "early_withdrawal", "withdrawal_penalty"), 0.00)
+    box_3 = find_number(flat_index, ("box_3", "box3", "savings_bonds", "treasury"), 0.00)
+    box_4 = find_number(flat_index, ("box_4", "box4", "federal_tax", "tax_withheld"), 0.00)
+    box_5 = find_number(flat_index, ("box_5", "box5", "investment_expenses"), 0.00)
+    box_6 = find_number(flat_index, ("box_6", "box6", "foreign_tax"), None)
+    box_7 = find_value(flat_index, ("box_7", "box7", "foreign_country", "us_possession"), None)
+    box_8 = find_number(flat_index, ("box_8", "box8", "tax_exempt"), None)
+    box_9 = find_number(flat_index, ("box_9", "box9", "private_activity"), None)
+    box_10 = find_number(flat_index, ("box_10", "box10", "market_discount"), None)
+    box_11 = find_number(flat_index, ("box_11", "box11", "bond_premium"), None)
+    box_12 = find_number(flat_index, ("box_12", "box12", "bond_premium_treasury"), None)
+    box_13 = find_number(flat_index, ("box_13", "box13", "bond_premium_tax_exempt"), None)
+    box_14 = find_value(flat_index, ("box_14", "box14", "cusip", "tax_credit_bond_cusip"), None)
+    box_15 = find_value(flat_index, ("box_15", "state"), None)
+    box_16 = find_value(flat_index, ("box_16", "state_id"), None)
+    box_17 = find_number(flat_index, ("box_17", "state_tax"), 0.00)
+    
+    year = find_value(flat_index, ("year", "tax_year"), "2024")
+    
+    return [{"forms": [build_1099int_form(
+        year,
+        [
+            clean_string(payer, "*"),
+            clean_string(payer_tin, "*"),
+            clean_string(payer_telephone, "*"),
+            clean_string(recipient_tin, "*"),
+            clean_string(recipient_name, "*"),
+            clean_string(account_no, "*"),
+            clean_string(payer_rtn, "*"),
+            fatca if isinstance(fatca, bool) else False
+        ],
+        [
+            box_1,
+            box_2,
+            box_3,
+            box_4,
+            box_5,
+            box_6,
+            clean_string(box_7, "*") if box_7 else None,
+            box_8,
+            box_9,
+            box_10,
+            box_11,
+            box_12,
+            box_13,
+            clean_string(box_14, "*") if box_14 else None
+        ],
+        [
+            clean_string(box_15, "*") if box_15 else None,
+            clean_string(box_16, "*") if box_16 else None,
+            box_17
+        ]
+    )]}]
 
 
 # =============================================================================
@@ -1040,51 +1051,6 @@ def transform_to_k1_structure(raw_data):
     if isinstance(raw_data, dict) and "error" in raw_data:
         return raw_data
     
-    # Helper functions
-    def get_plane_value(plane, code):
-        if not plane:
-            return None
-        for item in plane:
-            data_list = item.get("data", [])
-            for d in data_list:
-                if d.get("code") == code:
-                    return d.get("value")
-        return None
-    
-    def clean_string(val):
-        if val is None:
-            return ""
-        if isinstance(val, str):
-            return val.replace("\n", ", ").replace("\r", "").strip()
-        return str(val)
-    
-    def clean_number(val, default=0.00):
-        if val is None:
-            return default
-        if isinstance(val, (int, float)):
-            return float(val)
-        if isinstance(val, str):
-            try:
-                val = val.replace("$", "").replace(",", "").replace("(", "-").replace(")", "").strip()
-                return float(val)
-            except:
-                return default
-        return default
-    
-    def clean_bool(val):
-        if isinstance(val, bool):
-            return val
-        if isinstance(val, str):
-            return val.lower() in ["true", "yes", "1", "x", "checked"]
-        return False
-    
-    def clean_array(val):
-        if val is None:
-            return []
-        if isinstance(val, list):
-            return val
-        return []
-    
     # Check if already in new document_metadata structure
     doc_metadata = raw_data.get("document_metadata") if isinstance(raw_data, dict) else None
     partner_records = raw_data.get("partner_records", []) if isinstance(raw_data, dict) else []
@@ -1096,68 +1062,71 @@ def transform_to_k1_structure(raw_data):
             part_i = partner.get("part_i_partnership_plane", [])
             part_ii = partner.get("part_ii_partner_plane", [])
             part_iii = partner.get("part_iii_income_loss_plane", [])
+            part_i_values = index_plane(part_i)
+            part_ii_values = index_plane(part_ii)
+            part_iii_values = index_plane(part_iii)
             
             cleaned_partner = {
                 "partner_name": clean_string(partner.get("partner_name", "")),
                 "page_reference": partner.get("page_reference", idx + 1),
                 "part_i_partnership_plane": [
-                    {"data": [{"code": "A", "label": "Partnership EIN", "value": clean_string(get_plane_value(part_i, "A"))}]},
-                    {"data": [{"code": "B", "label": "Partnership Name/Address", "value": clean_string(get_plane_value(part_i, "B"))}]},
-                    {"data": [{"code": "C", "label": "IRS Center", "value": clean_string(get_plane_value(part_i, "C"))}]},
-                    {"data": [{"code": "D", "label": "PTP Check", "value": clean_bool(get_plane_value(part_i, "D"))}]}
+                    {"data": [{"code": "A", "label": "Partnership EIN", "value": clean_string(part_i_values.get("A"))}]},
+                    {"data": [{"code": "B", "label": "Partnership Name/Address", "value": clean_string(part_i_values.get("B"))}]},
+                    {"data": [{"code": "C", "label": "IRS Center", "value": clean_string(part_i_values.get("C"))}]},
+                    {"data": [{"code": "D", "label": "PTP Check", "value": clean_bool(part_i_values.get("D"))}]}
                 ],
                 "part_ii_partner_plane": [
-                    {"data": [{"code": "E", "label": "Partner's SSN or TIN", "value": clean_string(get_plane_value(part_ii, "E"))}]},
-                    {"data": [{"code": "F", "label": "Partner's Name/Address", "value": clean_string(get_plane_value(part_ii, "F"))}]},
-                    {"data": [{"code": "G", "label": "General partner or LLC member-manager", "value": clean_bool(get_plane_value(part_ii, "G"))}]},
-                    {"data": [{"code": "H1", "label": "Domestic partner", "value": clean_bool(get_plane_value(part_ii, "H1"))}]},
-                    {"data": [{"code": "H2", "label": "Foreign partner", "value": clean_bool(get_plane_value(part_ii, "H2"))}]},
-                    {"data": [{"code": "I1", "label": "Entity Type", "value": clean_string(get_plane_value(part_ii, "I1"))}]},
-                    {"data": [{"code": "J_Profit_Beg", "label": "Profit Share % (Beginning)", "value": clean_number(get_plane_value(part_ii, "J_Profit_Beg"))}]},
-                    {"data": [{"code": "J_Profit_End", "label": "Profit Share % (Ending)", "value": clean_number(get_plane_value(part_ii, "J_Profit_End"))}]},
-                    {"data": [{"code": "K1_Nonrecourse_End", "label": "Nonrecourse (End)", "value": clean_number(get_plane_value(part_ii, "K1_Nonrecourse_End"))}]},
-                    {"data": [{"code": "K1_Qualified_End", "label": "Qualified Nonrecourse Financing (End)", "value": clean_number(get_plane_value(part_ii, "K1_Qualified_End"))}]},
-                    {"data": [{"code": "K1_Recourse_End", "label": "Recourse (End)", "value": clean_number(get_plane_value(part_ii, "K1_Recourse_End"))}]},
-                    {"data": [{"code": "L_Beg_Capital", "label": "Beginning capital account", "value": clean_number(get_plane_value(part_ii, "L_Beg_Capital"))}]},
-                    {"data": [{"code": "L_Capital_Contributed", "label": "Capital contributed during year", "value": clean_number(get_plane_value(part_ii, "L_Capital_Contributed"))}]},
-                    {"data": [{"code": "L_Net_Income", "label": "Current year net income (loss)", "value": clean_number(get_plane_value(part_ii, "L_Net_Income"))}]},
-                    {"data": [{"code": "L_Other", "label": "Other increase (decrease)", "value": clean_number(get_plane_value(part_ii, "L_Other"))}]},
-                    {"data": [{"code": "L_Withdrawals", "label": "Withdrawals & distributions", "value": clean_number(get_plane_value(part_ii, "L_Withdrawals"))}]},
-                    {"data": [{"code": "L_Ending_Capital", "label": "Ending capital account", "value": clean_number(get_plane_value(part_ii, "L_Ending_Capital"))}]},
-                    {"data": [{"code": "M", "label": "Did the partner contribute property with a built-in gain (loss)?", "value": clean_bool(get_plane_value(part_ii, "M"))}]},
-                    {"data": [{"code": "N_Beg", "label": "Net unrecognized Section 704(c) gain or loss (Beginning)", "value": clean_number(get_plane_value(part_ii, "N_Beg"))}]},
-                    {"data": [{"code": "N_End", "label": "Net unrecognized Section 704(c) gain or loss (Ending)", "value": clean_number(get_plane_value(part_ii, "N_End"))}]}
+                    {"data": [{"code": "E", "label": "Partner's SSN or TIN", "value": clean_string(part_ii_values.get("E"))}]},
+                    {"data": [{"code": "F", "label": "Partner's Name/Address", "value": clean_string(part_ii_values.get("F"))}]},
+                    {"data": [{"code": "G", "label": "General partner or LLC member-manager", "value": clean_bool(part_ii_values.get("G"))}]},
+                    {"data": [{"code": "H1", "label": "Domestic partner", "value": clean_bool(part_ii_values.get("H1"))}]},
+                    {"data": [{"code": "H2", "label": "Foreign partner", "value": clean_bool(part_ii_values.get("H2"))}]},
+                    {"data": [{"code": "I1", "label": "Entity Type", "value": clean_string(part_ii_values.get("I1"))}]},
+                    {"data": [{"code": "J_Profit_Beg", "label": "Profit Share % (Beginning)", "value": clean_number(part_ii_values.get("J_Profit_Beg"), paren_negative=True)}]},
+                    {"data": [{"code": "J_Profit_End", "label": "Profit Share % (Ending)", "value": clean_number(part_ii_values.get("J_Profit_End"), paren_negative=True)}]},
+                    {"data": [{"code": "K1_Nonrecourse_End", "label": "Nonrecourse (End)", "value": clean_number(part_ii_values.get("K1_Nonrecourse_End"), paren_negative=True)}]},
+                    {"data": [{"code": "K1_Qualified_End", "label": "Qualified Nonrecourse Financing (End)", "value": clean_number(part_ii_values.get("K1_Qualified_End"), paren_negative=True)}]},
+                    {"data": [{"code": "K1_Recourse_End", "label": "Recourse (End)", "value": clean_number(part_ii_values.get("K1_Recourse_End"), paren_negative=True)}]},
+                    {"data": [{"code": "L_Beg_Capital", "label": "Beginning capital account", "value": clean_number(part_ii_values.get("L_Beg_Capital"), paren_negative=True)}]},
+                    {"data": [{"code": "L_Capital_Contributed", "label": "Capital contributed during year", "value": clean_number(part_ii_values.get("L_Capital_Contributed"), paren_negative=True)}]},
+                    {"data": [{"code": "L_Net_Income", "label": "Current year net income (loss)", "value": clean_number(part_ii_values.get("L_Net_Income"), paren_negative=True)}]},
+                    {"data": [{"code": "L_Other", "label": "Other increase (decrease)", "value": clean_number(part_ii_values.get("L_Other"), paren_negative=True)}]},
+                    {"data": [{"code": "L_Withdrawals", "label": "Withdrawals & distributions", "value": clean_number(part_ii_values.get("L_Withdrawals"), paren_negative=True)}]},
+                    {"data": [{"code": "L_Ending_Capital", "label": "Ending capital account", "value": clean_number(part_ii_values.get("L_Ending_Capital"), paren_negative=True)}]},
+                    {"data": [{"code": "M", "label": "Did the partner contribute property with a built-in gain (loss)?", "value": clean_bool(part_ii_values.get("M"))}]},
+                    {"data": [{"code": "N_Beg", "label": "Net unrecognized Section 704(c) gain or loss (Beginning)", "value": clean_number(part_ii_values.get("N_Beg"), paren_negative=True)}]},
+                    {"data": [{"code": "N_End", "label": "Net unrecognized Section 704(c) gain or loss (Ending)", "value": clean_number(part_ii_values.get("N_End"), paren_negative=True)}]}
                 ],
                 "part_iii_income_loss_plane": [
-                    {"data": [{"code": "1", "label": "Ordinary business income (loss)", "value": clean_number(get_plane_value(part_iii, "1"))}]},
-                    {"data": [{"code": "2", "label": "Net rental real estate income (loss)", "value": clean_number(get_plane_value(part_iii, "2"))}]},
-                    {"data": [{"code": "3", "label": "Other net rental income (loss)", "value": clean_number(get_plane_value(part_iii, "3"))}]},
-                    {"data": [{"code": "4a", "label": "Guaranteed payments for services", "value": clean_number(get_plane_value(part_iii, "4a"))}]},
-                    {"data": [{"code": "4b", "label": "Guaranteed payments for capital", "value": clean_number(get_plane_value(part_iii, "4b"))}]},
-                    {"data": [{"code": "4c", "label": "Total guaranteed payments", "value": clean_number(get_plane_value(part_iii, "4c"))}]},
-                    {"data": [{"code": "5", "label": "Interest income", "value": clean_number(get_plane_value(part_iii, "5"))}]},
-                    {"data": [{"code": "6a", "label": "Ordinary dividends", "value": clean_number(get_plane_value(part_iii, "6a"))}]},
-                    {"data": [{"code": "6b", "label": "Qualified dividends", "value": clean_number(get_plane_value(part_iii, "6b"))}]},
-                    {"data": [{"code": "6c", "label": "Dividend equivalents", "value": clean_number(get_plane_value(part_iii, "6c"))}]},
-                    {"data": [{"code": "7", "label": "Royalties", "value": clean_number(get_plane_value(part_iii, "7"))}]},
-                    {"data": [{"code": "8", "label": "Net short-term capital gain (loss)", "value": clean_number(get_plane_value(part_iii, "8"))}]},
-                    {"data": [{"code": "9a", "label": "Net long-term capital gain (loss)", "value": clean_number(get_plane_value(part_iii, "9a"))}]},
-                    {"data": [{"code": "9b", "label": "Collectibles (28%) gain (loss)", "value": clean_number(get_plane_value(part_iii, "9b"))}]},
-                    {"data": [{"code": "9c", "label": "Unrecaptured section 1250 gain", "value": clean_number(get_plane_value(part_iii, "9c"))}]},
-                    {"data": [{"code": "10", "label": "Net section 1231 gain (loss)", "value": clean_number(get_plane_value(part_iii, "10"))}]},
-                    {"data": [{"code": "11", "label": "Other income (loss)", "value": clean_array(get_plane_value(part_iii, "11"))}]},
-                    {"data": [{"code": "12", "label": "Section 179 deduction", "value": clean_number(get_plane_value(part_iii, "12"))}]},
-                    {"data": [{"code": "13", "label": "Other deductions", "value": clean_array(get_plane_value(part_iii, "13"))}]},
-                    {"data": [{"code": "14", "label": "Self-employment earnings (loss)", "value": clean_array(get_plane_value(part_iii, "14"))}]},
-                    {"data": [{"code": "15", "label": "Credits", "value": clean_array(get_plane_value(part_iii, "15"))}]},
-                    {"data": [{"code": "16", "label": "Schedule K-3 attached check", "value": clean_bool(get_plane_value(part_iii, "16"))}]},
-                    {"data": [{"code": "17", "label": "Alternative minimum tax (AMT) items", "value": clean_array(get_plane_value(part_iii, "17"))}]},
-                    {"data": [{"code": "18", "label": "Tax-exempt income and nondeductible expenses", "value": clean_array(get_plane_value(part_iii, "18"))}]},
-                    {"data": [{"code": "19", "label": "Distributions", "value": clean_array(get_plane_value(part_iii, "19"))}]},
-                    {"data": [{"code": "20", "label": "Other information", "value": clean_array(get_plane_value(part_iii, "20"))}]},
-                    {"data": [{"code": "21", "label": "Foreign taxes paid or accrued", "value": clean_number(get_plane_value(part_iii, "21"))}]},
-                    {"data": [{"code": "22", "label": "More than one activity for at-risk purposes", "value": clean_bool(get_plane_value(part_iii, "22"))}]},
-                    {"data": [{"code": "23", "label": "More than one activity for passive activity purposes", "value": clean_bool(get_plane_value(part_iii, "23"))}]}
+                    {"data": [{"code": "1", "label": "Ordinary business income (loss)", "value": clean_number(part_iii_values.get("1"), paren_negative=True)}]},
+                    {"data": [{"code": "2", "label": "Net rental real estate income (loss)", "value": clean_number(part_iii_values.get("2"), paren_negative=True)}]},
+                    {"data": [{"code": "3", "label": "Other net rental income (loss)", "value": clean_number(part_iii_values.get("3"), paren_negative=True)}]},
+                    {"data": [{"code": "4a", "label": "Guaranteed payments for services", "value": clean_number(part_iii_values.get("4a"), paren_negative=True)}]},
+                    {"data": [{"code": "4b", "label": "Guaranteed payments for capital", "value": clean_number(part_iii_values.get("4b"), paren_negative=True)}]},
+                    {"data": [{"code": "4c", "label": "Total guaranteed payments", "value": clean_number(part_iii_values.get("4c"), paren_negative=True)}]},
+                    {"data": [{"code": "5", "label": "Interest income", "value": clean_number(part_iii_values.get("5"), paren_negative=True)}]},
+                    {"data": [{"code": "6a", "label": "Ordinary dividends", "value": clean_number(part_iii_values.get("6a"), paren_negative=True)}]},
+                    {"data": [{"code": "6b", "label": "Qualified dividends", "value": clean_number(part_iii_values.get("6b"), paren_negative=True)}]},
+                    {"data": [{"code": "6c", "label": "Dividend equivalents", "value": clean_number(part_iii_values.get("6c"), paren_negative=True)}]},
+                    {"data": [{"code": "7", "label": "Royalties", "value": clean_number(part_iii_values.get("7"), paren_negative=True)}]},
+                    {"data": [{"code": "8", "label": "Net short-term capital gain (loss)", "value": clean_number(part_iii_values.get("8"), paren_negative=True)}]},
+                    {"data": [{"code": "9a", "label": "Net long-term capital gain (loss)", "value": clean_number(part_iii_values.get("9a"), paren_negative=True)}]},
+                    {"data": [{"code": "9b", "label": "Collectibles (28%) gain (loss)", "value": clean_number(part_iii_values.get("9b"), paren_negative=True)}]},
+                    {"data": [{"code": "9c", "label": "Unrecaptured section 1250 gain", "value": clean_number(part_iii_values.get("9c"), paren_negative=True)}]},
+                    {"data": [{"code": "10", "label": "Net section 1231 gain (loss)", "value": clean_number(part_iii_values.get("10"), paren_negative=True)}]},
+                    {"data": [{"code": "11", "label": "Other income (loss)", "value": clean_array(part_iii_values.get("11"))}]},
+                    {"data": [{"code": "12", "label": "Section 179 deduction", "value": clean_number(part_iii_values.get("12"), paren_negative=True)}]},
+                    {"data": [{"code": "13", "label": "Other deductions", "value": clean_array(part_iii_values.get("13"))}]},
+                    {"data": [{"code": "14", "label": "Self-employment earnings (loss)", "value": clean_array(part_iii_values.get("14"))}]},
+                    {"data": [{"code": "15", "label": "Credits", "value": clean_array(part_iii_values.get("15"))}]},
+                    {"data": [{"code": "16", "label": "Schedule K-3 attached check", "value": clean_bool(part_iii_values.get("16"))}]},
+                    {"data": [{"code": "17", "label": "Alternative minimum tax (AMT) items", "value": clean_array(part_iii_values.get("17"))}]},
+                    {"data": [{"code": "18", "label": "Tax-exempt income and nondeductible expenses", "value": clean_array(part_iii_values.get("18"))}]},
+                    {"data": [{"code": "19", "label": "Distributions", "value": clean_array(part_iii_values.get("19"))}]},
+                    {"data": [{"code": "20", "label": "Other information", "value": clean_array(part_iii_values.get("20"))}]},
+                    {"data": [{"code": "21", "label": "Foreign taxes paid or accrued", "value": clean_number(part_iii_values.get("21"), paren_negative=True)}]},
+                    {"data": [{"code": "22", "label": "More than one activity for at-risk purposes", "value": clean_bool(part_iii_values.get("22"))}]},
+                    {"data": [{"code": "23", "label": "More than one activity for passive activity purposes", "value": clean_bool(part_iii_values.get("23"))}]}
                 ]
             }
             cleaned_partners.append(cleaned_partner)
@@ -1173,67 +1142,45 @@ def transform_to_k1_structure(raw_data):
         }]
     
     # Fallback: Build default structure with single partner
-    flat = flatten_dict(raw_data) if isinstance(raw_data, dict) else {}
-    
-    def find_value(keys, default=None):
-        for key in keys:
-            key_lower = key.lower()
-            for k, v in flat.items():
-                if key_lower in k.lower():
-                    if v is not None and v != "" and v != "N/A":
-                        return v
-        return default
-    
-    def find_number(keys, default=0.00):
-        val = find_value(keys, None)
-        if val is None:
-            return default
-        if isinstance(val, (int, float)):
-            return float(val)
-        if isinstance(val, str):
-            try:
-                return float(val.replace("$", "").replace(",", "").replace("(", "-").replace(")", "").strip())
-            except:
-                return default
-        return default
+    flat_index = index_flat(flatten_dict(raw_data) if isinstance(raw_data, dict) else {})
     
     return [{
         "document_metadata": {
             "form_type": "Schedule K-1 (Form 1065)",
-            "tax_year": str(find_value(["year", "tax_year"], "2024")),
-            "partnership_name": find_value(["partnership_name", "partnership"], ""),
-            "partnership_ein": find_value(["partnership_ein", "ein"], "")
+            "tax_year": str(find_value(flat_index, ("year", "tax_year"), "2024")),
+            "partnership_name": find_value(flat_index, ("partnership_name", "partnership"), ""),
+            "partnership_ein": find_value(flat_index, ("partnership_ein", "ein"), "")
         },
         "partner_records": [{
-            "partner_name": find_value(["partner_name", "partner"], ""),
+            "partner_name": find_value(flat_index, ("partner_name", "partner"), ""),
             "page_reference": 1,
             "part_i_partnership_plane": [
-                {"data": [{"code": "A", "label": "Partnership EIN", "value": find_value(["partnership_ein", "ein"], "")}]},
-                {"data": [{"code": "B", "label": "Partnership Name/Address", "value": find_value(["partnership_name", "partnership"], "")}]},
-                {"data": [{"code": "C", "label": "IRS Center", "value": find_value(["irs_center"], "")}]},
+                {"data": [{"code": "A", "label": "Partnership EIN", "value": find_value(flat_index, ("partnership_ein", "ein"), "")}]},
+                {"data": [{"code": "B", "label": "Partnership Name/Address", "value": find_value(flat_index, ("partnership_name", "partnership"), "")}]},
+                {"data": [{"code": "C", "label": "IRS Center", "value": find_value(flat_index, ("irs_center",), "")}]},
                 {"data": [{"code": "D", "label": "PTP Check", "value": False}]}
             ],
             "part_ii_partner_plane": [
-                {"data": [{"code": "E", "label": "Partner's SSN or TIN", "value": find_value(["partner_tin", "partner_ssn", "tin"], "")}]},
-                {"data": [{"code": "F", "label": "Partner's Name/Address", "value": find_value(["partner_name", "partner"], "")}]},
+                {"data": [{"code": "E", "label": "Partner's SSN or TIN", "value": find_value(flat_index, ("partner_tin", "partner_ssn", "tin"), "")}]},
+                {"data": [{"code": "F", "label": "Partner's Name/Address", "value": find_value(flat_index, ("partner_name", "partner"), "")}]},
                 {"data": [{"code": "G", "label": "General partner or LLC member-manager", "value": False}]},
                 {"data": [{"code": "H1", "label": "Domestic partner", "value": False}]},
                 {"data": [{"code": "H2", "label": "Foreign partner", "value": False}]},
-                {"data": [{"code": "I1", "label": "Entity Type", "value": find_value(["entity_type"], "")}]},
-                {"data": [{"code": "J_Profit_Beg", "label": "Profit Share % (Beginning)", "value": find_number(["profit_share", "j_profit"])}]},
-                {"data": [{"code": "L_Beg_Capital", "label": "Beginning capital account", "value": find_number(["beg_capital", "beginning_capital"])}]},
-                {"data": [{"code": "L_Net_Income", "label": "Current year net income (loss)", "value": find_number(["net_income", "l_net"])}]},
-                {"data": [{"code": "L_Ending_Capital", "label": "Ending capital account", "value": find_number(["ending_capital", "end_capital"])}]},
+                {"data": [{"code": "I1", "label": "Entity Type", "value": find_value(flat_index, ("entity_type",), "")}]},
+                {"data": [{"code": "J_Profit_Beg", "label": "Profit Share % (Beginning)", "value": find_number(flat_index, ("profit_share", "j_profit"), paren_negative=True)}]},
+                {"data": [{"code": "L_Beg_Capital", "label": "Beginning capital account", "value": find_number(flat_index, ("beg_capital", "beginning_capital"), paren_negative=True)}]},
+                {"data": [{"code": "L_Net_Income", "label": "Current year net income (loss)", "value": find_number(flat_index, ("net_income", "l_net"), paren_negative=True)}]},
+                {"data": [{"code": "L_Ending_Capital", "label": "Ending capital account", "value": find_number(flat_index, ("ending_capital", "end_capital"), paren_negative=True)}]},
                 {"data": [{"code": "M", "label": "Did the partner contribute property with a built-in gain (loss)?", "value": False}]},
                 {"data": [{"code": "N_Beg", "label": "Net unrecognized Section 704(c) gain or loss (Beginning)", "value": 0.00}]},
                 {"data": [{"code": "N_End", "label": "Net unrecognized Section 704(c) gain or loss (Ending)", "value": 0.00}]}
             ],
             "part_iii_income_loss_plane": [
-                {"data": [{"code": "1", "label": "Ordinary business income (loss)", "value": find_number(["box_1", "ordinary_business"])}]},
-                {"data": [{"code": "5", "label": "Interest income", "value": find_number(["box_5", "interest_income"])}]},
-                {"data": [{"code": "6a", "label": "Ordinary dividends", "value": find_number(["box_6a", "ordinary_dividends"])}]},
-                {"data": [{"code": "8", "label": "Net short-term capital gain (loss)", "value": find_number(["box_8", "short_term"])}]},
-                {"data": [{"code": "9a", "label": "Net long-term capital gain (loss)", "value": find_number(["box_9a", "long_term"])}]},
+                {"data": [{"code": "1", "label": "Ordinary business income (loss)", "value": find_number(flat_index, ("box_1", "ordinary_business"), paren_negative=True)}]},
+                {"data": [{"code": "5", "label": "Interest income", "value": find_number(flat_index, ("box_5", "interest_income"), paren_negative=True)}]},
+                {"data": [{"code": "6a", "label": "Ordinary dividends", "value": find_number(flat_index, ("box_6a", "ordinary_dividends"), paren_negative=True)}]},
+                {"data": [{"code": "8", "label": "Net short-term capital gain (loss)", "value": find_number(flat_index, ("box_8", "short_term"), paren_negative=True)}]},
+                {"data": [{"code": "9a", "label": "Net long-term capital gain (loss)", "value": find_number(flat_index, ("box_9a", "long_term"), paren_negative=True)}]},
                 {"data": [{"code": "13", "label": "Other deductions", "value": []}]},
                 {"data": [{"code": "14", "label": "Self-employment earnings (loss)", "value": []}]},
                 {"data": [{"code": "16", "label": "Schedule K-3 attached check", "value": False}]},
@@ -1269,22 +1216,34 @@ class ExtractionLogger:
 # =============================================================================
 # Form Detector
 # =============================================================================
+# Detection only looks for pattern substrings, so skip Tesseract's page layout
+# analysis (--psm 6: one uniform text block) and use the LSTM engine only
+DETECT_OCR_CONFIG = "--oem 1 --psm 6"
+
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def classify_page_image(image_hash, _image):
+    """
+    OCR a page and match it against SUPPORTED_FORMS (cached per image content).
+
+    Keyed on image_hash only (Streamlit skips hashing underscore arguments), so
+    re-uploads of the same page in any session skip Tesseract.
+    """
+    text = ""
+    if TESSERACT_AVAILABLE:
+        try:
+            text = pytesseract.image_to_string(_image, config=DETECT_OCR_CONFIG)
+        except:
+            pass
+    return match_form_type(text)
+
+
 class FormDetector:
     def detect(self, image, filename=""):
-        text = ""
-        if TESSERACT_AVAILABLE:
-            try:
-                text = pytesseract.image_to_string(image)
-            except:
-                pass
-        
-        text_upper = text.upper()
-        
         # First try OCR-based detection
-        for form_type, info in SUPPORTED_FORMS.items():
-            for pattern in info["patterns"]:
-                if pattern.upper() in text_upper:
-                    return {"form_type": form_type, "info": info}
+        form_type = classify_page_image(image_content_hash(image), image)
+        if form_type:
+            return {"form_type": form_type, "info": SUPPORTED_FORMS[form_type]}
         
         # Fallback: filename-based detection
         filename_upper = filename.upper()
@@ -1430,19 +1389,100 @@ class VisionClient:
             return {"error": "Failed to parse JSON", "raw": text}
 
 
+# =============================================================================
+# Shared Clients
+# =============================================================================
+# Built once per server process and reused across sessions and reruns, so API
+# clients (and their connection pools) aren't re-created on every interaction.
+@st.cache_resource
+def get_vision_client():
+    return VisionClient()
+
+
+@functools.cache
+def load_multipage_processors():
+    """Import the multi-page PDF processors, keyed by form type.
+
+    Forms whose extractor (or its dependencies) fails to import are left out.
+    """
+    processors = {}
+    try:
+        from forms.form_k1.extractor import MultiPageK1Processor
+        processors["K-1"] = MultiPageK1Processor
+    except ImportError:
+        pass
+    try:
+        from forms.form_k3.extractor import MultiPageK3Processor
+        processors["K-3"] = MultiPageK3Processor
+    except ImportError:
+        pass
+    try:
+        from forms.form_8805.extractor import MultiPage8805Processor
+        processors["8805"] = MultiPage8805Processor
+    except ImportError:
+        pass
+    try:
+        from forms.form_8804.extractor import MultiPage8804Processor
+        processors["8804"] = MultiPage8804Processor
+    except ImportError:
+        pass
+    return processors
+
+
+def multipage_available(form_type):
+    return form_type in load_multipage_processors()
+
+
+@st.cache_resource
+def get_k1_processor():
+    return load_multipage_processors()["K-1"]()
+
+
+@st.cache_resource
+def get_k3_processor():
+    return load_multipage_processors()["K-3"]()
+
+
+@st.cache_resource
+def get_8805_processor():
+    return load_multipage_processors()["8805"]()
+
+
+@st.cache_resource
+def get_8804_processor():
+    return load_multipage_processors()["8804"]()
+
+
+def _prewarm_deferred_imports():
+    """Import the deferred modules ahead of first use."""
+    try:
+        load_multipage_processors()
+    except Exception as e:
+        print(f"[Prewarm] Failed: {e}")
+
+
+@st.cache_resource
+def start_prewarm():
+    """Start the prewarm thread once per server process.
+
+    The first render doesn't wait for it; by the time a PDF is uploaded the
+    processors are usually already imported.
+    """
+    thread = threading.Thread(target=_prewarm_deferred_imports, name="prewarm", daemon=True)
+    thread.start()
+    return thread
+
+
 # =============================================================================
 # Helper Functions
 # =============================================================================
 def pdf_to_images(pdf_bytes):
     if not PDF_SUPPORT:
         return []
-    images = []
-    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-    for page in doc:
-        pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))
-        images.append(Image.frombytes("RGB", [pix.width, pix.height], pix.samples))
-    doc.close()
-    return images
+    from forms.pdf_render import render_pdf_pages
+    
+    # Pages are rendered in parallel worker processes for multi-page documents
+    return render_pdf_pages(pdf_bytes, zoom=2)
 
 
 def format_value(value):
@@ -1478,6 +1518,14 @@ def render_data_box(code, label, value):
     '''
 
 
+def render_box_card(label, value, value_class="", value_style=""):
+    """Render a table-view box card; the label row is omitted when label is None."""
+    label_html = f'<div class="box-label">{label}</div>' if label is not None else ""
+    class_attr = f"box-value {value_class}" if value_class else "box-value"
+    style_attr = f' style="{value_style}"' if value_style else ""
+    return f'<div class="box-card">{label_html}<div class="{class_attr}"{style_attr}>{value}</div></div>'
+
+
 def render_plane(plane_name, plane_data):
     """Render a plane section with all its data boxes."""
     # Icon mapping
@@ -1627,8 +1675,8 @@ def render_table_view(data):
             ssn, _ = get_box_value(boxes, "identification_plane", "a")
             emp_name, _ = get_box_value(boxes, "identification_plane", "e/f")
             st.markdown("**Employee**")
-            st.markdown(f'<div class="box-card"><div class="box-label">Box a: SSN</div><div class="box-value">{ssn or "—"}</div></div>', unsafe_allow_html=True)
-            st.markdown(f'<div class="box-card"><div class="box-label">Box e/f: Name & Address</div><div class="box-value">{format_multiline(emp_name)}</div></div>', unsafe_allow_html=True)
+            st.markdown(render_box_card("Box a: SSN", ssn or "—"), unsafe_allow_html=True)
+            st.markdown(render_box_card("Box e/f: Name & Address", format_multiline(emp_name)), unsafe_allow_html=True)
         
         with col_empr:
             ein, _ = get_box_value(boxes, "identification_plane", "b")
@@ -1636,11 +1684,11 @@ def render_table_view(data):
             control, _ = get_box_value(boxes, "identification_plane", "d")
             dept, _ = get_box_value(boxes, "identification_plane", "dept")
             st.markdown("**Employer**")
-            st.markdown(f'<div class="box-card"><div class="box-label">Box b: EIN</div><div class="box-value">{ein or "—"}</div></div>', unsafe_allow_html=True)
-            st.markdown(f'<div class="box-card"><div class="box-label">Box c: Name & Address</div><div class="box-value">{format_multiline(empr_name)}</div></div>', unsafe_allow_html=True)
-            st.markdown(f'<div class="box-card"><div class="box-label">Box d: Control Number</div><div class="box-value">{control or "—"}</div></div>', unsafe_allow_html=True)
+            st.markdown(render_box_card("Box b: EIN", ein or "—"), unsafe_allow_html=True)
+            st.markdown(render_box_card("Box c: Name & Address", format_multiline(empr_name)), unsafe_allow_html=True)
+            st.markdown(render_box_card("Box d: Control Number", control or "—"), unsafe_allow_html=True)
             if dept:
-                st.markdown(f'<div class="box-card"><div class="box-label">Dept</div><div class="box-value">{dept}</div></div>', unsafe_allow_html=True)
+                st.markdown(render_box_card("Dept", dept), unsafe_allow_html=True)
         
         # === WAGES & TAXES SECTION (Boxes 1-6) ===
         st.markdown('<div class="section-header">💵 Wages & Taxes (Boxes 1-6)</div>', unsafe_allow_html=True)
@@ -1723,7 +1771,7 @@ def render_table_view(data):
         v14, _ = get_box_value(boxes, "supplemental_plane", "14")
         if v14:
             st.markdown('<div class="section-header">📝 Box 14 - Other</div>', unsafe_allow_html=True)
-            st.markdown(f'<div class="box-card"><div class="box-value">{v14}</div></div>', unsafe_allow_html=True)
+            st.markdown(render_box_card(None, v14), unsafe_allow_html=True)
         
         # === STATE/LOCAL TAX (Boxes 15-20) - First Row ===
         st.markdown('<div class="section-header">🏛️ State/Local Tax (Boxes 15-20)</div>', unsafe_allow_html=True)
@@ -1731,7 +1779,7 @@ def render_table_view(data):
         
         with col1:
             v, _ = get_box_value(boxes, "state_local_plane", "15")
-            st.markdown(f'<div class="box-card"><div class="box-label">Box 15: State/Employer State ID</div><div class="box-value">{v or "—"}</div></div>', unsafe_allow_html=True)
+            st.markdown(render_box_card("Box 15: State/Employer State ID", v or "—"), unsafe_allow_html=True)
             v, _ = get_box_value(boxes, "state_local_plane", "16")
             display_box_card("16", "State wages", v)
             v, _ = get_box_value(boxes, "state_local_plane", "17")
@@ -1743,7 +1791,7 @@ def render_table_view(data):
             v, _ = get_box_value(boxes, "state_local_plane", "19")
             display_box_card("19", "Local tax withheld", v)
             v, _ = get_box_value(boxes, "state_local_plane", "20")
-            st.markdown(f'<div class="box-card"><div class="box-label">Box 20: Locality Name</div><div class="box-value">{v or "—"}</div></div>', unsafe_allow_html=True)
+            st.markdown(render_box_card("Box 20: Locality Name", v or "—"), unsafe_allow_html=True)
         
         # === STATE/LOCAL TAX - Second Row (if present) ===
         v15b, _ = get_box_value(boxes, "state_local_plane", "15b")
@@ -1756,7 +1804,7 @@ def render_table_view(data):
             col1, col2 = st.columns(2)
             
             with col1:
-                st.markdown(f'<div class="box-card"><div class="box-label">Box 15b: State/Employer State ID (2)</div><div class="box-value">{v15b or "—"}</div></div>', unsafe_allow_html=True)
+                st.markdown(render_box_card("Box 15b: State/Employer State ID (2)", v15b or "—"), unsafe_allow_html=True)
                 display_box_card("16b", "State wages (2)", v16b)
                 display_box_card("17b", "State tax withheld (2)", v17b)
             
@@ -1766,7 +1814,7 @@ def render_table_view(data):
                 v19b, _ = get_box_value(boxes, "state_local_plane", "19b")
                 display_box_card("19b", "Local tax withheld (2)", v19b)
                 v20b, _ = get_box_value(boxes, "state_local_plane", "20b")
-                st.markdown(f'<div class="box-card"><div class="box-label">Box 20b: Locality Name (2)</div><div class="box-value">{v20b or "—"}</div></div>', unsafe_allow_html=True)
+                st.markdown(render_box_card("Box 20b: Locality Name (2)", v20b or "—"), unsafe_allow_html=True)
         
         # === ADDITIONAL DATA SECTION ===
         employer_use, _ = get_box_value(boxes, "additional_data_plane", "employer_use")
@@ -1779,11 +1827,11 @@ def render_table_view(data):
             
             with col1:
                 if employer_use:
-                    st.markdown(f'<div class="box-card"><div class="box-label">Employer Use Only</div><div class="box-value">{employer_use}</div></div>', unsafe_allow_html=True)
+                    st.markdown(render_box_card("Employer Use Only", employer_use), unsafe_allow_html=True)
             
             with col2:
                 if other_data:
-                    st.markdown(f'<div class="box-card"><div class="box-label">Other Data</div><div class="box-value">{other_data}</div></div>', unsafe_allow_html=True)
+                    st.markdown(render_box_card("Other Data", other_data), unsafe_allow_html=True)
 
 
 def render_1099int_table_view(data):
@@ -1877,10 +1925,10 @@ def render_1099int_table_view(data):
             payer_telephone, _ = get_box_value(boxes, "identification_plane", "Payer Telephone")
             payer_rtn, _ = get_box_value(boxes, "identification_plane", "Payer RTN")
             st.markdown("**Payer**")
-            st.markdown(f'<div class="box-card"><div class="box-label">Payer Name, Address & Phone</div><div class="box-value box-value-small">{format_multiline(payer)}</div></div>', unsafe_allow_html=True)
-            st.markdown(f'<div class="box-card"><div class="box-label">Payer TIN</div><div class="box-value">{payer_tin or "—"}</div></div>', unsafe_allow_html=True)
-            st.markdown(f'<div class="box-card"><div class="box-label">Payer Telephone</div><div class="box-value">{payer_telephone or "—"}</div></div>', unsafe_allow_html=True)
-            st.markdown(f'<div class="box-card"><div class="box-label">Payer RTN (Routing)</div><div class="box-value">{payer_rtn or "—"}</div></div>', unsafe_allow_html=True)
+            st.markdown(render_box_card("Payer Name, Address & Phone", format_multiline(payer), value_class="box-value-small"), unsafe_allow_html=True)
+            st.markdown(render_box_card("Payer TIN", payer_tin or "—"), unsafe_allow_html=True)
+            st.markdown(render_box_card("Payer Telephone", payer_telephone or "—"), unsafe_allow_html=True)
+            st.markdown(render_box_card("Payer RTN (Routing)", payer_rtn or "—"), unsafe_allow_html=True)
         
         with col_recipient:
             recipient, _ = get_box_value(boxes, "identification_plane", "Recipient Name")
@@ -1888,11 +1936,11 @@ def render_1099int_table_view(data):
             account, _ = get_box_value(boxes, "identification_plane", "Account No")
             fatca, _ = get_box_value(boxes, "identification_plane", "FATCA")
             st.markdown("**Recipient**")
-            st.markdown(f'<div class="box-card"><div class="box-label">Recipient Name & Address</div><div class="box-value box-value-small">{format_multiline(recipient)}</div></div>', unsafe_allow_html=True)
-            st.markdown(f'<div class="box-card"><div class="box-label">Recipient TIN</div><div class="box-value">{recipient_tin or "—"}</div></div>', unsafe_allow_html=True)
-            st.markdown(f'<div class="box-card"><div class="box-label">Account Number</div><div class="box-value">{account or "—"}</div></div>', unsafe_allow_html=True)
+            st.markdown(render_box_card("Recipient Name & Address", format_multiline(recipient), value_class="box-value-small"), unsafe_allow_html=True)
+            st.markdown(render_box_card("Recipient TIN", recipient_tin or "—"), unsafe_allow_html=True)
+            st.markdown(render_box_card("Account Number", account or "—"), unsafe_allow_html=True)
             fatca_display = "☑ Yes" if fatca else "☐ No"
-            st.markdown(f'<div class="box-card"><div class="box-label">FATCA Filing Requirement</div><div class="box-value">{fatca_display}</div></div>', unsafe_allow_html=True)
+            st.markdown(render_box_card("FATCA Filing Requirement", fatca_display), unsafe_allow_html=True)
         
         # === INTEREST INCOME (Boxes 1-5) ===
         st.markdown('<div class="section-header">💰 Interest Income (Boxes 1-5)</div>', unsafe_allow_html=True)
@@ -1923,7 +1971,7 @@ def render_1099int_table_view(data):
         col1, col2, col3 = st.columns(3)
         with col1:
             v, _ = get_box_value(boxes, "financial_plane", "7")
-            st.markdown(f'<div class="box-card"><div class="box-label">Box 7: Foreign Country/U.S. Possession</div><div class="box-value">{v or "—"}</div></div>', unsafe_allow_html=True)
+            st.markdown(render_box_card("Box 7: Foreign Country/U.S. Possession", v or "—"), unsafe_allow_html=True)
         with col2:
             v, _ = get_box_value(boxes, "financial_plane", "8")
             display_box_card("8", "Tax-Exempt Interest", v)
@@ -1950,7 +1998,7 @@ def render_1099int_table_view(data):
             display_box_card("13", "Bond Prem. on Tax-Exempt", v)
         with col2:
             v, _ = get_box_value(boxes, "financial_plane", "14")
-            st.markdown(f'<div class="box-card"><div class="box-label">Box 14: CUSIP No.</div><div class="box-value">{v or "—"}</div></div>', unsafe_allow_html=True)
+            st.markdown(render_box_card("Box 14: CUSIP No.", v or "—"), unsafe_allow_html=True)
         
         # === STATE TAX (Boxes 15-17) ===
         st.markdown('<div class="section-header">🏛️ State Tax Information (Boxes 15-17)</div>', unsafe_allow_html=True)
@@ -1958,10 +2006,10 @@ def render_1099int_table_view(data):
         
         with col1:
             v, _ = get_box_value(boxes, "state_local_plane", "15")
-            st.markdown(f'<div class="box-card"><div class="box-label">Box 15: State</div><div class="box-value">{v or "—"}</div></div>', unsafe_allow_html=True)
+            st.markdown(render_box_card("Box 15: State", v or "—"), unsafe_allow_html=True)
         with col2:
             v, _ = get_box_value(boxes, "state_local_plane", "16")
-            st.markdown(f'<div class="box-card"><div class="box-label">Box 16: State ID</div><div class="box-value">{v or "—"}</div></div>', unsafe_allow_html=True)
+            st.markdown(render_box_card("Box 16: State ID", v or "—"), unsafe_allow_html=True)
         with col3:
             v, _ = get_box_value(boxes, "state_local_plane", "17")
             display_box_card("17", "State Tax Withheld", v)
@@ -1983,17 +2031,6 @@ def render_k1_table_view(data):
     partner_records = doc_data.get("partner_records", [])
     
     # Helper functions
-    def get_plane_value(plane, code):
-        """Get value from a plane by code."""
-        if not plane:
-            return None
-        for item in plane:
-            data_list = item.get("data", [])
-            for d in data_list:
-                if d.get("code") == code:
-                    return d.get("value")
-        return None
-    
     def format_currency(val):
         if val is None:
             return "—"
@@ -2022,7 +2059,7 @@ def render_k1_table_view(data):
                     color = "color: #e2e8f0;"
             else:
                 color = "color: #e2e8f0;"
-            st.markdown(f'<div class="box-card"><div class="box-label">Box {box_code}: {label}</div><div class="box-value" style="{color}">{formatted_val}</div></div>', unsafe_allow_html=True)
+            st.markdown(render_box_card(f"Box {box_code}: {label}", formatted_val, value_style=color), unsafe_allow_html=True)
         else:
             val_display = value if value else "—"
             if isinstance(value, bool):
@@ -2030,7 +2067,7 @@ def render_k1_table_view(data):
             elif isinstance(value, list) and len(value) > 0:
                 # Format array values for boxes 11, 13, 14, etc.
                 val_display = ", ".join([f"{item.get('code', '')}: {item.get('amount', item)}" for item in value])
-            st.markdown(f'<div class="box-card"><div class="box-label">Box {box_code}: {label}</div><div class="box-value">{val_display}</div></div>', unsafe_allow_html=True)
+            st.markdown(render_box_card(f"Box {box_code}: {label}", val_display), unsafe_allow_html=True)
     
     # Extract document metadata
     form_type = doc_metadata.get("form_type", "Schedule K-1 (Form 1065)")
@@ -2080,13 +2117,13 @@ def render_k1_table_view(data):
         
         with col1:
             v = get_plane_value(part_i, "A")
-            st.markdown(f'<div class="box-card"><div class="box-label">Box A: Partnership EIN</div><div class="box-value">{v or "—"}</div></div>', unsafe_allow_html=True)
+            st.markdown(render_box_card("Box A: Partnership EIN", v or "—"), unsafe_allow_html=True)
         with col2:
             v = get_plane_value(part_i, "B")
-            st.markdown(f'<div class="box-card"><div class="box-label">Box B: Partnership Name/Address</div><div class="box-value">{v or "—"}</div></div>', unsafe_allow_html=True)
+            st.markdown(render_box_card("Box B: Partnership Name/Address", v or "—"), unsafe_allow_html=True)
         with col3:
             v = get_plane_value(part_i, "C")
-            st.markdown(f'<div class="box-card"><div class="box-label">Box C: IRS Center</div><div class="box-value">{v or "—"}</div></div>', unsafe_allow_html=True)
+            st.markdown(render_box_card("Box C: IRS Center", v or "—"), unsafe_allow_html=True)
         
         # === PART II: Partner Information ===
         st.markdown('<div class="section-header">👤 Part II: Partner Information</div>', unsafe_allow_html=True)
@@ -2095,11 +2132,11 @@ def render_k1_table_view(data):
         
         with col1:
             v = get_plane_value(part_ii, "E")
-            st.markdown(f'<div class="box-card"><div class="box-label">Box E: Partner\'s TIN</div><div class="box-value">{v or "—"}</div></div>', unsafe_allow_html=True)
+            st.markdown(render_box_card("Box E: Partner's TIN", v or "—"), unsafe_allow_html=True)
             v = get_plane_value(part_ii, "F")
-            st.markdown(f'<div class="box-card"><div class="box-label">Box F: Partner\'s Name/Address</div><div class="box-value">{v or "—"}</div></div>', unsafe_allow_html=True)
+            st.markdown(render_box_card("Box F: Partner's Name/Address", v or "—"), unsafe_allow_html=True)
             v = get_plane_value(part_ii, "I1")
-            st.markdown(f'<div class="box-card"><div class="box-label">Box I1: Entity Type</div><div class="box-value">{v or "—"}</div></div>', unsafe_allow_html=True)
+            st.markdown(render_box_card("Box I1: Entity Type", v or "—"), unsafe_allow_html=True)
         
         with col2:
             v = get_plane_value(part_ii, "G")
@@ -2115,10 +2152,10 @@ def render_k1_table_view(data):
         
         with col1:
             v = get_plane_value(part_ii, "J_Profit_Beg")
-            st.markdown(f'<div class="box-card"><div class="box-label">Profit % (Beginning)</div><div class="box-value">{format_percentage(v)}</div></div>', unsafe_allow_html=True)
+            st.markdown(render_box_card("Profit % (Beginning)", format_percentage(v)), unsafe_allow_html=True)
         with col2:
             v = get_plane_value(part_ii, "J_Profit_End")
-            st.markdown(f'<div class="box-card"><div class="box-label">Profit % (Ending)</div><div class="box-value">{format_percentage(v)}</div></div>', unsafe_allow_html=True)
+            st.markdown(render_box_card("Profit % (Ending)", format_percentage(v)), unsafe_allow_html=True)
         
         # === Box L: Capital Account Analysis ===
         st.markdown('<div class="section-header">💰 Box L: Partner\'s Capital Account Analysis</div>', unsafe_allow_html=True)
@@ -2249,17 +2286,6 @@ def render_k3_table_view(data):
     partner_records = doc_data.get("partner_records", [])
     
     # Helper functions
-    def get_plane_value(plane, code):
-        """Get value from a plane by code."""
-        if not plane:
-            return None
-        for item in plane:
-            data_list = item.get("data", [])
-            for d in data_list:
-                if d.get("code") == code:
-                    return d.get("value")
-        return None
-    
     def format_currency(val):
         if val is None:
             return "—"
@@ -2281,12 +2307,12 @@ def render_k3_table_view(data):
                     color = "color: #e2e8f0;"
             else:
                 color = "color: #e2e8f0;"
-            st.markdown(f'<div class="box-card"><div class="box-label">{box_code}: {label}</div><div class="box-value" style="{color}">{formatted_val}</div></div>', unsafe_allow_html=True)
+            st.markdown(render_box_card(f"{box_code}: {label}", formatted_val, value_style=color), unsafe_allow_html=True)
         else:
             val_display = value if value else "—"
             if isinstance(value, bool):
                 val_display = "✓ Yes" if value else "✗ No"
-            st.markdown(f'<div class="box-card"><div class="box-label">{box_code}: {label}</div><div class="box-value">{val_display}</div></div>', unsafe_allow_html=True)
+            st.markdown(render_box_card(f"{box_code}: {label}", val_display), unsafe_allow_html=True)
     
     # Extract document metadata
     form_type = doc_metadata.get("form_type", "Schedule K-3 (Form 1065)")
@@ -2473,12 +2499,12 @@ def render_8805_table_view(data):
                     color = "color: #e2e8f0;"
             else:
                 color = "color: #e2e8f0;"
-            st.markdown(f'<div class="box-card"><div class="box-label">{code}: {label}</div><div class="box-value" style="{color}">{formatted_val}</div></div>', unsafe_allow_html=True)
+            st.markdown(render_box_card(f"{code}: {label}", formatted_val, value_style=color), unsafe_allow_html=True)
         else:
             val_display = value if value else "—"
             if isinstance(value, bool):
                 val_display = "✓ Yes" if value else "✗ No"
-            st.markdown(f'<div class="box-card"><div class="box-label">{code}: {label}</div><div class="box-value">{val_display}</div></div>', unsafe_allow_html=True)
+            st.markdown(render_box_card(f"{code}: {label}", val_display), unsafe_allow_html=True)
     
     # Form Header
     st.markdown(f'''
@@ -2677,10 +2703,10 @@ def render_8804_table_view(data):
                 color = "color: #ef4444;" if value < 0 else ("color: #4ade80;" if value > 0 else "color: #e2e8f0;")
             else:
                 color = "color: #e2e8f0;"
-            st.markdown(f'<div class="box-card"><div class="box-label">{code}: {label}</div><div class="box-value" style="{color}">{formatted_val}</div></div>', unsafe_allow_html=True)
+            st.markdown(render_box_card(f"{code}: {label}", formatted_val, value_style=color), unsafe_allow_html=True)
         else:
             val_display = value if value else "—"
-            st.markdown(f'<div class="box-card"><div class="box-label">{code}: {label}</div><div class="box-value">{val_display}</div></div>', unsafe_allow_html=True)
+            st.markdown(render_box_card(f"{code}: {label}", val_display), unsafe_allow_html=True)
     
     # Form header
     st.markdown(f'''
@@ -2897,12 +2923,13 @@ def render_results(data):
 # Main App
 # =============================================================================
 def main():
+    start_prewarm()
     if "logger" not in st.session_state:
         st.session_state.logger = ExtractionLogger()
     if "detector" not in st.session_state:
         st.session_state.detector = FormDetector()
     if "client" not in st.session_state:
-        st.session_state.client = VisionClient()
+        st.session_state.client = get_vision_client()
     
     # Header
     st.markdown('''
@@ -2919,8 +2946,7 @@ def main():
         
         st.markdown("---")
         st.markdown("### 📋 Supported Forms")
-        for ft, info in SUPPORTED_FORMS.items():
-            st.caption(f"{info['icon']} {ft}")
+        st.caption(SUPPORTED_FORMS_CAPTION)
         
         st.markdown("---")
         st.markdown("### 📊 Status")
@@ -2958,11 +2984,17 @@ def main():
                     img = all_images[page_idx]
                     st.image(img, caption=f"Page {page_idx + 1} of {num_pages}", width=None, use_container_width=True)
                 else:
+                    page_idx = 0
                     img = all_images[0]
                     st.image(img, caption="Preview", width=None, use_container_width=True)
                 
-                # Detect
-                detection = st.session_state.detector.detect(img, uploaded.name)
+                # Detect once per uploaded file and page - Streamlit reruns this script on every
+                # widget interaction, and re-running OCR each time froze the UI for seconds
+                detections = st.session_state.setdefault("detections", {})
+                detection_key = (uploaded.file_id, page_idx)
+                if detection_key not in detections:
+                    detections[detection_key] = st.session_state.detector.detect(img, uploaded.name)
+                detection = detections[detection_key]
                 form_type = detection["form_type"]
                 
                 if form_type != "UNKNOWN":
@@ -2982,12 +3014,12 @@ def main():
                     ''', unsafe_allow_html=True)
                 
                 # For K-1 PDFs, first scan to find K-1 pages
-                is_k1_pdf = form_type == "K-1" and "pdf" in uploaded.type and MULTIPAGE_K1_AVAILABLE
+                is_k1_pdf = form_type == "K-1" and "pdf" in uploaded.type and multipage_available("K-1")
                 
                 if is_k1_pdf:
                     # Initialize processor and scan for K-1 pages
                     if "k1_processor" not in st.session_state:
-                        st.session_state.k1_processor = MultiPageK1Processor()
+                        st.session_state.k1_processor = get_k1_processor()
                     
                     pdf_bytes = uploaded.getvalue()
                     
@@ -3075,12 +3107,12 @@ def main():
                         st.warning("⚠️ No K-1 forms detected in this PDF")
                 
                 # For K-3 PDFs (or same PDF with K-1), scan for K-3 page RANGES
-                is_k3_pdf = "pdf" in uploaded.type and MULTIPAGE_K3_AVAILABLE
+                is_k3_pdf = "pdf" in uploaded.type and multipage_available("K-3")
                 
                 if is_k3_pdf:
                     # Initialize K-3 processor and scan for K-3 pages
                     if "k3_processor" not in st.session_state:
-                        st.session_state.k3_processor = MultiPageK3Processor()
+                        st.session_state.k3_processor = get_k3_processor()
                     
                     pdf_bytes = uploaded.getvalue()
                     
@@ -3182,12 +3214,12 @@ def main():
                                 st.success(f"✅ Done in {elapsed:.1f}s - Extracted {num_pages} pages")
                 
                 # For Form 8805 PDFs, scan for page RANGES
-                is_8805_pdf = "pdf" in uploaded.type and MULTIPAGE_8805_AVAILABLE
+                is_8805_pdf = "pdf" in uploaded.type and multipage_available("8805")
                 
                 if is_8805_pdf:
                     # Initialize Form 8805 processor and scan for pages
                     if "processor_8805" not in st.session_state:
-                        st.session_state.processor_8805 = MultiPage8805Processor()
+                        st.session_state.processor_8805 = get_8805_processor()
                     
                     pdf_bytes = uploaded.getvalue()
                     
@@ -3289,12 +3321,12 @@ def main():
                                 st.success(f"✅ Done in {elapsed:.1f}s - Extracted {num_pages_8805} pages")
                 
                 # For Form 8804 PDFs, scan for page RANGES
-                is_8804_pdf = "pdf" in uploaded.type and MULTIPAGE_8804_AVAILABLE
+                is_8804_pdf = "pdf" in uploaded.type and multipage_available("8804")
                 
                 if is_8804_pdf:
                     # Initialize Form 8804 processor and scan for pages
                     if "processor_8804" not in st.session_state:
-                        st.session_state.processor_8804 = MultiPage8804Processor()
+                        st.session_state.processor_8804 = get_8804_processor()
                     
                     pdf_bytes = uploaded.getvalue()
                     
@@ -1,21 +1,28 @@
 """Forms module - contains form-specific extractors."""
 
-from .w2 import W2Extractor
-from .form_1099int import Form1099INTExtractor
-from .form_k1 import FormK1Extractor
-from .form_k3 import FormK3Extractor, MultiPageK3Processor
-from .form_8805 import Form8805Extractor, MultiPage8805Processor
-from .form_8804 import Form8804Extractor, MultiPage8804Processor
+import importlib
 
-__all__ = [
-    "W2Extractor", 
-    "Form1099INTExtractor", 
-    "FormK1Extractor",
-    "FormK3Extractor",
-    "MultiPageK3Processor",
-    "Form8805Extractor",
-    "MultiPage8805Processor",
-    "Form8804Extractor",
-    "MultiPage8804Processor"
-]
+# Extractors are imported on first access, so importing a light submodule such
+# as forms.pdf_render doesn't load every extractor and its SDK clients
+_EXPORTS = {
+    "W2Extractor": ".w2",
+    "Form1099INTExtractor": ".form_1099int",
+    "FormK1Extractor": ".form_k1",
+    "FormK3Extractor": ".form_k3",
+    "MultiPageK3Processor": ".form_k3",
+    "Form8805Extractor": ".form_8805",
+    "MultiPage8805Processor": ".form_8805",
+    "Form8804Extractor": ".form_8804",
+    "MultiPage8804Processor": ".form_8804",
+}
 
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    """Import an exported extractor class the first time it is accessed."""
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
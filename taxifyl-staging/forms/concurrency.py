@@ -0,0 +1,48 @@
+"""
+Concurrent Page Extraction
+==========================
+Runs an extractor's per-page calls concurrently. Each page is an independent,
+network-bound LLM call, so an N-page document waits roughly one call instead
+of N calls in sequence.
+"""
+
+import asyncio
+
+# Upper bound on in-flight page calls, to stay within Groq/Gemini rate limits
+MAX_CONCURRENT_PAGE_EXTRACTIONS = 8
+
+
+async def _extract_pages_async(extractor, images: list, model: str) -> list:
+    """Run extractor.extract for every image, at most MAX_CONCURRENT_PAGE_EXTRACTIONS at a time."""
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_PAGE_EXTRACTIONS)
+
+    async def extract_one(img):
+        async with semaphore:
+            return await asyncio.to_thread(extractor.extract, img, model)
+
+    return await asyncio.gather(*(extract_one(img) for img in images), return_exceptions=True)
+
+
+def extract_pages_concurrently(extractor, images: list, model: str) -> list:
+    """
+    Extract several page images concurrently.
+
+    Args:
+        extractor: Any form extractor with an extract(img, model) method
+        images: PIL images to extract, in page order
+        model: Model to use for extraction
+
+    Returns:
+        One result per image, in input order. A page whose call raised gets
+        the exception object in its slot, so callers keep per-page error handling.
+    """
+    if len(images) <= 1:
+        # Nothing to overlap; skip the event loop and thread hop
+        results = []
+        for img in images:
+            try:
+                results.append(extractor.extract(img, model))
+            except Exception as e:
+                results.append(e)
+        return results
+    return asyncio.run(_extract_pages_async(extractor, images, model))
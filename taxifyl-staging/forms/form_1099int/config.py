@@ -18,6 +18,11 @@ GROQ_API_KEY = os.environ.get("GROQ_API_KEY", "")
 GEMINI_MODEL = "gemini-2.5-flash"
 GROQ_MODEL = "meta-llama/llama-4-scout-17b-16e-instruct"
 
+# Groq image upload: vision models gain nothing above ~1600px for form OCR,
+# and JPEG keeps the base64 payload several times smaller than PNG
+GROQ_MAX_IMAGE_SIDE = 1600
+GROQ_JPEG_QUALITY = 85
+
 # 1099-INT Extraction System Prompt - User's Exact JSON Format
 INT_1099_SYSTEM_PROMPT = """You are an expert at extracting data from 1099-INT tax forms (Interest Income).
 
@@ -7,7 +7,6 @@ Extracts data from 1099-INT (Interest Income) tax forms using AI vision models.
 import json
 import io
 import re
-import base64
 from typing import Optional, Union
 from PIL import Image
 
@@ -18,6 +17,14 @@ except ImportError:
     TESSERACT_AVAILABLE = False
     pytesseract = None
 
+try:
+    import numpy as np
+    from paddleocr import PaddleOCR
+    PADDLEOCR_AVAILABLE = True
+except ImportError:
+    PADDLEOCR_AVAILABLE = False
+    PaddleOCR = None
+
 try:
     import google.generativeai as genai
     GEMINI_AVAILABLE = True
@@ -32,7 +39,59 @@ except ImportError:
     GROQ_AVAILABLE = False
     Groq = None
 
-from .config import INT_1099_SYSTEM_PROMPT, GEMINI_API_KEY, GROQ_API_KEY, GEMINI_MODEL, GROQ_MODEL
+from ..http_client import get_shared_http_client
+from ..image_utils import downscale_for_upload
+from ..llm_utils import JPEG_DATA_URL_PREFIX, generate_gemini_content, image_data_url, json_loads, strip_json_fences
+from ..result_cache import cached_extraction, mark_ocr_fallback
+from .config import (
+    INT_1099_SYSTEM_PROMPT, GEMINI_API_KEY, GROQ_API_KEY, GEMINI_MODEL, GROQ_MODEL,
+    GROQ_MAX_IMAGE_SIDE, GROQ_JPEG_QUALITY
+)
+
+
+# OCR fallback patterns, compiled once at import
+_YEAR_RE = re.compile(r'20[12][0-9]')
+_PAYER_RE = re.compile(r"PAYER'S.*?name.*?[:]\s*(.+?)(?:\n|$)", re.IGNORECASE)
+_RECIPIENT_RE = re.compile(r"RECIPIENT'S.*?name.*?[:]\s*(.+?)(?:\n|$)", re.IGNORECASE)
+_TIN_PAYER_RE = re.compile(r'\d{2}[-\s]?\d{7}')
+_TIN_RECIPIENT_RE = re.compile(r'XXX[-\s]?XX[-\s]?\d{4}|\d{3}[-\s]?\d{2}[-\s]?\d{4}')
+_ACCOUNT_RE = re.compile(r'account.*?[:]\s*(\S+)', re.IGNORECASE)
+_RTN_RE = re.compile(r'\b\d{9}\b')
+
+# Every box label _parse_1099int_text looks up, fused into one "<label> <amount>"
+# alternation so the OCR text is scanned once instead of once per label (for a
+# dozen short literals on a page of OCR text this single pass is already cheaper
+# than building an Aho-Corasick automaton would save)
+_BOX_LABELS = (
+    "interest income", "box 1", "early withdrawal", "box 2", "savings bonds", "treasury", "box 3",
+    "federal", "tax withheld", "box 4", "investment expenses", "box 5"
+)
+# Labels match whole words only ("box 1" is not "Box 10"), and a bare "federal"
+# is box 4 - not the payer's federal identification number
+_BOX_LABEL_PATTERN = (
+    r'\b(' + '|'.join(re.escape(label) for label in _BOX_LABELS) + r')\b(?!(?<=federal)\s+id)'
+)
+_BOX_LABEL_RE = re.compile(_BOX_LABEL_PATTERN, re.IGNORECASE)
+_BOX_VALUES_RE = re.compile(_BOX_LABEL_PATTERN + r'[\s:]*(\$?[\d,]+\.?\d*)', re.IGNORECASE)
+# A standalone OCR token that is just an amount, e.g. "$1,234.56"
+_AMOUNT_TOKEN_RE = re.compile(r'^\$?\s*\d[\d,]*\.?\d*$')
+
+# Spatial pairing limits, in multiples of the label's line height: an amount must be
+# vertically centred on the label's row or overlap its column, and no further away than this
+_SPATIAL_ALIGN_TOLERANCE = 0.5
+_SPATIAL_MAX_ROW_GAP = 8.0
+_SPATIAL_MAX_COLUMN_GAP = 3.0
+
+# PaddleOCR loads its detection/recognition models on construction - do it once per process
+_paddle_ocr = None
+
+
+def _get_paddle_ocr():
+    """Return the shared PaddleOCR engine, creating it on first use."""
+    global _paddle_ocr
+    if _paddle_ocr is None:
+        _paddle_ocr = PaddleOCR(use_angle_cls=True, lang="en", show_log=False)
+    return _paddle_ocr
 
 
 class Form1099INTExtractor:
@@ -42,19 +101,21 @@ class Form1099INTExtractor:
         """Initialize the 1099-INT extractor."""
         self.gemini_client = None
         self.groq_client = None
+        self._gemini_models = {}  # model name -> GenerativeModel, built once per model
         
         # Initialize Gemini
         if GEMINI_AVAILABLE and GEMINI_API_KEY:
             try:
                 genai.configure(api_key=GEMINI_API_KEY)
                 self.gemini_client = genai.GenerativeModel(GEMINI_MODEL)
+                self._gemini_models[GEMINI_MODEL] = self.gemini_client
             except Exception as e:
                 print(f"Failed to initialize Gemini: {e}")
         
         # Initialize Groq
         if GROQ_AVAILABLE and GROQ_API_KEY:
             try:
-                self.groq_client = Groq(api_key=GROQ_API_KEY)
+                self.groq_client = Groq(api_key=GROQ_API_KEY, http_client=get_shared_http_client())
             except Exception as e:
                 print(f"Failed to initialize Groq: {e}")
     
@@ -62,6 +123,7 @@ class Form1099INTExtractor:
         """Check if at least one extraction method is available."""
         return self.gemini_client is not None or self.groq_client is not None or TESSERACT_AVAILABLE
     
+    @cached_extraction("1099-INT", INT_1099_SYSTEM_PROMPT)
     def extract(
         self, 
         image: Union[Image.Image, bytes, str],
@@ -85,32 +147,48 @@ class Form1099INTExtractor:
         else:
             img = image
         
-        # Ensure RGB mode
-        if img.mode != 'RGB':
+        # Ensure RGB mode - grayscale scans stay 'L', which encodes to a ~3x smaller upload
+        if img.mode not in ('RGB', 'L'):
             img = img.convert('RGB')
         
-        # Convert to bytes for API
-        img_buffer = io.BytesIO()
-        img.save(img_buffer, format='PNG')
-        img_data = img_buffer.getvalue()
+        # Encoded bytes are only needed by the Groq path - encode lazily, at most once
+        jpeg_cache = None
+
+        def get_jpeg_bytes() -> bytes:
+            nonlocal jpeg_cache
+            if jpeg_cache is None:
+                # Downscale a copy so the OCR fallback still sees the full-resolution image
+                upload_img = downscale_for_upload(img, GROQ_MAX_IMAGE_SIDE)
+                img_buffer = io.BytesIO()
+                upload_img.save(img_buffer, format='JPEG', quality=GROQ_JPEG_QUALITY)
+                jpeg_cache = img_buffer.getvalue()
+            return jpeg_cache
         
         # Try extraction with selected model
         if "gemini" in model.lower() and self.gemini_client:
             try:
-                return self._extract_with_gemini(img, INT_1099_SYSTEM_PROMPT, model)
+                return self._extract_with_gemini(downscale_for_upload(img), INT_1099_SYSTEM_PROMPT, model)
             except Exception as e:
                 print(f"Gemini extraction failed: {e}")
         
         if "llama" in model.lower() and self.groq_client:
             try:
-                return self._extract_with_groq(img_data, INT_1099_SYSTEM_PROMPT, model)
+                return self._extract_with_groq(get_jpeg_bytes(), INT_1099_SYSTEM_PROMPT, model)
             except Exception as e:
                 print(f"Groq extraction failed: {e}")
         
-        # Fallback to OCR
+        # Fallback to OCR - PaddleOCR first, its bounding boxes allow spatial box lookup
+        if PADDLEOCR_AVAILABLE:
+            try:
+                mark_ocr_fallback()
+                return self._parse_1099int_spatial(self._ocr_boxes(img))
+            except Exception as e:
+                print(f"PaddleOCR extraction failed: {e}")
+        
         if TESSERACT_AVAILABLE:
             try:
                 text = pytesseract.image_to_string(img)
+                mark_ocr_fallback()
                 return self._parse_1099int_text(text)
             except Exception as e:
                 print(f"OCR extraction failed: {e}")
@@ -119,25 +197,28 @@ class Form1099INTExtractor:
     
     def _extract_with_gemini(self, img: Image.Image, prompt: str, model: str) -> dict:
         """Extract using Google Gemini API."""
-        # Create the model
-        model_instance = genai.GenerativeModel(model)
-        
-        # Generate content
-        response = model_instance.generate_content([prompt, img])
+        response = generate_gemini_content(model, prompt, img, self._gemini_model)
         
         # Parse response
         response_text = response.text
-        json_text = self._clean_json_response(response_text)
+        json_text = strip_json_fences(response_text)
         
         try:
-            return json.loads(json_text)
+            return json_loads(json_text)
         except json.JSONDecodeError:
             return {"raw_response": response_text, "error": "Failed to parse JSON"}
     
+    def _gemini_model(self, model: str) -> "genai.GenerativeModel":
+        """Reuse the model instance for this model name."""
+        model_instance = self._gemini_models.get(model)
+        if model_instance is None:
+            model_instance = genai.GenerativeModel(model)
+            self._gemini_models[model] = model_instance
+        return model_instance
+    
     def _extract_with_groq(self, img_data: bytes, prompt: str, model: str) -> dict:
         """Extract using Groq API with LLaMA Vision."""
-        # Encode image to base64
-        base64_image = base64.b64encode(img_data).decode('utf-8')
+        data_url = image_data_url(img_data, JPEG_DATA_URL_PREFIX)
         
         # Create message with image
         messages = [
@@ -151,7 +232,7 @@ class Form1099INTExtractor:
                     {
                         "type": "image_url",
                         "image_url": {
-                            "url": f"data:image/png;base64,{base64_image}"
+                            "url": data_url
                         }
                     }
                 ]
@@ -168,26 +249,91 @@ class Form1099INTExtractor:
         
         # Parse response
         response_text = response.choices[0].message.content
-        json_text = self._clean_json_response(response_text)
+        json_text = strip_json_fences(response_text)
         
         try:
-            return json.loads(json_text)
+            return json_loads(json_text)
         except json.JSONDecodeError:
             return {"raw_response": response_text, "error": "Failed to parse JSON"}
     
-    def _clean_json_response(self, text: str) -> str:
-        """Clean JSON response by removing markdown code blocks."""
-        text = text.strip()
-        if text.startswith("```json"):
-            text = text[7:]
-        elif text.startswith("```"):
-            text = text[3:]
-        if text.endswith("```"):
-            text = text[:-3]
-        return text.strip()
+    def _ocr_boxes(self, img: Image.Image) -> list:
+        """Run PaddleOCR and return [(text, (x0, y0, x1, y1))] in reading order."""
+        pages = _get_paddle_ocr().ocr(np.array(img), cls=True)
+        boxes = []
+        for points, (text, _score) in (pages[0] or []) if pages else []:
+            xs = [p[0] for p in points]
+            ys = [p[1] for p in points]
+            boxes.append((text, (min(xs), min(ys), max(xs), max(ys))))
+        return boxes
+    
+    def _parse_1099int_spatial(self, boxes: list) -> dict:
+        """Parse PaddleOCR boxes into 1099-INT JSON structure (fallback method)."""
+        text = "\n".join(token for token, _ in boxes)
+        return self._build_1099int_result(text, self._spatial_box_values(boxes))
+    
+    def _spatial_box_values(self, boxes: list) -> dict:
+        """
+        Pair each box label with the nearest amount token on its row (to the right)
+        or in its column (below), within a few line heights of the label.
+        
+        Labels and amounts are classified in one pass over the tokens, so the
+        lookup costs labels x amounts instead of one full-text scan per label.
+        Each amount goes to its closest label only, so a box with no amount
+        stays empty instead of taking a neighbouring box's value.
+        """
+        labels = {}
+        amounts = []
+        for token, bbox in boxes:
+            if _AMOUNT_TOKEN_RE.match(token.strip()):
+                amounts.append((token.strip(), bbox))
+                continue
+            # Label and amount recognized as one token, e.g. "Interest income $1,234.00"
+            for match in _BOX_VALUES_RE.finditer(token):
+                labels.setdefault(match.group(1).lower(), (match.group(2), None))
+            for match in _BOX_LABEL_RE.finditer(token):
+                labels.setdefault(match.group(1).lower(), (None, bbox))
+        
+        box_values = {}
+        label_tokens = {}  # label bbox -> labels read from that token
+        for label, (inline_value, label_bbox) in labels.items():
+            if inline_value:
+                box_values[label] = inline_value
+            else:
+                label_tokens.setdefault(label_bbox, []).append(label)
+        
+        candidates = []
+        for label_bbox in label_tokens:
+            lx0, ly0, lx1, ly1 = label_bbox
+            line_height = ly1 - ly0
+            tolerance = line_height * _SPATIAL_ALIGN_TOLERANCE
+            for index, (_value, (ax0, ay0, ax1, ay1)) in enumerate(amounts):
+                row_gap = ax0 - lx1
+                column_gap = ay0 - ly1
+                same_row = abs((ay0 + ay1) - (ly0 + ly1)) / 2 <= tolerance
+                same_column = ax0 < lx1 + tolerance and ax1 > lx0 - tolerance
+                if same_row and -tolerance <= row_gap <= line_height * _SPATIAL_MAX_ROW_GAP:
+                    candidates.append((max(row_gap, 0), label_bbox, index))
+                elif same_column and -tolerance <= column_gap <= line_height * _SPATIAL_MAX_COLUMN_GAP:
+                    candidates.append((max(column_gap, 0), label_bbox, index))
+        
+        # Closest pairs first; each label token and each amount is paired at most once
+        paired_labels = set()
+        paired_amounts = set()
+        for _distance, label_bbox, index in sorted(candidates):
+            if label_bbox in paired_labels or index in paired_amounts:
+                continue
+            paired_labels.add(label_bbox)
+            paired_amounts.add(index)
+            for label in label_tokens[label_bbox]:
+                box_values[label] = amounts[index][0]
+        return box_values
     
     def _parse_1099int_text(self, text: str) -> dict:
         """Parse OCR text into 1099-INT JSON structure (fallback method)."""
+        return self._build_1099int_result(text, self._scan_box_values(text))
+    
+    def _build_1099int_result(self, text: str, box_values: dict) -> dict:
+        """Assemble the 1099-INT JSON structure from OCR text and per-label box amounts."""
         result = [
             {
                 "forms": [
@@ -216,11 +362,11 @@ class Form1099INTExtractor:
                             },
                             {
                                 "financial_plane": [
-                                    {"data": [{"code": "1", "label": "Interest income", "value": self._extract_box_value(text, ["interest income", "box 1"])}]},
-                                    {"data": [{"code": "2", "label": "Early withdrawal penalty", "value": self._extract_box_value(text, ["early withdrawal", "box 2"])}]},
-                                    {"data": [{"code": "3", "label": "Interest on U.S. Savings Bonds and Treasury obligations", "value": self._extract_box_value(text, ["savings bonds", "treasury", "box 3"])}]},
-                                    {"data": [{"code": "4", "label": "Federal income tax withheld", "value": self._extract_box_value(text, ["federal", "tax withheld", "box 4"])}]},
-                                    {"data": [{"code": "5", "label": "Investment expenses", "value": self._extract_box_value(text, ["investment expenses", "box 5"])}]},
+                                    {"data": [{"code": "1", "label": "Interest income", "value": self._extract_box_value(box_values, ["interest income", "box 1"])}]},
+                                    {"data": [{"code": "2", "label": "Early withdrawal penalty", "value": self._extract_box_value(box_values, ["early withdrawal", "box 2"])}]},
+                                    {"data": [{"code": "3", "label": "Interest on U.S. Savings Bonds and Treasury obligations", "value": self._extract_box_value(box_values, ["savings bonds", "treasury", "box 3"])}]},
+                                    {"data": [{"code": "4", "label": "Federal income tax withheld", "value": self._extract_box_value(box_values, ["federal", "tax withheld", "box 4"])}]},
+                                    {"data": [{"code": "5", "label": "Investment expenses", "value": self._extract_box_value(box_values, ["investment expenses", "box 5"])}]},
                                     {"data": [{"code": "6", "label": "Foreign tax paid", "value": None}]},
                                     {"data": [{"code": "8", "label": "Tax-exempt interest", "value": None}]},
                                     {"data": [{"code": "9", "label": "Specified private activity bond interest", "value": None}]},
@@ -244,44 +390,50 @@ class Form1099INTExtractor:
     
     def _extract_year(self, text: str) -> str:
         """Extract tax year from text."""
-        match = re.search(r'20[12][0-9]', text)
+        match = _YEAR_RE.search(text)
         return match.group(0) if match else "2024"
     
     def _extract_payer(self, text: str) -> str:
         """Extract payer name and address."""
         # Simple extraction - look for text after "PAYER'S"
-        match = re.search(r"PAYER'S.*?name.*?[:]\s*(.+?)(?:\n|$)", text, re.IGNORECASE)
+        match = _PAYER_RE.search(text)
         return match.group(1).strip() if match else ""
     
     def _extract_recipient(self, text: str) -> str:
         """Extract recipient name and address."""
-        match = re.search(r"RECIPIENT'S.*?name.*?[:]\s*(.+?)(?:\n|$)", text, re.IGNORECASE)
+        match = _RECIPIENT_RE.search(text)
         return match.group(1).strip() if match else ""
     
     def _extract_tin(self, text: str, party: str) -> str:
         """Extract TIN (Taxpayer Identification Number)."""
-        pattern = r'\d{2}[-\s]?\d{7}' if party == "payer" else r'XXX[-\s]?XX[-\s]?\d{4}|\d{3}[-\s]?\d{2}[-\s]?\d{4}'
-        match = re.search(pattern, text)
+        pattern = _TIN_PAYER_RE if party == "payer" else _TIN_RECIPIENT_RE
+        match = pattern.search(text)
         return match.group(0) if match else ""
     
     def _extract_account(self, text: str) -> str:
         """Extract account number."""
-        match = re.search(r'account.*?[:]\s*(\S+)', text, re.IGNORECASE)
+        match = _ACCOUNT_RE.search(text)
         return match.group(1) if match else ""
     
     def _extract_rtn(self, text: str) -> str:
         """Extract Payer's RTN (Routing Transit Number)."""
-        match = re.search(r'\b\d{9}\b', text)
+        match = _RTN_RE.search(text)
         return match.group(0) if match else ""
     
-    def _extract_box_value(self, text: str, patterns: list) -> float:
-        """Extract a numeric value near the given patterns."""
+    def _scan_box_values(self, text: str) -> dict:
+        """Collect the first amount following each box label in a single pass."""
+        box_values = {}
+        for match in _BOX_VALUES_RE.finditer(text):
+            box_values.setdefault(match.group(1).lower(), match.group(2))
+        return box_values
+    
+    def _extract_box_value(self, box_values: dict, patterns: list) -> float:
+        """Return the amount of the first of the given labels that has a parsable value."""
         for pattern in patterns:
-            match = re.search(f'{pattern}[\\s:]*([\\$]?[\\d,]+\\.?\\d*)', text, re.IGNORECASE)
-            if match:
-                value_str = match.group(1).replace('$', '').replace(',', '')
+            value_str = box_values.get(pattern)
+            if value_str:
                 try:
-                    return float(value_str)
+                    return float(value_str.replace('$', '').replace(',', ''))
                 except ValueError:
                     continue
         return 0.00
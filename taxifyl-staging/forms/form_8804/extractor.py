@@ -8,7 +8,6 @@ Same structure as K-1/K-3/8805 extractor with page detection and batch extractio
 import json
 import io
 import re
-import base64
 from typing import Optional, Union
 from PIL import Image
 
@@ -47,6 +46,11 @@ load_dotenv()
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY", "")
 GROQ_API_KEY_2 = os.environ.get("GROQ_API_KEY_2", "")
 
+from ..concurrency import extract_pages_concurrently
+from ..http_client import get_shared_http_client
+from ..image_utils import downscale_for_upload
+from ..llm_utils import generate_gemini_content, image_data_url, json_loads, strip_json_fences
+from ..result_cache import cached_extraction, mark_ocr_fallback
 from .config import FORM_8804_SYSTEM_PROMPT, GEMINI_API_KEY, GROQ_API_KEY, GEMINI_MODEL, GROQ_MODEL
 
 
@@ -70,7 +74,7 @@ class Form8804Extractor:
         # Initialize Groq
         if GROQ_AVAILABLE and GROQ_API_KEY:
             try:
-                self.groq_client = Groq(api_key=GROQ_API_KEY)
+                self.groq_client = Groq(api_key=GROQ_API_KEY, http_client=get_shared_http_client())
             except Exception as e:
                 print(f"Failed to initialize Groq: {e}")
         
@@ -78,7 +82,7 @@ class Form8804Extractor:
         self.groq_client_backup = None
         if GROQ_AVAILABLE and GROQ_API_KEY_2:
             try:
-                self.groq_client_backup = Groq(api_key=GROQ_API_KEY_2)
+                self.groq_client_backup = Groq(api_key=GROQ_API_KEY_2, http_client=get_shared_http_client())
             except Exception as e:
                 print(f"Failed to initialize backup Groq: {e}")
         
@@ -93,6 +97,7 @@ class Form8804Extractor:
         """Check if at least one extraction method is available."""
         return self.gemini_client is not None or self.groq_client is not None or self.openai_client is not None or TESSERACT_AVAILABLE
     
+    @cached_extraction("8804", FORM_8804_SYSTEM_PROMPT)
     def extract(
         self, 
         image: Union[Image.Image, bytes, str],
@@ -116,19 +121,22 @@ class Form8804Extractor:
         else:
             img = image
         
-        # Ensure RGB mode
-        if img.mode != 'RGB':
+        # Ensure RGB mode - grayscale scans stay 'L', which encodes to a ~3x smaller upload
+        if img.mode not in ('RGB', 'L'):
             img = img.convert('RGB')
         
+        # Upload a downscaled copy to the vision APIs; the OCR fallback keeps full resolution
+        upload_img = downscale_for_upload(img)
+        
         # Convert to bytes for API
         img_buffer = io.BytesIO()
-        img.save(img_buffer, format='PNG')
+        upload_img.save(img_buffer, format='PNG')
         img_data = img_buffer.getvalue()
         
         # Try extraction with selected model
         if "gemini" in model.lower() and self.gemini_client:
             try:
-                return self._extract_with_gemini(img, FORM_8804_SYSTEM_PROMPT, model)
+                return self._extract_with_gemini(upload_img, FORM_8804_SYSTEM_PROMPT, model)
             except Exception as e:
                 print(f"Gemini extraction failed: {e}")
         
@@ -148,6 +156,7 @@ class Form8804Extractor:
         if TESSERACT_AVAILABLE:
             try:
                 text = pytesseract.image_to_string(img)
+                mark_ocr_fallback()
                 return self._parse_8804_text(text)
             except Exception as e:
                 print(f"OCR extraction failed: {e}")
@@ -156,20 +165,19 @@ class Form8804Extractor:
     
     def _extract_with_gemini(self, img: Image.Image, prompt: str, model: str) -> dict:
         """Extract using Google Gemini API."""
-        model_instance = genai.GenerativeModel(model)
-        response = model_instance.generate_content([prompt, img])
+        response = generate_gemini_content(model, prompt, img)
         
         response_text = response.text
-        json_text = self._clean_json_response(response_text)
+        json_text = strip_json_fences(response_text)
         
         try:
-            return json.loads(json_text)
+            return json_loads(json_text)
         except json.JSONDecodeError:
             return {"raw_response": response_text, "error": "Failed to parse JSON"}
     
     def _extract_with_groq(self, img_data: bytes, prompt: str, model: str) -> dict:
         """Extract using Groq API with LLaMA Vision."""
-        base64_image = base64.b64encode(img_data).decode('utf-8')
+        data_url = image_data_url(img_data)
         
         messages = [
             {
@@ -178,7 +186,7 @@ class Form8804Extractor:
                     {"type": "text", "text": prompt},
                     {
                         "type": "image_url",
-                        "image_url": {"url": f"data:image/png;base64,{base64_image}"}
+                        "image_url": {"url": data_url}
                     }
                 ]
             }
@@ -205,16 +213,16 @@ class Form8804Extractor:
                 raise e
         
         response_text = response.choices[0].message.content
-        json_text = self._clean_json_response(response_text)
+        json_text = strip_json_fences(response_text)
         
         try:
-            return json.loads(json_text)
+            return json_loads(json_text)
         except json.JSONDecodeError:
             return {"raw_response": response_text, "error": "Failed to parse JSON"}
     
     def _extract_with_openai(self, img_data: bytes, prompt: str, model: str) -> dict:
         """Extract using OpenAI GPT-4 Vision API."""
-        base64_image = base64.b64encode(img_data).decode('utf-8')
+        data_url = image_data_url(img_data)
         
         messages = [
             {
@@ -223,7 +231,7 @@ class Form8804Extractor:
                     {"type": "text", "text": prompt},
                     {
                         "type": "image_url",
-                        "image_url": {"url": f"data:image/png;base64,{base64_image}"}
+                        "image_url": {"url": data_url}
                     }
                 ]
             }
@@ -237,24 +245,13 @@ class Form8804Extractor:
         )
         
         response_text = response.choices[0].message.content
-        json_text = self._clean_json_response(response_text)
+        json_text = strip_json_fences(response_text)
         
         try:
-            return json.loads(json_text)
+            return json_loads(json_text)
         except json.JSONDecodeError:
             return {"raw_response": response_text, "error": "Failed to parse JSON"}
     
-    def _clean_json_response(self, text: str) -> str:
-        """Clean JSON response by removing markdown code blocks."""
-        text = text.strip()
-        if text.startswith("```json"):
-            text = text[7:]
-        elif text.startswith("```"):
-            text = text[3:]
-        if text.endswith("```"):
-            text = text[:-3]
-        return text.strip()
-    
     def _parse_8804_text(self, text: str) -> dict:
         """Parse OCR text into Form 8804 JSON structure (fallback method)."""
         return {
@@ -521,8 +518,10 @@ class MultiPage8804Processor:
             progress_callback("extracting", "🤖 Extracting Form 8804 data...", 60)
         
         all_forms = []
-        for (start, end), (page_num, img) in zip(page_ranges, page_images):
-            result = self.extractor.extract(img, model)
+        range_results = extract_pages_concurrently(self.extractor, [img for _, img in page_images], model)
+        for (start, end), result in zip(page_ranges, range_results):
+            if isinstance(result, Exception):
+                raise result
             if isinstance(result, dict) and "error" not in result:
                 result["page_reference"] = f"{start}-{end}"
                 all_forms.append(result)
@@ -7,7 +7,6 @@ Extracts data from Schedule K-1 (Form 1065) tax forms using AI vision models.
 import json
 import io
 import re
-import base64
 from typing import Optional, Union
 from PIL import Image
 
@@ -32,6 +31,11 @@ except ImportError:
     GROQ_AVAILABLE = False
     Groq = None
 
+from ..concurrency import extract_pages_concurrently
+from ..http_client import get_shared_http_client
+from ..image_utils import downscale_for_upload
+from ..llm_utils import generate_gemini_content, image_data_url, json_loads, strip_json_fences
+from ..result_cache import cached_extraction, mark_ocr_fallback
 from .config import K1_1065_SYSTEM_PROMPT, GEMINI_API_KEY, GROQ_API_KEY, GEMINI_MODEL, GROQ_MODEL
 
 
@@ -54,7 +58,7 @@ class FormK1Extractor:
         # Initialize Groq
         if GROQ_AVAILABLE and GROQ_API_KEY:
             try:
-                self.groq_client = Groq(api_key=GROQ_API_KEY)
+                self.groq_client = Groq(api_key=GROQ_API_KEY, http_client=get_shared_http_client())
             except Exception as e:
                 print(f"Failed to initialize Groq: {e}")
     
@@ -62,6 +66,7 @@ class FormK1Extractor:
         """Check if at least one extraction method is available."""
         return self.gemini_client is not None or self.groq_client is not None or TESSERACT_AVAILABLE
     
+    @cached_extraction("K-1", K1_1065_SYSTEM_PROMPT)
     def extract(
         self, 
         image: Union[Image.Image, bytes, str],
@@ -85,19 +90,22 @@ class FormK1Extractor:
         else:
             img = image
         
-        # Ensure RGB mode
-        if img.mode != 'RGB':
+        # Ensure RGB mode - grayscale scans stay 'L', which encodes to a ~3x smaller upload
+        if img.mode not in ('RGB', 'L'):
             img = img.convert('RGB')
         
+        # Upload a downscaled copy to the vision APIs; the OCR fallback keeps full resolution
+        upload_img = downscale_for_upload(img)
+        
         # Convert to bytes for API
         img_buffer = io.BytesIO()
-        img.save(img_buffer, format='PNG')
+        upload_img.save(img_buffer, format='PNG')
         img_data = img_buffer.getvalue()
         
         # Try extraction with selected model
         if "gemini" in model.lower() and self.gemini_client:
             try:
-                return self._extract_with_gemini(img, K1_1065_SYSTEM_PROMPT, model)
+                return self._extract_with_gemini(upload_img, K1_1065_SYSTEM_PROMPT, model)
             except Exception as e:
                 print(f"Gemini extraction failed: {e}")
         
@@ -111,6 +119,7 @@ class FormK1Extractor:
         if TESSERACT_AVAILABLE:
             try:
                 text = pytesseract.image_to_string(img)
+                mark_ocr_fallback()
                 return self._parse_k1_text(text)
             except Exception as e:
                 print(f"OCR extraction failed: {e}")
@@ -119,25 +128,20 @@ class FormK1Extractor:
     
     def _extract_with_gemini(self, img: Image.Image, prompt: str, model: str) -> dict:
         """Extract using Google Gemini API."""
-        # Create the model
-        model_instance = genai.GenerativeModel(model)
-        
-        # Generate content
-        response = model_instance.generate_content([prompt, img])
+        response = generate_gemini_content(model, prompt, img)
         
         # Parse response
         response_text = response.text
-        json_text = self._clean_json_response(response_text)
+        json_text = strip_json_fences(response_text)
         
         try:
-            return json.loads(json_text)
+            return json_loads(json_text)
         except json.JSONDecodeError:
             return {"raw_response": response_text, "error": "Failed to parse JSON"}
     
     def _extract_with_groq(self, img_data: bytes, prompt: str, model: str) -> dict:
         """Extract using Groq API with LLaMA Vision."""
-        # Encode image to base64
-        base64_image = base64.b64encode(img_data).decode('utf-8')
+        data_url = image_data_url(img_data)
         
         # Create message with image
         messages = [
@@ -151,7 +155,7 @@ class FormK1Extractor:
                     {
                         "type": "image_url",
                         "image_url": {
-                            "url": f"data:image/png;base64,{base64_image}"
+                            "url": data_url
                         }
                     }
                 ]
@@ -168,24 +172,13 @@ class FormK1Extractor:
         
         # Parse response
         response_text = response.choices[0].message.content
-        json_text = self._clean_json_response(response_text)
+        json_text = strip_json_fences(response_text)
         
         try:
-            return json.loads(json_text)
+            return json_loads(json_text)
         except json.JSONDecodeError:
             return {"raw_response": response_text, "error": "Failed to parse JSON"}
     
-    def _clean_json_response(self, text: str) -> str:
-        """Clean JSON response by removing markdown code blocks."""
-        text = text.strip()
-        if text.startswith("```json"):
-            text = text[7:]
-        elif text.startswith("```"):
-            text = text[3:]
-        if text.endswith("```"):
-            text = text[:-3]
-        return text.strip()
-    
     def _parse_k1_text(self, text: str) -> dict:
         """Parse OCR text into K-1 JSON structure (fallback method)."""
         result = [
@@ -436,11 +429,15 @@ class MultiPageK1Processor:
         document_metadata = None
         raw_results = []
         
-        for page_num, img in page_images:
+        # Run the per-page calls concurrently, then consolidate in page order
+        page_results = extract_pages_concurrently(self.extractor, [img for _, img in page_images], model)
+        
+        for (page_num, img), result in zip(page_images, page_results):
             print(f"🤖 Extracting data from page {page_num}...")
             
             try:
-                result = self.extractor.extract(img, model)
+                if isinstance(result, Exception):
+                    raise result
                 print(f"   📦 Raw result type: {type(result)}")
                 
                 # Store raw result for debugging
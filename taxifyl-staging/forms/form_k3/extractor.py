@@ -8,7 +8,6 @@ Same structure as K-1 extractor with page detection and batch extraction.
 import json
 import io
 import re
-import base64
 from typing import Optional, Union
 from PIL import Image
 
@@ -47,6 +46,11 @@ load_dotenv()  # Load .env file
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY", "")
 GROQ_API_KEY_2 = os.environ.get("GROQ_API_KEY_2", "")
 
+from ..concurrency import extract_pages_concurrently
+from ..http_client import get_shared_http_client
+from ..image_utils import downscale_for_upload
+from ..llm_utils import generate_gemini_content, image_data_url, json_loads, strip_json_fences
+from ..result_cache import cached_extraction, mark_ocr_fallback
 from .config import K3_1065_SYSTEM_PROMPT, GEMINI_API_KEY, GROQ_API_KEY, GEMINI_MODEL, GROQ_MODEL
 
 
@@ -70,7 +74,7 @@ class FormK3Extractor:
         # Initialize Groq (primary and backup)
         if GROQ_AVAILABLE and GROQ_API_KEY:
             try:
-                self.groq_client = Groq(api_key=GROQ_API_KEY)
+                self.groq_client = Groq(api_key=GROQ_API_KEY, http_client=get_shared_http_client())
             except Exception as e:
                 print(f"Failed to initialize Groq: {e}")
         
@@ -78,7 +82,7 @@ class FormK3Extractor:
         self.groq_client_backup = None
         if GROQ_AVAILABLE and GROQ_API_KEY_2:
             try:
-                self.groq_client_backup = Groq(api_key=GROQ_API_KEY_2)
+                self.groq_client_backup = Groq(api_key=GROQ_API_KEY_2, http_client=get_shared_http_client())
                 print("✅ Backup Groq client initialized")
             except Exception as e:
                 print(f"Failed to initialize backup Groq: {e}")
@@ -94,6 +98,7 @@ class FormK3Extractor:
         """Check if at least one extraction method is available."""
         return self.gemini_client is not None or self.groq_client is not None or self.openai_client is not None or TESSERACT_AVAILABLE
     
+    @cached_extraction("K-3", K3_1065_SYSTEM_PROMPT)
     def extract(
         self, 
         image: Union[Image.Image, bytes, str],
@@ -117,19 +122,22 @@ class FormK3Extractor:
         else:
             img = image
         
-        # Ensure RGB mode
-        if img.mode != 'RGB':
+        # Ensure RGB mode - grayscale scans stay 'L', which encodes to a ~3x smaller upload
+        if img.mode not in ('RGB', 'L'):
             img = img.convert('RGB')
         
+        # Upload a downscaled copy to the vision APIs; the OCR fallback keeps full resolution
+        upload_img = downscale_for_upload(img)
+        
         # Convert to bytes for API
         img_buffer = io.BytesIO()
-        img.save(img_buffer, format='PNG')
+        upload_img.save(img_buffer, format='PNG')
         img_data = img_buffer.getvalue()
         
         # Try extraction with selected model
         if "gemini" in model.lower() and self.gemini_client:
             try:
-                return self._extract_with_gemini(img, K3_1065_SYSTEM_PROMPT, model)
+                return self._extract_with_gemini(upload_img, K3_1065_SYSTEM_PROMPT, model)
             except Exception as e:
                 print(f"Gemini extraction failed: {e}")
         
@@ -149,6 +157,7 @@ class FormK3Extractor:
         if TESSERACT_AVAILABLE:
             try:
                 text = pytesseract.image_to_string(img)
+                mark_ocr_fallback()
                 return self._parse_k3_text(text)
             except Exception as e:
                 print(f"OCR extraction failed: {e}")
@@ -157,20 +166,19 @@ class FormK3Extractor:
     
     def _extract_with_gemini(self, img: Image.Image, prompt: str, model: str) -> dict:
         """Extract using Google Gemini API."""
-        model_instance = genai.GenerativeModel(model)
-        response = model_instance.generate_content([prompt, img])
+        response = generate_gemini_content(model, prompt, img)
         
         response_text = response.text
-        json_text = self._clean_json_response(response_text)
+        json_text = strip_json_fences(response_text)
         
         try:
-            return json.loads(json_text)
+            return json_loads(json_text)
         except json.JSONDecodeError:
             return {"raw_response": response_text, "error": "Failed to parse JSON"}
     
     def _extract_with_groq(self, img_data: bytes, prompt: str, model: str) -> dict:
         """Extract using Groq API with LLaMA Vision. Uses backup key if rate limited."""
-        base64_image = base64.b64encode(img_data).decode('utf-8')
+        data_url = image_data_url(img_data)
         
         messages = [
             {
@@ -179,7 +187,7 @@ class FormK3Extractor:
                     {"type": "text", "text": prompt},
                     {
                         "type": "image_url",
-                        "image_url": {"url": f"data:image/png;base64,{base64_image}"}
+                        "image_url": {"url": data_url}
                     }
                 ]
             }
@@ -208,16 +216,16 @@ class FormK3Extractor:
                 raise e
         
         response_text = response.choices[0].message.content
-        json_text = self._clean_json_response(response_text)
+        json_text = strip_json_fences(response_text)
         
         try:
-            return json.loads(json_text)
+            return json_loads(json_text)
         except json.JSONDecodeError:
             return {"raw_response": response_text, "error": "Failed to parse JSON"}
     
     def _extract_with_openai(self, img_data: bytes, prompt: str, model: str) -> dict:
         """Extract using OpenAI GPT-4 Vision API."""
-        base64_image = base64.b64encode(img_data).decode('utf-8')
+        data_url = image_data_url(img_data)
         
         messages = [
             {
@@ -226,7 +234,7 @@ class FormK3Extractor:
                     {"type": "text", "text": prompt},
                     {
                         "type": "image_url",
-                        "image_url": {"url": f"data:image/png;base64,{base64_image}"}
+                        "image_url": {"url": data_url}
                     }
                 ]
             }
@@ -240,24 +248,13 @@ class FormK3Extractor:
         )
         
         response_text = response.choices[0].message.content
-        json_text = self._clean_json_response(response_text)
+        json_text = strip_json_fences(response_text)
         
         try:
-            return json.loads(json_text)
+            return json_loads(json_text)
         except json.JSONDecodeError:
             return {"raw_response": response_text, "error": "Failed to parse JSON"}
     
-    def _clean_json_response(self, text: str) -> str:
-        """Clean JSON response by removing markdown code blocks."""
-        text = text.strip()
-        if text.startswith("```json"):
-            text = text[7:]
-        elif text.startswith("```"):
-            text = text[3:]
-        if text.endswith("```"):
-            text = text[:-3]
-        return text.strip()
-    
     def _parse_k3_text(self, text: str) -> dict:
         """Parse OCR text into K-3 JSON structure (fallback method)."""
         result = [{
@@ -497,11 +494,15 @@ class MultiPageK3Processor:
         first_page = page_images[0][0] if page_images else 1
         last_page = page_images[-1][0] if page_images else 1
         
-        for page_num, img in page_images:
+        # Run the per-page calls concurrently, then merge in page order
+        page_results = extract_pages_concurrently(self.extractor, [img for _, img in page_images], model)
+        
+        for (page_num, img), result in zip(page_images, page_results):
             print(f"🤖 Extracting K-3 data from page {page_num}...")
             
             try:
-                result = self.extractor.extract(img, model)
+                if isinstance(result, Exception):
+                    raise result
                 raw_results.append({"page": page_num, "raw": result})
                 
                 # Handle different response formats
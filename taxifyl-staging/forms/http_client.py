@@ -0,0 +1,28 @@
+"""
+Shared HTTP Client
+==================
+One pooled httpx client reused by every extractor's Groq SDK client, so
+sequential and concurrent page extractions share keep-alive connections
+instead of re-doing the TCP/TLS handshake per extractor instance.
+"""
+
+try:
+    import httpx
+    HTTPX_AVAILABLE = True
+except ImportError:
+    HTTPX_AVAILABLE = False
+    httpx = None
+
+_HTTP = None
+
+
+def get_shared_http_client():
+    """Return the process-wide pooled httpx.Client, or None if httpx is missing."""
+    global _HTTP
+    if _HTTP is None and HTTPX_AVAILABLE:
+        _HTTP = httpx.Client(
+            http2=True,
+            timeout=60,
+            limits=httpx.Limits(max_keepalive_connections=16, max_connections=32)
+        )
+    return _HTTP
@@ -0,0 +1,20 @@
+"""
+Image Upload Helpers
+====================
+Shared image preparation for the vision-model calls made by the form extractors.
+"""
+
+from PIL import Image
+
+# Gemini bills and serves images per tile; past ~1536px a form page only costs
+# more tiles (prefill tokens and latency) without making printed text more legible
+VISION_MAX_IMAGE_SIDE = 1536
+
+
+def downscale_for_upload(img: Image.Image, max_side: int = VISION_MAX_IMAGE_SIDE) -> Image.Image:
+    """Return img itself, or a downscaled copy when its longer side exceeds max_side."""
+    if max(img.size) <= max_side:
+        return img
+    upload_img = img.copy()
+    upload_img.thumbnail((max_side, max_side), Image.LANCZOS)
+    return upload_img
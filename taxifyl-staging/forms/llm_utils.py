@@ -0,0 +1,73 @@
+"""
+LLM Response Helpers
+====================
+Shared request and response handling for the vision-model calls made by the form extractors.
+"""
+
+import base64
+import json
+import re
+from typing import Callable, Optional
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+    orjson = None
+
+try:
+    import google.generativeai as genai
+    GEMINI_AVAILABLE = True
+except ImportError:
+    GEMINI_AVAILABLE = False
+    genai = None
+
+from .prompt_cache import get_cached_prompt_model
+
+# LLM responses decode with orjson when installed (its JSONDecodeError subclasses json's)
+json_loads = orjson.loads if ORJSON_AVAILABLE else json.loads
+
+# Optional ```json fences around a model response; group 1 is the bare payload
+_FENCE_RE = re.compile(r'^\s*(?:```(?:json)?)?\s*(.*?)\s*(?:```)?\s*$', re.DOTALL)
+
+# Prefixes of the base64 data URLs sent to the vision APIs
+PNG_DATA_URL_PREFIX = b"data:image/png;base64,"
+JPEG_DATA_URL_PREFIX = b"data:image/jpeg;base64,"
+
+
+def image_data_url(img_data: bytes, prefix: bytes = PNG_DATA_URL_PREFIX) -> str:
+    """Base64 data URL for encoded image bytes, built as bytes and decoded once."""
+    return (prefix + base64.b64encode(img_data)).decode('ascii')
+
+
+def strip_json_fences(text: str) -> str:
+    """Clean JSON response by removing markdown code blocks."""
+    return _FENCE_RE.match(text).group(1)
+
+
+def generate_gemini_content(
+    model: str,
+    prompt: str,
+    img,
+    get_model: Optional[Callable[[str], "genai.GenerativeModel"]] = None
+):
+    """
+    Send one page image to Gemini with the extractor's system prompt.
+
+    Args:
+        model: Gemini model name
+        prompt: Extractor system prompt
+        img: Page image
+        get_model: Returns the GenerativeModel for inline-prompt requests (a new one when omitted)
+
+    Returns:
+        The generate_content response
+    """
+    cached_model = get_cached_prompt_model(model, prompt)
+    if cached_model is not None:
+        # The system prompt is already in Gemini's context cache - send only the image
+        return cached_model.generate_content([img])
+
+    model_instance = get_model(model) if get_model else genai.GenerativeModel(model)
+    return model_instance.generate_content([prompt, img])
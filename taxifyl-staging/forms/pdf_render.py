@@ -0,0 +1,80 @@
+"""
+PDF Page Rendering
+==================
+Rasterizes PDF pages to PIL images. Rendering is pure CPU work, so larger
+documents are split across a process pool; each worker opens its own
+document from the bytes, since PyMuPDF documents can't be shared.
+"""
+
+import atexit
+import io
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import fitz
+from PIL import Image
+
+# Below this many pages the pool's IPC overhead outweighs the parallel speedup
+PARALLEL_RENDER_MIN_PAGES = 4
+# Each worker holds its own copy of the PDF, and the app shares the machine
+# with other sessions, so the pool stays small
+RENDER_POOL_MAX_WORKERS = min(4, os.cpu_count() or 1)
+
+_render_pool = None
+_render_pool_lock = threading.Lock()
+
+
+def _get_render_pool() -> ProcessPoolExecutor:
+    """Return the shared render pool, creating it on first use."""
+    global _render_pool
+    with _render_pool_lock:
+        if _render_pool is None:
+            # spawn, not fork: forking the threaded Streamlit server can copy held locks into the child
+            _render_pool = ProcessPoolExecutor(
+                max_workers=RENDER_POOL_MAX_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+            atexit.register(_render_pool.shutdown, wait=False, cancel_futures=True)
+    return _render_pool
+
+
+def _render_page_range(pdf_bytes: bytes, start: int, stop: int, zoom: float) -> list:
+    """Render pages [start, stop) and return each one PNG-encoded (far smaller to pickle than raw pixels)."""
+    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+    try:
+        return [
+            doc.load_page(page_index).get_pixmap(matrix=fitz.Matrix(zoom, zoom)).tobytes("png")
+            for page_index in range(start, stop)
+        ]
+    finally:
+        doc.close()
+
+
+def render_pdf_pages(pdf_bytes: bytes, zoom: float = 2) -> list:
+    """
+    Render every page of a PDF to an RGB PIL image.
+
+    Args:
+        pdf_bytes: Raw PDF content
+        zoom: Scale factor applied to both axes (2 = 144 DPI)
+
+    Returns:
+        List of PIL images in page order
+    """
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        page_count = doc.page_count
+        if page_count < PARALLEL_RENDER_MIN_PAGES:
+            pixmaps = [doc.load_page(page_index).get_pixmap(matrix=fitz.Matrix(zoom, zoom)) for page_index in range(page_count)]
+            return [Image.frombytes("RGB", [pix.width, pix.height], pix.samples) for pix in pixmaps]
+
+    # One contiguous page range per worker, so the PDF bytes are shipped once per worker
+    workers = min(RENDER_POOL_MAX_WORKERS, page_count)
+    step = -(-page_count // workers)
+    starts = range(0, page_count, step)
+    futures = [
+        _get_render_pool().submit(_render_page_range, pdf_bytes, start, min(start + step, page_count), zoom)
+        for start in starts
+    ]
+    return [Image.open(io.BytesIO(png)) for future in futures for png in future.result()]
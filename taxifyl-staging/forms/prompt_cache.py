@@ -0,0 +1,94 @@
+"""
+System Prompt Context Cache
+===========================
+Uploads each extractor system prompt to Gemini's context cache once and hands
+out a GenerativeModel bound to it, so per-page requests only ship the image.
+"""
+
+import hashlib
+import logging
+import os
+import threading
+import time
+from datetime import timedelta
+from typing import Optional
+
+try:
+    import google.generativeai as genai
+    from google.generativeai import caching
+    GEMINI_AVAILABLE = True
+except ImportError:
+    GEMINI_AVAILABLE = False
+    genai = None
+    caching = None
+
+logger = logging.getLogger(__name__)
+
+# Opt-in: Gemini rejects cached contents below the model's minimum token count,
+# in which case extraction falls back to sending the prompt inline
+EXTRACTOR_PROMPT_CACHE_ENABLED = os.getenv("EXTRACTOR_PROMPT_CACHE_ENABLED", "false").lower() in ("1", "true", "yes")
+EXTRACTOR_PROMPT_CACHE_TTL_SECONDS = int(os.getenv("EXTRACTOR_PROMPT_CACHE_TTL_SECONDS", "3600"))
+EXTRACTOR_PROMPT_CACHE_REFRESH_MARGIN = 300  # Re-create this many seconds before expiry
+EXTRACTOR_PROMPT_CACHE_RETRY_SECONDS = 60  # Wait this long before retrying a failed create
+
+# (model, prompt hash) -> {"model": GenerativeModel or None, "expires_at": float (retry deadline when None)}
+_prompt_caches = {}
+_key_locks = {}  # (model, prompt hash) -> Lock held while that cache is created
+_key_locks_lock = threading.Lock()
+
+
+def _key_lock(key: tuple) -> threading.Lock:
+    """Return the lock serializing cache creation for one (model, prompt) key."""
+    with _key_locks_lock:
+        return _key_locks.setdefault(key, threading.Lock())
+
+
+def _usable_entry(entry: Optional[dict]) -> bool:
+    """True if entry is a live cache, or a failure still inside its retry backoff."""
+    if entry is None:
+        return False
+    if entry["model"] is None:
+        return time.time() < entry["expires_at"]
+    return time.time() < entry["expires_at"] - EXTRACTOR_PROMPT_CACHE_REFRESH_MARGIN
+
+
+def get_cached_prompt_model(model: str, prompt: str) -> Optional["genai.GenerativeModel"]:
+    """
+    Return a GenerativeModel whose system instruction is a cached copy of prompt,
+    creating or refreshing the cache when missing or close to expiry.
+
+    Returns:
+        The bound model, or None if caching is disabled or unavailable for this model
+    """
+    if not (EXTRACTOR_PROMPT_CACHE_ENABLED and GEMINI_AVAILABLE):
+        return None
+
+    key = (model, hashlib.sha256(prompt.encode()).hexdigest())
+    entry = _prompt_caches.get(key)
+    if _usable_entry(entry):
+        return entry["model"]
+
+    # Pages extracted concurrently would otherwise each create their own cache;
+    # the lock is per key, so other models and prompts aren't blocked by this create
+    with _key_lock(key):
+        entry = _prompt_caches.get(key)
+        if _usable_entry(entry):
+            return entry["model"]
+
+        try:
+            cache = caching.CachedContent.create(
+                model=model,
+                system_instruction=prompt,
+                ttl=timedelta(seconds=EXTRACTOR_PROMPT_CACHE_TTL_SECONDS)
+            )
+            _prompt_caches[key] = {
+                "model": genai.GenerativeModel.from_cached_content(cached_content=cache),
+                "expires_at": time.time() + EXTRACTOR_PROMPT_CACHE_TTL_SECONDS
+            }
+            logger.info("System prompt cached for %s: %s", model, cache.name)
+        except Exception as e:
+            # Remember the failure so we don't retry on every page, only after a short backoff
+            _prompt_caches[key] = {"model": None, "expires_at": time.time() + EXTRACTOR_PROMPT_CACHE_RETRY_SECONDS}
+            logger.warning("System prompt caching unavailable for %s: %.80s", model, e)
+
+        return _prompt_caches[key]["model"]
@@ -0,0 +1,88 @@
+"""
+Extraction Result Cache
+=======================
+In-process LRU cache of extractor results keyed by image content, so
+re-running the same page (re-upload, retry after a later failure) skips the
+LLM call entirely.
+"""
+
+import copy
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+from PIL import Image
+
+# Max cached results per process; 0 disables the cache
+EXTRACTION_CACHE_SIZE = int(os.getenv("EXTRACTION_CACHE_SIZE", "256"))
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+_ocr_fallback = threading.local()  # .used is set while an extract() call falls back to OCR
+
+
+def image_content_hash(image) -> str:
+    """BLAKE2 digest of the image content for a PIL Image (mode, size and pixels), raw bytes, or file path."""
+    digest = hashlib.blake2b(digest_size=16)
+    if isinstance(image, Image.Image):
+        digest.update(f"{image.mode}:{image.size}".encode())
+        digest.update(image.tobytes())
+    elif isinstance(image, str):
+        with open(image, "rb") as f:
+            digest.update(f.read())
+    else:
+        digest.update(image)
+    return digest.hexdigest()
+
+
+def mark_ocr_fallback() -> None:
+    """
+    Flag the extract() call running in this thread as an OCR fallback result.
+
+    Fallback results come from a degraded path (the vision API was down or
+    rate limited), so they are returned but never cached: a later call for the
+    same page should get another chance at the vision model.
+    """
+    _ocr_fallback.used = True
+
+
+def cached_extraction(form_type: str, prompt: str):
+    """
+    Decorate an extractor's extract(image, model) method with the result cache.
+
+    The key is (image hash, form type, prompt version, model), so editing a
+    system prompt or switching models never serves a stale result. Error and
+    OCR fallback results are not cached, and callers get a deep copy they may mutate.
+    """
+    prompt_version = hashlib.sha256(prompt.encode()).hexdigest()[:12]
+
+    def decorator(extract):
+        @wraps(extract)
+        def wrapper(self, image, *args, **kwargs):
+            if EXTRACTION_CACHE_SIZE <= 0:
+                return extract(self, image, *args, **kwargs)
+
+            # Remaining arguments (the model name) are part of the key
+            key = (image_content_hash(image), form_type, prompt_version, args, tuple(sorted(kwargs.items())))
+            with _cache_lock:
+                if key in _cache:
+                    _cache.move_to_end(key)
+                    return copy.deepcopy(_cache[key])
+
+            _ocr_fallback.used = False
+            try:
+                result = extract(self, image, *args, **kwargs)
+            finally:
+                used_fallback = _ocr_fallback.used
+                _ocr_fallback.used = False
+
+            if not used_fallback and not (isinstance(result, dict) and "error" in result):
+                with _cache_lock:
+                    _cache[key] = copy.deepcopy(result)
+                    if len(_cache) > EXTRACTION_CACHE_SIZE:
+                        _cache.popitem(last=False)
+            return result
+        return wrapper
+    return decorator
@@ -0,0 +1,12 @@
+-- Supabase table backing services/detection_cache.py (DETECTION_CACHE_ENABLED=true).
+-- Run once in the Supabase SQL editor before enabling the cache.
+
+create table if not exists detection_cache (
+    cache_key text primary key,          -- "<sha256 of file>:<model>", the upsert conflict target
+    parsed jsonb not null,               -- DetectionResponse.model_dump_json()
+    usage jsonb,                         -- token usage of the original Gemini call
+    expires_at timestamptz not null
+);
+
+-- Expired rows are deleted by the API (on lookup, and in periodic purges)
+create index if not exists detection_cache_expires_at_idx on detection_cache (expires_at);
@@ -0,0 +1,119 @@
+"""
+Detection Cache Service
+=======================
+Content-addressed cache of /get-pages detection results stored in Supabase,
+so re-uploads of the same document skip the Gemini detection call.
+
+The table schema is in scripts/detection_cache.sql.
+"""
+
+import os
+import hashlib
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from supabase import create_client, Client
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Supabase configuration
+SUPABASE_URL = os.getenv("SUPABASE_URL")
+SUPABASE_KEY = os.getenv("SUPABASE_KEY")
+
+# Opt-in flag and entry lifetime
+DETECTION_CACHE_ENABLED = os.getenv("DETECTION_CACHE_ENABLED", "false").lower() in ("1", "true", "yes")
+DETECTION_CACHE_TTL_SECONDS = int(os.getenv("DETECTION_CACHE_TTL_SECONDS", "86400"))
+
+# Minimum time between purges of expired rows (run from set())
+DETECTION_CACHE_PURGE_INTERVAL_SECONDS = int(os.getenv("DETECTION_CACHE_PURGE_INTERVAL_SECONDS", "3600"))
+
+# Table name
+DETECTION_CACHE_TABLE = "detection_cache"
+
+
+def make_cache_key(content: bytes, model: str) -> str:
+    """Build the cache key from the SHA-256 of the file content and the model name."""
+    return f"{hashlib.sha256(content).hexdigest()}:{model}"
+
+
+class DetectionCache:
+    """Stores parsed detection responses keyed by file content hash."""
+
+    def __init__(self):
+        """Initialize the cache with a Supabase client (only when enabled)."""
+        self.enabled = DETECTION_CACHE_ENABLED
+        self.supabase: Optional[Client] = create_client(SUPABASE_URL, SUPABASE_KEY) if self.enabled else None
+        self._last_purge = 0.0
+
+    def get(self, key: str) -> Optional[dict]:
+        """
+        Look up a cached detection result.
+
+        Args:
+            key: Cache key from make_cache_key()
+
+        Returns:
+            Dict with "parsed" (JSON string) and "usage" (dict), or None on miss/expiry
+        """
+        if not self.enabled:
+            return None
+
+        result = self.supabase.table(DETECTION_CACHE_TABLE) \
+            .select("parsed, usage, expires_at") \
+            .eq("cache_key", key) \
+            .limit(1) \
+            .execute()
+
+        if not result.data:
+            return None
+
+        row = result.data[0]
+        expires_at = datetime.fromisoformat(row["expires_at"])
+        if expires_at <= datetime.now(timezone.utc):
+            self.supabase.table(DETECTION_CACHE_TABLE).delete().eq("cache_key", key).execute()
+            return None
+
+        return {"parsed": row["parsed"], "usage": row["usage"]}
+
+    def set(self, key: str, parsed_json: str, usage: dict) -> None:
+        """
+        Store a detection result.
+
+        Args:
+            key: Cache key from make_cache_key()
+            parsed_json: DetectionResponse serialized with model_dump_json()
+            usage: Token usage metadata of the original Gemini call
+        """
+        if not self.enabled:
+            return
+
+        expires_at = datetime.now(timezone.utc) + timedelta(seconds=DETECTION_CACHE_TTL_SECONDS)
+        entry = {
+            "cache_key": key,
+            "parsed": parsed_json,
+            "usage": usage,
+            "expires_at": expires_at.isoformat()
+        }
+        self.supabase.table(DETECTION_CACHE_TABLE).upsert(entry).execute()
+
+        # Files that are never re-uploaded are never looked up again - purge them periodically
+        now = time.monotonic()
+        if now - self._last_purge >= DETECTION_CACHE_PURGE_INTERVAL_SECONDS:
+            self._last_purge = now
+            self.purge_expired()
+
+    def purge_expired(self) -> None:
+        """Delete all expired entries."""
+        if not self.enabled:
+            return
+
+        self.supabase.table(DETECTION_CACHE_TABLE) \
+            .delete() \
+            .lt("expires_at", datetime.now(timezone.utc).isoformat()) \
+            .execute()
+
+
+# Singleton instance
+detection_cache = DetectionCache()
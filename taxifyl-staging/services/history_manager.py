@@ -5,6 +5,9 @@ Manages persistence of extracted form history using Supabase database.
 """
 
 import os
+import threading
+import time
+from concurrent.futures import Future
 from datetime import datetime, timezone
 from typing import List, Optional
 from supabase import create_client, Client
@@ -20,6 +23,15 @@ SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 # Table name
 EXTRACTIONS_TABLE = "extractions"
 
+# Write-behind batching: pending entries are inserted together every interval,
+# or as soon as a full batch is queued
+HISTORY_FLUSH_INTERVAL_SECONDS = 0.2
+HISTORY_FLUSH_BATCH_SIZE = 25
+
+# get_history results are reused for this long; local writes invalidate them
+# immediately, the TTL bounds staleness from writes by other processes
+HISTORY_CACHE_TTL_SECONDS = 10
+
 
 class HistoryManager:
     """Manages form extraction history persistence in Supabase."""
@@ -27,6 +39,16 @@ class HistoryManager:
     def __init__(self):
         """Initialize the history manager with Supabase client."""
         self.supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+        self._pending: List[tuple] = []  # (entry, Future) awaiting insert
+        self._pending_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        # Serializes inserts, deletes and history cache updates, so a read that
+        # raced a write can't repopulate the cache with rows from before it
+        self._flush_lock = threading.Lock()
+        self._history_cache = {}  # limit -> (fetched_at, files)
+        self._history_generation = 0  # Bumped whenever local writes invalidate the cache
+        self._flush_thread = threading.Thread(target=self._flush_loop, name="history-flush", daemon=True)
+        self._flush_thread.start()
     
     def save_entry(
         self,
@@ -34,9 +56,9 @@ class HistoryManager:
         form_types: List[str],
         extracted_forms: List[dict],
         usage: Optional[dict] = None
-    ) -> dict:
+    ) -> Future:
         """
-        Save a new extraction entry to Supabase.
+        Queue a new extraction entry for the next batched insert into Supabase.
         
         Args:
             filename: Original filename of the document
@@ -45,7 +67,7 @@ class HistoryManager:
             usage: Optional API usage metadata
         
         Returns:
-            The saved history entry
+            Future resolving to the saved history entry once its batch is inserted
         """
         entry = {
             "filename": filename,
@@ -55,11 +77,50 @@ class HistoryManager:
             "usage": usage
         }
         
-        result = self.supabase.table(EXTRACTIONS_TABLE).insert(entry).execute()
+        future = Future()
+        with self._pending_lock:
+            self._pending.append((entry, future))
+            batch_full = len(self._pending) >= HISTORY_FLUSH_BATCH_SIZE
+        if batch_full:
+            self._wakeup.set()
+        return future
+    
+    def flush(self) -> None:
+        """Insert all queued entries now, HISTORY_FLUSH_BATCH_SIZE rows per request."""
+        with self._flush_lock:
+            self._flush_pending()
+    
+    def _flush_pending(self) -> None:
+        """Insert all queued entries; the caller holds _flush_lock."""
+        with self._pending_lock:
+            pending, self._pending = self._pending, []
         
-        if result.data:
-            return result.data[0]
-        return entry
+        for i in range(0, len(pending), HISTORY_FLUSH_BATCH_SIZE):
+            batch = pending[i:i + HISTORY_FLUSH_BATCH_SIZE]
+            entries = [entry for entry, _ in batch]
+            try:
+                result = self.supabase.table(EXTRACTIONS_TABLE).insert(entries).execute()
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            
+            self._invalidate_history_cache()
+            rows = result.data or []
+            for j, (entry, future) in enumerate(batch):
+                future.set_result(rows[j] if j < len(rows) else entry)
+    
+    def _invalidate_history_cache(self) -> None:
+        """Drop cached get_history results; the caller holds _flush_lock."""
+        self._history_cache.clear()
+        self._history_generation += 1
+    
+    def _flush_loop(self) -> None:
+        """Background writer: flush on the interval, or early when a batch fills up."""
+        while True:
+            self._wakeup.wait(HISTORY_FLUSH_INTERVAL_SECONDS)
+            self._wakeup.clear()
+            self.flush()
     
     def get_history(self, limit: int = 50) -> List[dict]:
         """
@@ -71,6 +132,15 @@ class HistoryManager:
         Returns:
             List of history entries
         """
+        # Make entries saved moments ago visible to the read
+        self.flush()
+        
+        with self._flush_lock:
+            cached = self._history_cache.get(limit)
+            if cached is not None and time.monotonic() - cached[0] < HISTORY_CACHE_TTL_SECONDS:
+                return list(cached[1])
+            generation = self._history_generation
+        
         result = self.supabase.table(EXTRACTIONS_TABLE) \
             .select("*") \
             .order("extracted_at", desc=True) \
@@ -78,9 +148,8 @@ class HistoryManager:
             .execute()
         
         # Convert to camelCase for API response consistency
-        files = []
-        for row in result.data or []:
-            files.append({
+        files = [
+            {
                 "id": row.get("id"),
                 "filename": row.get("filename"),
                 "extractedAt": row.get("extracted_at"),
@@ -88,13 +157,24 @@ class HistoryManager:
                 "totalFormsExtracted": row.get("total_forms_extracted", 0),
                 "extractedForms": row.get("extracted_forms", []),
                 "usage": row.get("usage")
-            })
+            }
+            for row in result.data or []
+        ]
         
-        return files
+        with self._flush_lock:
+            # A local write during the query may be missing from it - return it uncached
+            if generation == self._history_generation:
+                self._history_cache[limit] = (time.monotonic(), files)
+        return list(files)
     
     def clear_history(self) -> None:
-        """Clear all history entries (use with caution)."""
-        self.supabase.table(EXTRACTIONS_TABLE).delete().neq("id", "00000000-0000-0000-0000-000000000000").execute()
+        """Clear all history entries, including ones still queued for insert (use with caution)."""
+        with self._flush_lock:
+            # Drain the queue first, so its futures resolve and a later flush can't
+            # re-insert entries saved before the clear
+            self._flush_pending()
+            self.supabase.table(EXTRACTIONS_TABLE).delete().neq("id", "00000000-0000-0000-0000-000000000000").execute()
+            self._invalidate_history_cache()
 
 
 # Singleton instance
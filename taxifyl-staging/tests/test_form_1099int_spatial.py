@@ -0,0 +1,87 @@
+"""
+Unit Tests for 1099-INT Spatial OCR Pairing
+===========================================
+Checks how Form1099INTExtractor._spatial_box_values pairs PaddleOCR label
+tokens with amount tokens. Boxes are (text, (x0, y0, x1, y1)) with 20px lines.
+"""
+
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import pytest
+
+from forms.form_1099int.extractor import Form1099INTExtractor
+
+
+@pytest.fixture
+def extractor():
+    # The spatial parser needs no API clients
+    return Form1099INTExtractor.__new__(Form1099INTExtractor)
+
+
+def test_amount_below_label_is_paired(extractor):
+    boxes = [
+        ("1 Interest income", (10, 10, 200, 30)),
+        ("$1,234.00", (10, 40, 90, 60)),
+    ]
+    assert extractor._spatial_box_values(boxes)["interest income"] == "$1,234.00"
+
+
+def test_amount_right_of_label_is_paired(extractor):
+    boxes = [
+        ("Investment expenses", (10, 10, 200, 30)),
+        ("15.00", (240, 12, 300, 28)),
+    ]
+    assert extractor._spatial_box_values(boxes)["investment expenses"] == "15.00"
+
+
+def test_inline_amount_is_used(extractor):
+    boxes = [("Interest income $42.00", (10, 10, 300, 30))]
+    assert extractor._spatial_box_values(boxes)["interest income"] == "$42.00"
+
+
+def test_empty_box_does_not_take_neighbours_amount(extractor):
+    # Box 1 has no amount; the amount under box 2's label belongs to box 2 only
+    boxes = [
+        ("1 Interest income", (10, 10, 200, 30)),
+        ("2 Early withdrawal penalty", (10, 50, 220, 70)),
+        ("25.00", (10, 75, 80, 95)),
+    ]
+    box_values = extractor._spatial_box_values(boxes)
+    assert box_values["early withdrawal"] == "25.00"
+    assert "interest income" not in box_values
+
+
+def test_distant_amount_is_not_paired(extractor):
+    boxes = [
+        ("1 Interest income", (10, 10, 200, 30)),
+        ("900.00", (10, 400, 90, 420)),
+        ("75.00", (900, 10, 960, 30)),
+    ]
+    assert extractor._spatial_box_values(boxes) == {}
+
+
+def test_box_10_is_not_box_1(extractor):
+    boxes = [
+        ("Box 10 Market discount", (10, 10, 200, 30)),
+        ("7.50", (220, 10, 270, 30)),
+    ]
+    assert "box 1" not in extractor._spatial_box_values(boxes)
+
+
+def test_box_10_inline_amount_is_not_box_1(extractor):
+    boxes = [("Box 10 Market discount 7.50", (10, 10, 300, 30))]
+    assert "box 1" not in extractor._spatial_box_values(boxes)
+
+
+def test_payer_federal_id_label_is_not_box_4(extractor):
+    boxes = [
+        ("PAYER'S federal identification number", (10, 10, 300, 30)),
+        ("123456789", (10, 40, 110, 60)),
+        ("4 Federal income tax withheld", (400, 10, 650, 30)),
+        ("88.00", (400, 40, 460, 60)),
+    ]
+    box_values = extractor._spatial_box_values(boxes)
+    assert box_values["federal"] == "88.00"
+    assert box_values["tax withheld"] == "88.00"
@@ -0,0 +1,135 @@
+"""
+Unit Tests for the History Manager
+==================================
+Exercises services.history_manager.HistoryManager's write-behind queue,
+clear_history and get_history cache against an in-memory Supabase table.
+"""
+
+import importlib
+import sys
+import types
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import pytest
+
+
+class FakeQuery:
+    """Just enough of the Supabase query builder for HistoryManager."""
+
+    def __init__(self, db):
+        self.db = db
+        self.action = None
+        self.entries = None
+
+    def insert(self, entries):
+        self.action, self.entries = "insert", entries
+        return self
+
+    def select(self, _columns):
+        self.action = "select"
+        return self
+
+    def delete(self):
+        self.action = "delete"
+        return self
+
+    def order(self, *_args, **_kwargs):
+        return self
+
+    def limit(self, _count):
+        return self
+
+    def neq(self, *_args):
+        return self
+
+    def execute(self):
+        if self.action == "insert":
+            rows = [dict(entry, id=str(len(self.db.rows) + i)) for i, entry in enumerate(self.entries)]
+            self.db.rows.extend(rows)
+            return types.SimpleNamespace(data=rows)
+        if self.action == "delete":
+            self.db.rows.clear()
+            return types.SimpleNamespace(data=[])
+        self.db.selects += 1
+        data = list(reversed(self.db.rows))
+        if self.db.on_select:
+            hook, self.db.on_select = self.db.on_select, None
+            hook()
+        return types.SimpleNamespace(data=data)
+
+
+class FakeSupabase:
+    def __init__(self):
+        self.rows = []
+        self.selects = 0
+        self.on_select = None
+
+    def table(self, _name):
+        return FakeQuery(self)
+
+
+@pytest.fixture
+def history_module(monkeypatch):
+    # The module builds a singleton client at import, so import it against the fake
+    fake_supabase = types.ModuleType("supabase")
+    fake_supabase.Client = object
+    fake_supabase.create_client = lambda url, key: FakeSupabase()
+    monkeypatch.setitem(sys.modules, "supabase", fake_supabase)
+    sys.modules.pop("services.history_manager", None)
+    module = importlib.import_module("services.history_manager")
+    # Keep the background writer out of the way; tests flush explicitly
+    monkeypatch.setattr(module, "HISTORY_FLUSH_INTERVAL_SECONDS", 3600)
+    yield module
+    sys.modules.pop("services.history_manager", None)
+
+
+@pytest.fixture
+def manager(history_module):
+    return history_module.HistoryManager()
+
+
+def test_flush_inserts_queued_entries(manager):
+    future = manager.save_entry("w2.pdf", ["W-2"], [{"box": 1}])
+    manager.flush()
+    assert future.result(timeout=1)["filename"] == "w2.pdf"
+    assert [row["filename"] for row in manager.supabase.rows] == ["w2.pdf"]
+
+
+def test_get_history_sees_queued_entries(manager):
+    manager.save_entry("w2.pdf", ["W-2"], [{"box": 1}])
+    history = manager.get_history()
+    assert [entry["filename"] for entry in history] == ["w2.pdf"]
+
+
+def test_get_history_is_cached(manager):
+    manager.get_history()
+    manager.get_history()
+    assert manager.supabase.selects == 1
+
+
+def test_clear_history_drains_pending_entries(manager):
+    future = manager.save_entry("w2.pdf", ["W-2"], [{"box": 1}])
+    manager.clear_history()
+    assert future.done()
+
+    manager.flush()
+    assert manager.supabase.rows == []
+    assert manager.get_history() == []
+
+
+def test_clear_history_invalidates_cache(manager):
+    manager.save_entry("w2.pdf", ["W-2"], [{"box": 1}])
+    assert len(manager.get_history()) == 1
+    manager.clear_history()
+    assert manager.get_history() == []
+
+
+def test_write_during_read_is_not_cached_stale(manager):
+    def save_during_select():
+        manager.save_entry("late.pdf", ["W-2"], [])
+        manager.flush()
+
+    manager.supabase.on_select = save_during_select
+    assert manager.get_history() == []
+    assert [entry["filename"] for entry in manager.get_history()] == ["late.pdf"]
@@ -0,0 +1,80 @@
+"""
+Unit Tests for the Extraction Result Cache
+==========================================
+Checks which extractor results forms.result_cache.cached_extraction stores and serves.
+"""
+
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import pytest
+
+from forms import result_cache
+from forms.result_cache import cached_extraction, mark_ocr_fallback
+
+
+class FakeExtractor:
+    """Counts extract() calls and returns whatever result is queued next."""
+
+    def __init__(self, result, ocr_fallback=False):
+        self.result = result
+        self.ocr_fallback = ocr_fallback
+        self.calls = 0
+
+    @cached_extraction("TEST", "test prompt")
+    def extract(self, image, model="gemini-2.0-flash"):
+        self.calls += 1
+        if self.ocr_fallback:
+            mark_ocr_fallback()
+        return self.result
+
+
+@pytest.fixture(autouse=True)
+def empty_cache(monkeypatch):
+    monkeypatch.setattr(result_cache, "EXTRACTION_CACHE_SIZE", 8)
+    result_cache._cache.clear()
+    yield
+    result_cache._cache.clear()
+
+
+def test_hit_skips_extract_and_returns_a_copy():
+    extractor = FakeExtractor({"forms": [{"year": "2024"}]})
+    first = extractor.extract(b"page-1")
+    first["forms"][0]["year"] = "edited"
+
+    second = extractor.extract(b"page-1")
+    assert extractor.calls == 1
+    assert second == {"forms": [{"year": "2024"}]}
+
+
+def test_model_is_part_of_the_key():
+    extractor = FakeExtractor({"forms": []})
+    extractor.extract(b"page-1", model="gemini-2.0-flash")
+    extractor.extract(b"page-1", model="gemini-2.5-flash")
+    assert extractor.calls == 2
+
+
+def test_error_result_is_not_cached():
+    extractor = FakeExtractor({"error": "Failed to parse JSON"})
+    extractor.extract(b"page-1")
+    extractor.extract(b"page-1")
+    assert extractor.calls == 2
+
+
+def test_ocr_fallback_result_is_not_cached():
+    extractor = FakeExtractor({"forms": [{"year": "2024"}]}, ocr_fallback=True)
+    assert extractor.extract(b"page-1") == {"forms": [{"year": "2024"}]}
+    extractor.extract(b"page-1")
+    assert extractor.calls == 2
+
+
+def test_vision_result_after_fallback_is_cached():
+    extractor = FakeExtractor({"forms": []}, ocr_fallback=True)
+    extractor.extract(b"page-1")
+
+    extractor.ocr_fallback = False
+    extractor.extract(b"page-1")
+    extractor.extract(b"page-1")
+    assert extractor.calls == 2
+
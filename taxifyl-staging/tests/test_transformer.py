@@ -182,6 +182,31 @@ def test_transform_with_nested_ai_output():
     print("\n✅ Nested transform test passed!")
 
 
+def test_1099int_fallback_prefers_exact_keys():
+    """Test the 1099-INT flat fallback matches an exact key before a longer one containing it."""
+    from app import transform_to_1099int_structure
+    
+    # box_10 comes first, and "box_1" is a substring of it
+    flat_output = {
+        "tax_year": "2024",
+        "box_10": 5.00,
+        "box_1": 100.00,
+        "box_11": 2.00
+    }
+    
+    result = transform_to_1099int_structure(flat_output)
+    boxes = result[0]["forms"][0]["boxes"]
+    financial_plane = next(box["financial_plane"] for box in boxes if "financial_plane" in box)
+    values = {row["data"][0]["code"]: row["data"][0]["value"] for row in financial_plane}
+    print(f"1099-INT fallback boxes: {values}")
+    
+    assert values["1"] == 100.00, f"Box 1 should be 100.00, got: {values['1']}"
+    assert values["10"] == 5.00, f"Box 10 should be 5.00, got: {values['10']}"
+    assert values["11"] == 2.00, f"Box 11 should be 2.00, got: {values['11']}"
+    
+    print("\n✅ 1099-INT exact-key fallback test passed!")
+
+
 def run_all_tests():
     """Run all tests."""
     print("=" * 60)
@@ -192,6 +217,7 @@ def run_all_tests():
         test_flatten_dict()
         test_transform_to_w2_structure()
         test_transform_with_nested_ai_output()
+        test_1099int_fallback_prefers_exact_keys()
         
         print("\n" + "=" * 60)
         print("✅ ALL TESTS PASSED!")